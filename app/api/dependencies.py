@@ -0,0 +1,26 @@
+from fastapi import Request
+from app.services.threat_intel import ThreatIntelService
+from app.services.analysis_service import AnalysisService
+from app.services.job_service import BatchJobService
+from app.services.threat_feed_service import ThreatFeedService
+from app.services.sandbox_service import SandboxService
+
+def get_threat_intel_service(request: Request) -> ThreatIntelService:
+    """Return the application-scoped threat intelligence service"""
+    return request.app.state.threat_intel_service
+
+def get_analysis_service(request: Request) -> AnalysisService:
+    """Return the application-scoped IOC analysis service"""
+    return request.app.state.analysis_service
+
+def get_job_service(request: Request) -> BatchJobService:
+    """Return the application-scoped batch job service"""
+    return request.app.state.job_service
+
+def get_feed_service(request: Request) -> ThreatFeedService:
+    """Return the application-scoped threat feed service"""
+    return request.app.state.feed_service
+
+def get_sandbox_service(request: Request) -> SandboxService:
+    """Return the application-scoped sandbox service"""
+    return request.app.state.sandbox_service
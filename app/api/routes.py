@@ -1,21 +1,35 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks, UploadFile, File, Depends
-from fastapi.responses import JSONResponse
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, BackgroundTasks, UploadFile, File, Depends, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+from typing import List, Optional, AsyncIterator
 import uuid
+import json
 from datetime import datetime
 import asyncio
-import hashlib
 import os
 import tempfile
 from app.auth.auth import get_optional_user, require_role
+from app.api.dependencies import (
+    get_threat_intel_service, get_analysis_service, get_job_service,
+    get_feed_service, get_sandbox_service
+)
 
 from app.models.ioc import (
-    IOCInput, IOCResponse, IOCAnalysis, IOCStatus, Verdict,
-    BatchAnalysisRequest, BatchAnalysisResponse
+    IOCInput, IOCResponse, IOCType, Verdict,
+    BatchAnalysisRequest, BatchAnalysisResponse, BatchJobRequest
 )
 from app.services.ioc_parser import IOCParser
 from app.services.threat_intel import ThreatIntelService
 from app.services.analysis_engine import AnalysisEngine
+from app.services.analysis_service import AnalysisService
+from app.services.batch_executor import BatchExecutor
+from app.services.job_service import BatchJobService
+from app.services.analysis_store import AnalysisStore
+from app.services.threat_feed_service import ThreatFeedService
+from app.services.sandbox_service import SandboxService
+from app.services.file_hasher import check_content_length, limit_upload_stream, hash_upload, FileTooLargeError
+from app.core.config import settings
 
 # Create router
 ioc_router = APIRouter()
@@ -24,13 +38,18 @@ ioc_router = APIRouter()
 ioc_parser = IOCParser()
 analysis_engine = AnalysisEngine()
 
-# In-memory storage for demo purposes (replace with database in production)
-analysis_cache = {}
+# Bounded in-memory storage for analysis records (LRU + TTL + memory budget)
+analysis_cache = AnalysisStore(
+    max_entries=settings.analysis_store_max_entries,
+    ttl=settings.analysis_store_ttl,
+    max_bytes=settings.analysis_store_max_bytes
+)
 
 @ioc_router.post("/analyze", response_model=IOCResponse)
 async def analyze_ioc(
     ioc_input: IOCInput,
-    current_user: Optional[dict] = Depends(get_optional_user)
+    current_user: Optional[dict] = Depends(get_optional_user),
+    analysis_service: AnalysisService = Depends(get_analysis_service)
 ):
     """
     Analyze a single IOC and return threat intelligence results
@@ -45,51 +64,9 @@ async def analyze_ioc(
         # Normalize IOC
         normalized_indicator = ioc_parser.normalize_ioc(ioc_input.indicator, ioc_type)
         
-        # Generate analysis ID
-        analysis_id = str(uuid.uuid4())
-        
-        # Create initial analysis record
-        analysis = IOCAnalysis(
-            id=analysis_id,
-            indicator=normalized_indicator,
-            ioc_type=ioc_type,
-            status=IOCStatus.ANALYZING,
-            created_at=datetime.utcnow().isoformat(),
-            updated_at=datetime.utcnow().isoformat()
-        )
-        
-        # Store in cache
-        analysis_cache[analysis_id] = analysis
-        
-        # Perform threat intelligence analysis
-        threat_intel_service = ThreatIntelService()
-        
+        # Perform threat intelligence analysis; identical concurrent requests share one lookup
         try:
-            # Query threat intelligence services
-            threat_intel_results = await threat_intel_service.analyze_ioc(
-                normalized_indicator, ioc_type.value
-            )
-            
-            # Analyze results and generate verdict
-            analysis_results = analysis_engine.analyze_results(threat_intel_results)
-            
-            # Update analysis record
-            analysis.status = IOCStatus.COMPLETED
-            analysis.verdict = analysis_results["verdict"]
-            analysis.confidence_score = analysis_results["confidence_score"]
-            analysis.threat_score = analysis_results["threat_score"]
-            analysis.evidence = analysis_results["evidence"]
-            analysis.tags = analysis_results["tags"]
-            analysis.updated_at = datetime.utcnow().isoformat()
-            
-            # Store threat intelligence results
-            analysis.virustotal_results = threat_intel_results["results"].get("virustotal")
-            analysis.abuseipdb_results = threat_intel_results["results"].get("abuseipdb")
-            analysis.urlscan_results = threat_intel_results["results"].get("urlscan")
-            analysis.otx_results = threat_intel_results["results"].get("otx")
-            
-            # Update cache
-            analysis_cache[analysis_id] = analysis
+            analysis = await analysis_service.analyze(normalized_indicator, ioc_type)
             
             return IOCResponse(
                 success=True,
@@ -98,14 +75,7 @@ async def analyze_ioc(
             )
             
         except Exception as e:
-            analysis.status = IOCStatus.FAILED
-            analysis.updated_at = datetime.utcnow().isoformat()
-            analysis_cache[analysis_id] = analysis
-            
             raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
-        
-        finally:
-            await threat_intel_service.close()
     
     except HTTPException:
         raise
@@ -113,82 +83,17 @@ async def analyze_ioc(
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @ioc_router.post("/analyze/batch", response_model=BatchAnalysisResponse)
-async def analyze_batch_iocs(batch_request: BatchAnalysisRequest):
+async def analyze_batch_iocs(
+    batch_request: BatchAnalysisRequest,
+    analysis_service: AnalysisService = Depends(get_analysis_service)
+):
     """
     Analyze multiple IOCs in batch
     """
     try:
-        results = []
-        failed_indicators = []
-        
-        # Process each indicator
-        for indicator in batch_request.indicators:
-            try:
-                # Parse and validate IOC
-                ioc_type, is_valid, error_message = ioc_parser.parse_ioc(indicator)
-                
-                if not is_valid:
-                    failed_indicators.append(f"{indicator}: {error_message}")
-                    continue
-                
-                # Normalize IOC
-                normalized_indicator = ioc_parser.normalize_ioc(indicator, ioc_type)
-                
-                # Generate analysis ID
-                analysis_id = str(uuid.uuid4())
-                
-                # Create initial analysis record
-                analysis = IOCAnalysis(
-                    id=analysis_id,
-                    indicator=normalized_indicator,
-                    ioc_type=ioc_type,
-                    status=IOCStatus.ANALYZING,
-                    created_at=datetime.utcnow().isoformat(),
-                    updated_at=datetime.utcnow().isoformat()
-                )
-                
-                # Perform threat intelligence analysis
-                threat_intel_service = ThreatIntelService()
-                
-                try:
-                    # Query threat intelligence services
-                    threat_intel_results = await threat_intel_service.analyze_ioc(
-                        normalized_indicator, ioc_type.value
-                    )
-                    
-                    # Analyze results and generate verdict
-                    analysis_results = analysis_engine.analyze_results(threat_intel_results)
-                    
-                    # Update analysis record
-                    analysis.status = IOCStatus.COMPLETED
-                    analysis.verdict = analysis_results["verdict"]
-                    analysis.confidence_score = analysis_results["confidence_score"]
-                    analysis.threat_score = analysis_results["threat_score"]
-                    analysis.evidence = analysis_results["evidence"]
-                    analysis.tags = analysis_results["tags"]
-                    analysis.updated_at = datetime.utcnow().isoformat()
-                    
-                    # Store threat intelligence results
-                    analysis.virustotal_results = threat_intel_results["results"].get("virustotal")
-                    analysis.abuseipdb_results = threat_intel_results["results"].get("abuseipdb")
-                    analysis.urlscan_results = threat_intel_results["results"].get("urlscan")
-                    analysis.otx_results = threat_intel_results["results"].get("otx")
-                    
-                    # Store in cache
-                    analysis_cache[analysis_id] = analysis
-                    results.append(analysis)
-                    
-                except Exception as e:
-                    analysis.status = IOCStatus.FAILED
-                    analysis.updated_at = datetime.utcnow().isoformat()
-                    analysis_cache[analysis_id] = analysis
-                    failed_indicators.append(f"{indicator}: Analysis failed - {str(e)}")
-                
-                finally:
-                    await threat_intel_service.close()
-                    
-            except Exception as e:
-                failed_indicators.append(f"{indicator}: {str(e)}")
+        # Deduplicate and analyze concurrently; results keep the input order
+        batch_executor = BatchExecutor(analysis_service, ioc_parser)
+        results, failed_indicators = await batch_executor.run(batch_request.indicators)
         
         return BatchAnalysisResponse(
             success=True,
@@ -200,15 +105,146 @@ async def analyze_batch_iocs(batch_request: BatchAnalysisRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Batch analysis failed: {str(e)}")
 
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that can stream while the request body is still being read
+    
+    The stock response listens for client disconnects on receive(), which would
+    swallow the body messages the endpoint is still consuming. Disconnects during
+    upload surface from request.stream() instead.
+    """
+    
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+def _parse_ndjson_line(line: bytes) -> Optional[str]:
+    """Extract an indicator from an NDJSON line (JSON string, object or plain text)"""
+    text = line.decode("utf-8", errors="replace").strip()
+    if not text:
+        return None
+    
+    if text[0] in '{"':
+        try:
+            value = json.loads(text)
+            if isinstance(value, dict):
+                value = value.get("indicator")
+            return str(value).strip() if value else None
+        except json.JSONDecodeError:
+            pass
+    
+    return text
+
+async def _iter_ndjson_indicators(request: Request) -> AsyncIterator[str]:
+    """Read indicators line by line from a streamed request body"""
+    buffer = b""
+    
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            indicator = _parse_ndjson_line(line)
+            if indicator:
+                yield indicator
+    
+    indicator = _parse_ndjson_line(buffer)
+    if indicator:
+        yield indicator
+
+@ioc_router.post("/analyze/stream")
+async def analyze_stream(
+    request: Request,
+    analysis_service: AnalysisService = Depends(get_analysis_service)
+):
+    """
+    Analyze an NDJSON stream of IOCs, emitting one JSON result per line as each completes
+    """
+    batch_executor = BatchExecutor(analysis_service, ioc_parser)
+    
+    async def generate():
+        async for result in batch_executor.stream(_iter_ndjson_indicators(request)):
+            yield json.dumps(result) + "\n"
+    
+    return DuplexStreamingResponse(generate(), media_type="application/x-ndjson")
+
+@ioc_router.post("/jobs/batch")
+async def submit_batch_job(
+    job_request: BatchJobRequest,
+    job_service: BatchJobService = Depends(get_job_service)
+):
+    """
+    Submit a large batch of IOCs for background analysis and return a job ID immediately
+    """
+    try:
+        job = await job_service.submit(job_request.indicators, job_request.description)
+        
+        return JSONResponse(status_code=202, content={
+            "success": True,
+            "message": "Batch job queued",
+            "data": job
+        })
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to submit batch job: {str(e)}")
+
+@ioc_router.get("/jobs/{job_id}")
+async def get_batch_job(job_id: str, job_service: BatchJobService = Depends(get_job_service)):
+    """
+    Get batch job status and progress (done/failed/pending counts)
+    """
+    job = await job_service.get_job(job_id)
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return JSONResponse({
+        "success": True,
+        "message": "Batch job retrieved successfully",
+        "data": job
+    })
+
+@ioc_router.get("/jobs/{job_id}/results")
+async def get_batch_job_results(
+    job_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    status: Optional[str] = None,
+    job_service: BatchJobService = Depends(get_job_service)
+):
+    """
+    Get a page of batch job results in submission order
+    """
+    job = await job_service.get_job(job_id)
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    results = await job_service.get_results(job_id, offset, limit, status)
+    
+    return JSONResponse({
+        "success": True,
+        "message": "Batch job results retrieved successfully",
+        "data": {
+            "job": job,
+            "offset": offset,
+            "limit": limit,
+            "results": results
+        }
+    })
+
 @ioc_router.get("/analysis/{analysis_id}", response_model=IOCResponse)
-async def get_analysis(analysis_id: str):
+async def get_analysis(
+    analysis_id: str,
+    analysis_service: AnalysisService = Depends(get_analysis_service)
+):
     """
     Retrieve analysis results by ID
     """
-    if analysis_id not in analysis_cache:
-        raise HTTPException(status_code=404, detail="Analysis not found")
+    analysis = await analysis_service.get_analysis(analysis_id)
     
-    analysis = analysis_cache[analysis_id]
+    if analysis is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
     
     return IOCResponse(
         success=True,
@@ -229,47 +265,102 @@ async def health_check():
     }
 
 @ioc_router.get("/stats")
-async def get_stats():
+async def get_stats(analysis_service: AnalysisService = Depends(get_analysis_service)):
     """
     Get analysis statistics
     """
-    total_analyses = len(analysis_cache)
-    completed = sum(1 for a in analysis_cache.values() if a.status == IOCStatus.COMPLETED)
-    failed = sum(1 for a in analysis_cache.values() if a.status == IOCStatus.FAILED)
-    pending = sum(1 for a in analysis_cache.values() if a.status == IOCStatus.ANALYZING)
-    
-    verdict_counts = {}
-    for analysis in analysis_cache.values():
-        if analysis.verdict:
-            verdict = analysis.verdict.value
-            verdict_counts[verdict] = verdict_counts.get(verdict, 0) + 1
+    # Counters are maintained on every state change, so this is constant time
+    stats = analysis_service.stats.snapshot()
     
     return {
-        "total_analyses": total_analyses,
-        "completed": completed,
-        "failed": failed,
-        "pending": pending,
-        "verdict_distribution": verdict_counts,
-        "cache_size": total_analyses
+        **stats,
+        "cache_size": len(analysis_cache),
+        "store": analysis_cache.get_stats()
+    }
+
+@ioc_router.get("/rate-limits")
+async def get_rate_limits(
+    threat_intel_service: ThreatIntelService = Depends(get_threat_intel_service)
+):
+    """
+    Get current per-provider rate limiter state (tokens, in-flight requests, daily quota)
+    """
+    return {
+        "providers": threat_intel_service.rate_limiter.get_status(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@ioc_router.get("/cache/stats")
+async def get_cache_stats(
+    threat_intel_service: ThreatIntelService = Depends(get_threat_intel_service)
+):
+    """
+    Get threat intelligence response cache statistics
+    """
+    if threat_intel_service.cache is None:
+        return {"enabled": False}
+    
+    stats = await threat_intel_service.cache.get_stats()
+    return {"enabled": True, **stats}
+
+# The form is parsed in the handler so oversized uploads are refused before it is read
+FILE_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary"}}
+                }
+            }
+        }
     }
+}
 
-@ioc_router.post("/analyze/file")
-async def analyze_file(file: UploadFile = File(...)):
+@ioc_router.post("/analyze/file", openapi_extra=FILE_UPLOAD_BODY)
+async def analyze_file(
+    request: Request,
+    analysis_service: AnalysisService = Depends(get_analysis_service)
+):
     """
     Analyze an uploaded file for malware and threats
     """
+    form = None
     try:
-        # Validate file size (100MB limit)
-        max_size = 100 * 1024 * 1024  # 100MB
-        file_content = await file.read()
-        
-        if len(file_content) > max_size:
-            raise HTTPException(status_code=413, detail="File too large. Maximum size is 100MB.")
-        
-        # Calculate file hashes
-        md5_hash = hashlib.md5(file_content).hexdigest()
-        sha1_hash = hashlib.sha1(file_content).hexdigest()
-        sha256_hash = hashlib.sha256(file_content).hexdigest()
+        # Refuse from the declared length first, and stop reading a body that streams
+        # past the limit, then hash all three digests in one pass
+        try:
+            check_content_length(request.headers.get("content-length"))
+            content_type = request.headers.get("content-type", "")
+            if not content_type.startswith("multipart/form-data") or "boundary=" not in content_type:
+                raise HTTPException(status_code=400, detail="No file uploaded")
+            try:
+                form = await MultiPartParser(
+                    request.headers, limit_upload_stream(request.stream()), max_files=1
+                ).parse()
+            except MultiPartException as e:
+                raise HTTPException(status_code=400, detail=e.message)
+            file = form.get("file")
+            if not isinstance(file, StarletteUploadFile):
+                raise HTTPException(status_code=400, detail="No file uploaded")
+            sample = await hash_upload(file)
+        except FileTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        
+        md5_hash = sample["md5"]
+        sha1_hash = sample["sha1"]
+        sha256_hash = sample["sha256"]
+        
+        # Samples are content-addressed, so a re-upload returns the earlier analysis
+        existing = await analysis_service.find_file_analysis(sha256_hash)
+        if existing is not None:
+            return JSONResponse({
+                "success": True,
+                "message": "File previously analyzed",
+                "data": existing
+            })
         
         # Generate analysis ID
         analysis_id = str(uuid.uuid4())
@@ -278,7 +369,7 @@ async def analyze_file(file: UploadFile = File(...)):
         file_analysis = {
             "id": analysis_id,
             "filename": file.filename,
-            "file_size": len(file_content),
+            "file_size": sample["size"],
             "file_type": file.content_type,
             "md5_hash": md5_hash,
             "sha1_hash": sha1_hash,
@@ -289,27 +380,44 @@ async def analyze_file(file: UploadFile = File(...)):
         }
         
         # Store in cache
-        analysis_cache[analysis_id] = file_analysis
+        analysis_service.record(analysis_id, file_analysis)
         
         # Perform hash-based IOC analysis using existing functionality
-        threat_intel_service = ThreatIntelService()
-        
         try:
-            # Analyze file hashes
+            # Analyze file hashes, strongest first or concurrently per FILE_HASH_STRATEGY
+            hash_analyses = await analysis_service.analyze_file_hashes({
+                IOCType.HASH_SHA256: sha256_hash,
+                IOCType.HASH_SHA1: sha1_hash,
+                IOCType.HASH_MD5: md5_hash
+            })
+            
             hash_results = {}
-            for hash_type, hash_value in [("hash_sha256", sha256_hash), ("hash_sha1", sha1_hash), ("hash_md5", md5_hash)]:
-                try:
-                    threat_intel_results = await threat_intel_service.analyze_ioc(hash_value, hash_type)
-                    analysis_results = analysis_engine.analyze_results(threat_intel_results)
-                    hash_results[hash_type] = {
+            for hash_type, hash_analysis in hash_analyses.items():
+                hash_value = sample[hash_type.value.replace("hash_", "")]
+                
+                if hash_analysis is None:
+                    hash_results[hash_type.value] = {"hash": hash_value, "status": "skipped"}
+                elif isinstance(hash_analysis, Exception):
+                    hash_results[hash_type.value] = {"error": str(hash_analysis), "hash": hash_value}
+                else:
+                    # Recorded as IOC analyses, so /analyze of any of the hashes reuses them
+                    hash_results[hash_type.value] = {
                         "hash": hash_value,
-                        "verdict": analysis_results.get("verdict"),
-                        "confidence_score": analysis_results.get("confidence_score", 0),
-                        "threat_score": analysis_results.get("threat_score", 0),
-                        "threat_intel": threat_intel_results
+                        "analysis_id": hash_analysis.id,
+                        "verdict": hash_analysis.verdict,
+                        "confidence_score": hash_analysis.confidence_score or 0,
+                        "threat_score": hash_analysis.threat_score or 0,
+                        "threat_intel": {
+                            "indicator": hash_analysis.indicator,
+                            "ioc_type": hash_analysis.ioc_type.value,
+                            "results": {
+                                "virustotal": hash_analysis.virustotal_results,
+                                "abuseipdb": hash_analysis.abuseipdb_results,
+                                "urlscan": hash_analysis.urlscan_results,
+                                "otx": hash_analysis.otx_results
+                            }
+                        }
                     }
-                except Exception as e:
-                    hash_results[hash_type] = {"error": str(e), "hash": hash_value}
             
             # Determine overall file verdict based on hash analysis
             max_threat_score = 0
@@ -372,7 +480,7 @@ async def analyze_file(file: UploadFile = File(...)):
             })
             
             # Update cache
-            analysis_cache[analysis_id] = file_analysis
+            analysis_service.record(analysis_id, file_analysis)
             
             return JSONResponse({
                 "success": True,
@@ -384,27 +492,30 @@ async def analyze_file(file: UploadFile = File(...)):
             file_analysis["status"] = "failed"
             file_analysis["error"] = str(e)
             file_analysis["updated_at"] = datetime.utcnow().isoformat()
-            analysis_cache[analysis_id] = file_analysis
+            analysis_service.record(analysis_id, file_analysis)
             
             raise HTTPException(status_code=500, detail=f"File analysis failed: {str(e)}")
-        
-        finally:
-            await threat_intel_service.close()
     
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    finally:
+        if form is not None:
+            await form.close()
 
 @ioc_router.get("/analysis/file/{analysis_id}")
-async def get_file_analysis(analysis_id: str):
+async def get_file_analysis(
+    analysis_id: str,
+    analysis_service: AnalysisService = Depends(get_analysis_service)
+):
     """
     Retrieve file analysis results by ID
     """
-    if analysis_id not in analysis_cache:
-        raise HTTPException(status_code=404, detail="File analysis not found")
+    analysis = await analysis_service.get_analysis(analysis_id)
     
-    analysis = analysis_cache[analysis_id]
+    if analysis is None:
+        raise HTTPException(status_code=404, detail="File analysis not found")
     
     return JSONResponse({
         "success": True,
@@ -413,14 +524,15 @@ async def get_file_analysis(analysis_id: str):
     })
 
 @ioc_router.post("/sandbox/submit")
-async def submit_to_sandbox(file: UploadFile = File(...), environment: str = "ubuntu20"):
+async def submit_to_sandbox(
+    file: UploadFile = File(...),
+    environment: str = "ubuntu20",
+    sandbox_service: SandboxService = Depends(get_sandbox_service)
+):
     """
     Submit a file to sandbox for dynamic analysis
     """
     try:
-        from app.services.sandbox_service import SandboxService
-        
-        sandbox_service = SandboxService()
         
         # Save uploaded file temporarily
         with tempfile.NamedTemporaryFile(delete=False) as temp_file:
@@ -452,14 +564,14 @@ async def submit_to_sandbox(file: UploadFile = File(...), environment: str = "ub
         raise HTTPException(status_code=500, detail=f"Sandbox submission failed: {str(e)}")
 
 @ioc_router.get("/sandbox/analysis/{analysis_id}")
-async def get_sandbox_analysis(analysis_id: str):
+async def get_sandbox_analysis(
+    analysis_id: str,
+    sandbox_service: SandboxService = Depends(get_sandbox_service)
+):
     """
     Get sandbox analysis status and results
     """
     try:
-        from app.services.sandbox_service import SandboxService
-        
-        sandbox_service = SandboxService()
         result = await sandbox_service.get_analysis_status(analysis_id)
         
         return JSONResponse({
@@ -472,14 +584,14 @@ async def get_sandbox_analysis(analysis_id: str):
         raise HTTPException(status_code=500, detail=f"Failed to get sandbox analysis: {str(e)}")
 
 @ioc_router.post("/sandbox/deploy")
-async def deploy_sandbox(environment: str = "ubuntu20"):
+async def deploy_sandbox(
+    environment: str = "ubuntu20",
+    sandbox_service: SandboxService = Depends(get_sandbox_service)
+):
     """
     Deploy a local sandbox environment
     """
     try:
-        from app.services.sandbox_service import SandboxService
-        
-        sandbox_service = SandboxService()
         result = await sandbox_service.deploy_local_sandbox(environment)
         
         return JSONResponse({
@@ -492,14 +604,11 @@ async def deploy_sandbox(environment: str = "ubuntu20"):
         raise HTTPException(status_code=500, detail=f"Sandbox deployment failed: {str(e)}")
 
 @ioc_router.get("/sandbox/stats")
-async def get_sandbox_stats():
+async def get_sandbox_stats(sandbox_service: SandboxService = Depends(get_sandbox_service)):
     """
     Get sandbox service statistics
     """
     try:
-        from app.services.sandbox_service import SandboxService
-        
-        sandbox_service = SandboxService()
         stats = await sandbox_service.get_sandbox_stats()
         
         return JSONResponse({
@@ -512,14 +621,14 @@ async def get_sandbox_stats():
         raise HTTPException(status_code=500, detail=f"Failed to get sandbox stats: {str(e)}")
 
 @ioc_router.delete("/sandbox/analysis/{analysis_id}")
-async def stop_sandbox_analysis(analysis_id: str):
+async def stop_sandbox_analysis(
+    analysis_id: str,
+    sandbox_service: SandboxService = Depends(get_sandbox_service)
+):
     """
     Stop a running sandbox analysis
     """
     try:
-        from app.services.sandbox_service import SandboxService
-        
-        sandbox_service = SandboxService()
         result = await sandbox_service.stop_analysis(analysis_id)
         
         return JSONResponse({
@@ -532,14 +641,14 @@ async def stop_sandbox_analysis(analysis_id: str):
         raise HTTPException(status_code=500, detail=f"Failed to stop sandbox analysis: {str(e)}")
 
 @ioc_router.post("/feeds/add")
-async def add_threat_feed(feed_config: dict):
+async def add_threat_feed(
+    feed_config: dict,
+    feed_service: ThreatFeedService = Depends(get_feed_service)
+):
     """
     Add a new threat intelligence feed
     """
     try:
-        from app.services.threat_feed_service import ThreatFeedService
-        
-        feed_service = ThreatFeedService()
         result = await feed_service.add_feed(feed_config)
         
         return JSONResponse({
@@ -552,14 +661,11 @@ async def add_threat_feed(feed_config: dict):
         raise HTTPException(status_code=500, detail=f"Failed to add threat feed: {str(e)}")
 
 @ioc_router.get("/feeds")
-async def list_threat_feeds():
+async def list_threat_feeds(feed_service: ThreatFeedService = Depends(get_feed_service)):
     """
     List all configured threat intelligence feeds
     """
     try:
-        from app.services.threat_feed_service import ThreatFeedService
-        
-        feed_service = ThreatFeedService()
         feeds = await feed_service.list_feeds()
         
         return JSONResponse({
@@ -572,14 +678,14 @@ async def list_threat_feeds():
         raise HTTPException(status_code=500, detail=f"Failed to list threat feeds: {str(e)}")
 
 @ioc_router.post("/feeds/{feed_id}/update")
-async def update_threat_feed(feed_id: str):
+async def update_threat_feed(
+    feed_id: str,
+    feed_service: ThreatFeedService = Depends(get_feed_service)
+):
     """
     Update a specific threat intelligence feed
     """
     try:
-        from app.services.threat_feed_service import ThreatFeedService
-        
-        feed_service = ThreatFeedService()
         result = await feed_service.update_feed(feed_id)
         
         return JSONResponse({
@@ -592,14 +698,11 @@ async def update_threat_feed(feed_id: str):
         raise HTTPException(status_code=500, detail=f"Failed to update threat feed: {str(e)}")
 
 @ioc_router.post("/feeds/update-all")
-async def update_all_threat_feeds():
+async def update_all_threat_feeds(feed_service: ThreatFeedService = Depends(get_feed_service)):
     """
     Update all active threat intelligence feeds
     """
     try:
-        from app.services.threat_feed_service import ThreatFeedService
-        
-        feed_service = ThreatFeedService()
         result = await feed_service.update_all_feeds()
         
         return JSONResponse({
@@ -612,14 +715,14 @@ async def update_all_threat_feeds():
         raise HTTPException(status_code=500, detail=f"Failed to update threat feeds: {str(e)}")
 
 @ioc_router.delete("/feeds/{feed_id}")
-async def delete_threat_feed(feed_id: str):
+async def delete_threat_feed(
+    feed_id: str,
+    feed_service: ThreatFeedService = Depends(get_feed_service)
+):
     """
     Delete a threat intelligence feed
     """
     try:
-        from app.services.threat_feed_service import ThreatFeedService
-        
-        feed_service = ThreatFeedService()
         result = await feed_service.delete_feed(feed_id)
         
         return JSONResponse({
@@ -632,14 +735,11 @@ async def delete_threat_feed(feed_id: str):
         raise HTTPException(status_code=500, detail=f"Failed to delete threat feed: {str(e)}")
 
 @ioc_router.get("/feeds/stats")
-async def get_threat_feed_stats():
+async def get_threat_feed_stats(feed_service: ThreatFeedService = Depends(get_feed_service)):
     """
     Get threat feed statistics
     """
     try:
-        from app.services.threat_feed_service import ThreatFeedService
-        
-        feed_service = ThreatFeedService()
         stats = await feed_service.get_feed_stats()
         
         return JSONResponse({
@@ -651,16 +751,44 @@ async def get_threat_feed_stats():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get threat feed stats: {str(e)}")
 
+@ioc_router.get("/feeds/lookup/{ioc_value}")
+async def lookup_threat_feeds(
+    ioc_value: str,
+    ioc_type: Optional[str] = None,
+    feed_service: ThreatFeedService = Depends(get_feed_service)
+):
+    """
+    List the local threat feeds that currently contain an IOC
+    """
+    try:
+        feeds = await feed_service.lookup_indicator(ioc_value, ioc_type)
+        
+        return JSONResponse({
+            "success": True,
+            "message": "Threat feed lookup completed",
+            "data": {
+                "ioc_value": ioc_value,
+                "ioc_type": ioc_type,
+                "listed": bool(feeds),
+                "feeds": feeds
+            }
+        })
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to look up threat feeds: {str(e)}")
+
 @ioc_router.get("/feeds/search/{ioc_value}")
-async def search_threat_feeds(ioc_value: str, ioc_type: Optional[str] = None):
+async def search_threat_feeds(
+    ioc_value: str,
+    ioc_type: Optional[str] = None,
+    include_expired: bool = False,
+    feed_service: ThreatFeedService = Depends(get_feed_service)
+):
     """
     Search for an IOC in local threat feeds
     """
     try:
-        from app.services.threat_feed_service import ThreatFeedService
-        
-        feed_service = ThreatFeedService()
-        results = await feed_service.search_indicators(ioc_value, ioc_type)
+        results = await feed_service.search_indicators(ioc_value, ioc_type, include_expired)
         
         return JSONResponse({
             "success": True,
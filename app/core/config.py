@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, Dict, Any
 import os
 
 class Settings(BaseModel):
@@ -24,11 +24,81 @@ class Settings(BaseModel):
     urlscan_api_key: Optional[str] = None
     otx_api_key: Optional[str] = None
     
+    # HTTP Client Configuration
+    http_timeout: float = 30.0
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0
+    http2_enabled: bool = False
+    
     # Rate Limiting
     rate_limit_per_minute: int = 60
+    rate_limit_max_retries: int = 3
+    provider_rate_limits: Dict[str, Dict[str, Any]] = {
+        "virustotal": {"requests_per_minute": 4, "burst": 4, "max_concurrent": 4, "daily_quota": 500},
+        "abuseipdb": {"requests_per_minute": 60, "burst": 10, "max_concurrent": 5, "daily_quota": 1000},
+        "urlscan": {"requests_per_minute": 60, "burst": 10, "max_concurrent": 5, "daily_quota": 1000},
+        "otx": {"requests_per_minute": 100, "burst": 20, "max_concurrent": 10, "daily_quota": None}
+    }
+    
+    # Analysis Store
+    analysis_store_max_entries: int = 10000
+    analysis_store_ttl: int = 24 * 3600
+    analysis_store_max_bytes: int = 256 * 1024 * 1024
+    
+    # Persistent Analysis Storage
+    analysis_db_path: str = "analyses.db"
+    analysis_flush_interval: float = 0.5
+    analysis_flush_batch_size: int = 500
+    analysis_reuse_ttl: int = 3600  # serve stored analyses younger than this; 0 disables
+    
+    # Batch Analysis
+    batch_max_concurrency: int = 10
+    
+    # Batch Jobs
+    jobs_db_path: str = "batch_jobs.db"
+    job_workers: int = 2
+    job_chunk_size: int = 200
+    job_claim_timeout: float = 600.0  # seconds before a chunk claimed by a worker that died is processed again
+    
+    # Threat Feeds
+    threat_feeds_db_path: str = "threat_feeds.db"
+    threat_feeds_db_pool_size: int = 4
+    threat_feeds_cache_kb: int = 64 * 1024  # SQLite page cache per connection
+    threat_feeds_insert_batch_size: int = 10000
+    threat_feeds_bulk_index_threshold: int = 250000  # rebuild indexes after loads this large
+    threat_feeds_chunk_size: int = 1024 * 1024  # download read size
+    threat_feeds_index_backend: str = "memory"  # memory, snapshot (shared by workers) or none
+    threat_feeds_snapshot_check_interval: float = 0.0  # seconds between checks for a newer snapshot or filter file; above 0, lookups may miss that long
+    threat_feeds_index_sync_interval: float = 1.0  # seconds between checks for other workers' changes to the memory index; lookups may miss them that long
+    threat_feeds_bloom_enabled: bool = True
+    threat_feeds_bloom_fp_rate: float = 0.001
+    threat_feeds_scheduler_enabled: bool = True
+    threat_feeds_poll_interval: float = 30.0  # seconds between due-feed checks
+    threat_feeds_update_jitter: float = 0.1  # fraction of the update interval
+    threat_feeds_retry_delay: int = 300  # seconds before retrying a failed feed
+    threat_feeds_min_update_ratio: float = 0.0  # reject updates keeping less than this fraction of a feed's active indicators
+    threat_feeds_max_concurrent_downloads: int = 8
+    threat_feeds_max_bandwidth: int = 0  # bytes per second across all downloads; 0 is unlimited
+    threat_feeds_spool_dir: Optional[str] = None  # where downloads are spooled; system temp directory by default
+    
+    # File Uploads
+    max_upload_size: int = 100 * 1024 * 1024  # 100MB
+    upload_chunk_size: int = 1024 * 1024  # 1MB
+    file_hash_strategy: str = "fallback"  # fallback or concurrent
     
     # Cache Configuration
     cache_ttl: int = 3600  # 1 hour
+    cache_backend: str = "memory"  # memory, sqlite, redis or none
+    cache_max_entries: int = 10000
+    cache_sqlite_path: str = "threat_intel_cache.db"
+    cache_negative_ttl: int = 600  # not_found results
+    cache_provider_ttls: Dict[str, int] = {
+        "virustotal": 6 * 3600,
+        "abuseipdb": 3600,
+        "urlscan": 1800,
+        "otx": 3600
+    }
 
 # Global settings instance
 settings = Settings()
@@ -89,3 +89,8 @@ class BatchAnalysisResponse(BaseModel):
     message: str
     results: List[IOCAnalysis] = Field(default_factory=list)
     failed_indicators: List[str] = Field(default_factory=list)
+
+class BatchJobRequest(BaseModel):
+    """Request model for asynchronous batch analysis jobs"""
+    indicators: List[str] = Field(..., min_items=1, max_items=100000)
+    description: Optional[str] = None
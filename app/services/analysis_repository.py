@@ -0,0 +1,281 @@
+import asyncio
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Union
+from app.core.config import settings
+from app.models.ioc import IOCAnalysis
+
+AnalysisRecord = Union[IOCAnalysis, Dict[str, Any]]
+
+class AnalysisRepository:
+    """Persistent SQLite store for IOC and file analyses with write-behind batching"""
+    
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        flush_interval: Optional[float] = None,
+        batch_size: Optional[int] = None
+    ):
+        self.db_path = db_path or settings.analysis_db_path
+        self.flush_interval = flush_interval or settings.analysis_flush_interval
+        self.batch_size = batch_size or settings.analysis_flush_batch_size
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        # analysis_id -> row awaiting write; repeated updates of one record coalesce
+        self._pending: Dict[str, tuple] = {}
+        # md5/sha1/sha256 of an uploaded sample -> its sha256, awaiting write
+        self._pending_aliases: Dict[str, str] = {}
+        self._batch_ready: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self.rows_written = 0
+        self.flush_count = 0
+        self.initialize_database()
+    
+    def initialize_database(self):
+        """Initialize the analyses database"""
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS analyses (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    indicator TEXT,
+                    ioc_type TEXT,
+                    status TEXT,
+                    verdict TEXT,
+                    created_at TIMESTAMP,
+                    updated_at TIMESTAMP,
+                    data TEXT NOT NULL
+                )
+            ''')
+            
+            # Content-addressed sample index: every hash of a sample resolves to its SHA-256
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sample_hashes (
+                    hash TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL
+                )
+            ''')
+            
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_analyses_indicator ON analyses(indicator, created_at)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_analyses_verdict ON analyses(verdict)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_analyses_created_at ON analyses(created_at)')
+            self._conn.commit()
+    
+    async def start(self):
+        """Start the background flusher"""
+        self._batch_ready = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flusher = asyncio.create_task(self._flush_loop())
+    
+    async def stop(self):
+        """Stop the flusher, write any pending records and close the database"""
+        if self._flusher:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        
+        await self.flush()
+        
+        with self._lock:
+            self._conn.close()
+    
+    @staticmethod
+    def _to_row(analysis_id: str, record: AnalysisRecord) -> tuple:
+        """Serialize a record into an analyses row"""
+        if isinstance(record, IOCAnalysis):
+            return (
+                analysis_id,
+                "ioc",
+                record.indicator,
+                record.ioc_type.value,
+                record.status.value,
+                record.verdict.value if record.verdict else None,
+                record.created_at,
+                record.updated_at,
+                record.model_dump_json()
+            )
+        
+        verdict = record.get("verdict")
+        return (
+            analysis_id,
+            "file",
+            record.get("sha256_hash"),
+            "file",
+            record.get("status"),
+            verdict.lower() if isinstance(verdict, str) else None,
+            record.get("created_at"),
+            record.get("updated_at"),
+            json.dumps(record, default=str)
+        )
+    
+    @staticmethod
+    def _from_row(kind: str, data: str) -> AnalysisRecord:
+        """Deserialize a stored record"""
+        if kind == "ioc":
+            return IOCAnalysis.model_validate_json(data)
+        return json.loads(data)
+    
+    def save(self, analysis_id: str, record: AnalysisRecord):
+        """Queue a record for the next batched write; the record is snapshotted now"""
+        self._pending[analysis_id] = self._to_row(analysis_id, record)
+        
+        if not isinstance(record, IOCAnalysis) and record.get("sha256_hash"):
+            sha256 = record["sha256_hash"]
+            for hash_key in ("md5_hash", "sha1_hash", "sha256_hash"):
+                if record.get(hash_key):
+                    self._pending_aliases[record[hash_key]] = sha256
+        
+        if self._batch_ready is not None and len(self._pending) >= self.batch_size:
+            self._batch_ready.set()
+    
+    async def _flush_loop(self):
+        """Flush pending writes every flush_interval, or sooner when a batch fills up"""
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            
+            self._batch_ready.clear()
+            
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Failed to persist analyses: {e}")
+    
+    async def flush(self):
+        """
+        Write all pending records in a single transaction off the event loop
+        
+        Records stay pending, and readable, until their write commits, so a failed
+        write leaves them for the next flush instead of losing them.
+        """
+        rows = dict(self._pending)
+        aliases = dict(self._pending_aliases)
+        if not rows and not aliases:
+            return
+        
+        if self._flush_lock is None:
+            self._write_rows(list(rows.values()), list(aliases.items()))
+        else:
+            async with self._flush_lock:
+                await asyncio.to_thread(self._write_rows, list(rows.values()), list(aliases.items()))
+        
+        # Keep anything saved again while the write was in flight for the next flush
+        for analysis_id, row in rows.items():
+            if self._pending.get(analysis_id) is row:
+                del self._pending[analysis_id]
+        for hash_value, sha256 in aliases.items():
+            if self._pending_aliases.get(hash_value) == sha256:
+                del self._pending_aliases[hash_value]
+    
+    def _write_rows(self, rows: List[tuple], aliases: List[tuple] = ()):
+        with self._lock:
+            try:
+                self._conn.executemany('''
+                    INSERT OR REPLACE INTO analyses
+                    (id, kind, indicator, ioc_type, status, verdict, created_at, updated_at, data)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO sample_hashes (hash, sha256) VALUES (?, ?)', aliases
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        
+        self.rows_written += len(rows)
+        self.flush_count += 1
+    
+    def _query(self, query: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(query, params).fetchall()
+    
+    async def get(self, analysis_id: str) -> Optional[AnalysisRecord]:
+        """Get an analysis by ID, including records not yet flushed"""
+        pending = self._pending.get(analysis_id)
+        if pending is not None:
+            return self._from_row(pending[1], pending[8])
+        
+        rows = await asyncio.to_thread(
+            self._query, 'SELECT kind, data FROM analyses WHERE id = ?', (analysis_id,)
+        )
+        if not rows:
+            return None
+        
+        return self._from_row(*rows[0])
+    
+    async def find_by_indicator(
+        self,
+        indicator: str,
+        ioc_type: str,
+        max_age: Optional[int] = None
+    ) -> Optional[AnalysisRecord]:
+        """
+        Get the most recent completed analysis of a normalized indicator
+        
+        Args:
+            indicator: Normalized indicator (or SHA-256 for file analyses)
+            ioc_type: The IOC type ("file" for file analyses)
+            max_age: Ignore analyses older than this many seconds
+        
+        Returns:
+            The analysis record, or None if there is no usable one
+        """
+        since = ""
+        if max_age:
+            since = (datetime.utcnow() - timedelta(seconds=max_age)).isoformat()
+        
+        # Records written within the last flush interval are not in the table yet
+        for row in reversed(list(self._pending.values())):
+            if row[2] == indicator and row[3] == ioc_type and row[4] == "completed" and (row[6] or "") >= since:
+                return self._from_row(row[1], row[8])
+        
+        rows = await asyncio.to_thread(
+            self._query,
+            '''
+                SELECT kind, data FROM analyses
+                WHERE indicator = ? AND ioc_type = ? AND status = 'completed' AND created_at >= ?
+                ORDER BY created_at DESC LIMIT 1
+            ''',
+            (indicator, ioc_type, since)
+        )
+        if not rows:
+            return None
+        
+        return self._from_row(*rows[0])
+    
+    async def resolve_sample_hash(self, hash_value: str) -> Optional[str]:
+        """Get the SHA-256 of the uploaded sample with this MD5, SHA-1 or SHA-256"""
+        sha256 = self._pending_aliases.get(hash_value)
+        if sha256 is not None:
+            return sha256
+        
+        rows = await asyncio.to_thread(
+            self._query, 'SELECT sha256 FROM sample_hashes WHERE hash = ?', (hash_value,)
+        )
+        return rows[0][0] if rows else None
+    
+    async def count_by_status_and_verdict(self) -> List[tuple]:
+        """Get (status, verdict, count) rows for every stored analysis"""
+        await self.flush()
+        return await asyncio.to_thread(
+            self._query, 'SELECT status, verdict, COUNT(*) FROM analyses GROUP BY status, verdict'
+        )
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get write-behind statistics"""
+        return {
+            "pending_writes": len(self._pending) + len(self._pending_aliases),
+            "rows_written": self.rows_written,
+            "flushes": self.flush_count
+        }
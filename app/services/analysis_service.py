@@ -0,0 +1,225 @@
+import asyncio
+import uuid
+from datetime import datetime
+from typing import Dict, Any, Optional, Union
+from app.core.config import settings
+from app.models.ioc import IOCAnalysis, IOCStatus, IOCType
+from app.services.threat_intel import ThreatIntelService
+from app.services.analysis_engine import AnalysisEngine
+from app.services.single_flight import SingleFlight
+from app.services.analysis_store import AnalysisStore
+from app.services.analysis_repository import AnalysisRepository
+from app.services.analysis_stats import AnalysisStats
+
+HASH_TYPES = {IOCType.HASH_MD5, IOCType.HASH_SHA1, IOCType.HASH_SHA256}
+
+# Strongest first; weaker hashes identify the same sample with less certainty
+FILE_HASH_ORDER = [IOCType.HASH_SHA256, IOCType.HASH_SHA1, IOCType.HASH_MD5]
+
+def is_known_hash(analysis: IOCAnalysis) -> bool:
+    """Check whether any provider has a record of an analyzed hash"""
+    for result in (analysis.virustotal_results, analysis.abuseipdb_results,
+                   analysis.urlscan_results, analysis.otx_results):
+        if not result or result.get("status") != "success":
+            continue
+        # OTX answers every file lookup; only pulses mean it has seen the sample
+        if result is analysis.otx_results and not result.get("pulse_count"):
+            continue
+        return True
+    return False
+
+class AnalysisService:
+    """Runs IOC analyses end to end and records them in the analysis store"""
+    
+    def __init__(
+        self,
+        threat_intel_service: ThreatIntelService,
+        analysis_engine: Optional[AnalysisEngine] = None,
+        store: Optional[AnalysisStore] = None,
+        repository: Optional[AnalysisRepository] = None
+    ):
+        self.threat_intel_service = threat_intel_service
+        self.analysis_engine = analysis_engine or AnalysisEngine()
+        self.store = store if store is not None else AnalysisStore()
+        self.repository = repository
+        self.reuse_ttl = settings.analysis_reuse_ttl
+        self.flights = SingleFlight()
+        self.stats = AnalysisStats()
+    
+    async def load_stats(self):
+        """Rebuild the status and verdict counters once from persistent storage"""
+        if self.repository is not None:
+            self.stats.load(await self.repository.count_by_status_and_verdict())
+    
+    def record(self, analysis_id: str, analysis: Union[IOCAnalysis, Dict[str, Any]]):
+        """Store an analysis record in memory, queue it for persistence and update counters"""
+        self.store.put(analysis_id, analysis)
+        
+        if isinstance(analysis, IOCAnalysis):
+            self.stats.observe(analysis_id, analysis.status, analysis.verdict)
+        else:
+            self.stats.observe(analysis_id, analysis.get("status"), analysis.get("verdict"))
+        
+        if self.repository is not None:
+            self.repository.save(analysis_id, analysis)
+    
+    async def get_analysis(self, analysis_id: str) -> Optional[Union[IOCAnalysis, Dict[str, Any]]]:
+        """Get an analysis record from memory, falling back to persistent storage"""
+        analysis = self.store.get(analysis_id)
+        
+        if analysis is None and self.repository is not None:
+            analysis = await self.repository.get(analysis_id)
+            if analysis is not None:
+                self.store.put(analysis_id, analysis)
+        
+        return analysis
+    
+    async def analyze(self, normalized_indicator: str, ioc_type: IOCType) -> IOCAnalysis:
+        """
+        Analyze a normalized IOC
+        
+        Concurrent requests for the same indicator share one provider fan-out
+        and receive the same IOCAnalysis record.
+        
+        Args:
+            normalized_indicator: The IOC, already normalized by IOCParser
+            ioc_type: The type of IOC
+        
+        Returns:
+            The completed analysis; raises if the analysis failed
+        """
+        key = f"{ioc_type.value}:{normalized_indicator}"
+        return await self.flights.do(
+            key, lambda: self._analyze_or_reuse(normalized_indicator, ioc_type)
+        )
+    
+    async def find_file_analysis(self, sha256: str) -> Optional[Dict[str, Any]]:
+        """Get a recent completed analysis of the uploaded sample with this SHA-256"""
+        if self.repository is None or not self.reuse_ttl:
+            return None
+        
+        existing = await self.repository.find_by_indicator(sha256, "file", self.reuse_ttl)
+        if existing is not None:
+            self.store.put(existing["id"], existing)
+        
+        return existing
+    
+    async def analyze_file_hashes(
+        self,
+        hashes: Dict[IOCType, str],
+        strategy: Optional[str] = None
+    ) -> Dict[IOCType, Union[IOCAnalysis, Exception, None]]:
+        """
+        Look up the hashes of a file sample
+        
+        Args:
+            hashes: Hash type to normalized hash value
+            strategy: "fallback" queries the strongest hash first and only tries weaker
+                hashes while providers have no record of the sample; "concurrent"
+                queries all hashes at once under the shared provider rate limits
+        
+        Returns:
+            Hash type to its analysis, the exception it raised, or None if skipped
+        """
+        strategy = strategy or settings.file_hash_strategy
+        ordered = [hash_type for hash_type in FILE_HASH_ORDER if hashes.get(hash_type)]
+        
+        if strategy == "concurrent":
+            outcomes = await asyncio.gather(
+                *(self.analyze(hashes[hash_type], hash_type) for hash_type in ordered),
+                return_exceptions=True
+            )
+            return dict(zip(ordered, outcomes))
+        
+        if strategy != "fallback":
+            raise ValueError(f"Unknown file hash strategy: {strategy}")
+        
+        results: Dict[IOCType, Union[IOCAnalysis, Exception, None]] = {}
+        for hash_type in ordered:
+            if any(isinstance(outcome, IOCAnalysis) and is_known_hash(outcome) for outcome in results.values()):
+                results[hash_type] = None
+                continue
+            
+            try:
+                results[hash_type] = await self.analyze(hashes[hash_type], hash_type)
+            except Exception as e:
+                results[hash_type] = e
+        
+        return results
+    
+    async def _find_reusable(self, normalized_indicator: str, ioc_type: IOCType) -> Optional[IOCAnalysis]:
+        """Find a recent analysis of the indicator, resolving file hashes to their SHA-256"""
+        existing = await self.repository.find_by_indicator(
+            normalized_indicator, ioc_type.value, self.reuse_ttl
+        )
+        
+        if existing is None and ioc_type in HASH_TYPES:
+            # An MD5 or SHA-1 of a known sample is answered by its SHA-256 analysis
+            sha256 = await self.repository.resolve_sample_hash(normalized_indicator)
+            if sha256 is not None and sha256 != normalized_indicator:
+                by_sha256 = await self.repository.find_by_indicator(
+                    sha256, IOCType.HASH_SHA256.value, self.reuse_ttl
+                )
+                # A SHA-256 miss says nothing about what providers know of the weaker hash
+                if by_sha256 is not None and is_known_hash(by_sha256):
+                    existing = by_sha256
+        
+        return existing
+    
+    async def _analyze_or_reuse(self, normalized_indicator: str, ioc_type: IOCType) -> IOCAnalysis:
+        """Serve a recent stored analysis of the indicator, or run a new one"""
+        if self.repository is not None and self.reuse_ttl:
+            existing = await self._find_reusable(normalized_indicator, ioc_type)
+            if existing is not None:
+                self.store.put(existing.id, existing)
+                return existing
+        
+        return await self._run_analysis(normalized_indicator, ioc_type)
+    
+    async def _run_analysis(self, normalized_indicator: str, ioc_type: IOCType) -> IOCAnalysis:
+        """Query threat intel providers and build the analysis record"""
+        analysis_id = str(uuid.uuid4())
+        
+        # Create initial analysis record
+        analysis = IOCAnalysis(
+            id=analysis_id,
+            indicator=normalized_indicator,
+            ioc_type=ioc_type,
+            status=IOCStatus.ANALYZING,
+            created_at=datetime.utcnow().isoformat(),
+            updated_at=datetime.utcnow().isoformat()
+        )
+        self.record(analysis_id, analysis)
+        
+        try:
+            # Query threat intelligence services
+            threat_intel_results = await self.threat_intel_service.analyze_ioc(
+                normalized_indicator, ioc_type.value
+            )
+            
+            # Analyze results and generate verdict
+            analysis_results = self.analysis_engine.analyze_results(threat_intel_results)
+            
+            # Update analysis record
+            analysis.status = IOCStatus.COMPLETED
+            analysis.verdict = analysis_results["verdict"]
+            analysis.confidence_score = analysis_results["confidence_score"]
+            analysis.threat_score = analysis_results["threat_score"]
+            analysis.evidence = analysis_results["evidence"]
+            analysis.tags = analysis_results["tags"]
+            analysis.updated_at = datetime.utcnow().isoformat()
+            
+            # Store threat intelligence results
+            analysis.virustotal_results = threat_intel_results["results"].get("virustotal")
+            analysis.abuseipdb_results = threat_intel_results["results"].get("abuseipdb")
+            analysis.urlscan_results = threat_intel_results["results"].get("urlscan")
+            analysis.otx_results = threat_intel_results["results"].get("otx")
+            
+            self.record(analysis_id, analysis)
+            return analysis
+        
+        except Exception:
+            analysis.status = IOCStatus.FAILED
+            analysis.updated_at = datetime.utcnow().isoformat()
+            self.record(analysis_id, analysis)
+            raise
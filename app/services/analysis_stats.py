@@ -0,0 +1,62 @@
+from typing import Dict, Any, Optional, Tuple
+
+TERMINAL_STATUSES = {"completed", "failed"}
+
+class AnalysisStats:
+    """Status and verdict counters maintained incrementally on every analysis state change"""
+    
+    def __init__(self):
+        self.status_counts: Dict[str, int] = {}
+        self.verdict_counts: Dict[str, int] = {}
+        # Only analyses that can still change state are tracked, so memory is
+        # bounded by the number of in-flight analyses rather than history size
+        self._active: Dict[str, Tuple[str, Optional[str]]] = {}
+    
+    @staticmethod
+    def _normalize(value: Any) -> Optional[str]:
+        if value is None:
+            return None
+        return str(getattr(value, "value", value)).lower()
+    
+    def _adjust(self, status: str, verdict: Optional[str], delta: int):
+        self.status_counts[status] = self.status_counts.get(status, 0) + delta
+        if verdict:
+            self.verdict_counts[verdict] = self.verdict_counts.get(verdict, 0) + delta
+    
+    def observe(self, analysis_id: str, status: Any, verdict: Any = None):
+        """Record the current state of an analysis, replacing its previous state"""
+        status = self._normalize(status)
+        verdict = self._normalize(verdict)
+        
+        previous = self._active.pop(analysis_id, None)
+        if previous is not None:
+            self._adjust(previous[0], previous[1], -1)
+        
+        self._adjust(status, verdict, 1)
+        
+        if status not in TERMINAL_STATUSES:
+            self._active[analysis_id] = (status, verdict)
+    
+    def load(self, rows):
+        """Seed the counters from persisted (status, verdict, count) rows"""
+        self.status_counts = {}
+        self.verdict_counts = {}
+        
+        for status, verdict, count in rows:
+            status = self._normalize(status)
+            verdict = self._normalize(verdict)
+            self.status_counts[status] = self.status_counts.get(status, 0) + count
+            if verdict:
+                self.verdict_counts[verdict] = self.verdict_counts.get(verdict, 0) + count
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Get the current counters"""
+        return {
+            "total_analyses": sum(self.status_counts.values()),
+            "completed": self.status_counts.get("completed", 0),
+            "failed": self.status_counts.get("failed", 0),
+            "pending": self.status_counts.get("analyzing", 0) + self.status_counts.get("pending", 0),
+            "verdict_distribution": {
+                verdict: count for verdict, count in self.verdict_counts.items() if count
+            }
+        }
@@ -0,0 +1,108 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Iterator, Optional, Tuple
+from pydantic import BaseModel
+
+class AnalysisStore:
+    """Bounded in-memory store for analysis records with LRU, TTL and memory-budget eviction"""
+    
+    def __init__(self, max_entries: int = 10000, ttl: Optional[int] = 86400, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        # analysis_id -> (stored_at, size_in_bytes, record)
+        self._entries: "OrderedDict[str, Tuple[float, int, Any]]" = OrderedDict()
+        self.evictions = {"lru": 0, "ttl": 0, "memory": 0}
+    
+    @staticmethod
+    def _estimate_size(record: Any) -> int:
+        """Estimate a record's footprint from its serialized size"""
+        if isinstance(record, BaseModel):
+            return len(record.model_dump_json())
+        return len(json.dumps(record, default=str))
+    
+    def _is_expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and time.monotonic() - stored_at > self.ttl
+    
+    def _remove(self, analysis_id: str) -> Any:
+        _, size, record = self._entries.pop(analysis_id)
+        self.total_bytes -= size
+        return record
+    
+    def get(self, analysis_id: str) -> Optional[Any]:
+        """Return a stored record, or None if missing or expired"""
+        entry = self._entries.get(analysis_id)
+        if entry is None:
+            return None
+        
+        if self._is_expired(entry[0]):
+            self._remove(analysis_id)
+            self.evictions["ttl"] += 1
+            return None
+        
+        self._entries.move_to_end(analysis_id)
+        return entry[2]
+    
+    def put(self, analysis_id: str, record: Any):
+        """Store or replace a record, evicting old records to stay within bounds"""
+        if analysis_id in self._entries:
+            self._remove(analysis_id)
+        
+        size = self._estimate_size(record)
+        self._entries[analysis_id] = (time.monotonic(), size, record)
+        self.total_bytes += size
+        self._evict()
+    
+    def _evict(self):
+        """Drop expired records, then least recently used ones until within limits"""
+        while self._entries:
+            oldest_id, (stored_at, _, _) = next(iter(self._entries.items()))
+            
+            if self._is_expired(stored_at):
+                reason = "ttl"
+            elif len(self._entries) > self.max_entries:
+                reason = "lru"
+            elif self.max_bytes is not None and self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                reason = "memory"
+            else:
+                break
+            
+            self._remove(oldest_id)
+            self.evictions[reason] += 1
+    
+    def delete(self, analysis_id: str):
+        """Remove a record if present"""
+        if analysis_id in self._entries:
+            self._remove(analysis_id)
+    
+    def values(self) -> Iterator[Any]:
+        """Iterate over stored records"""
+        return (entry[2] for entry in self._entries.values())
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get store size and eviction metrics"""
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "evictions": dict(self.evictions)
+        }
+    
+    def __contains__(self, analysis_id: str) -> bool:
+        return self.get(analysis_id) is not None
+    
+    def __getitem__(self, analysis_id: str) -> Any:
+        record = self.get(analysis_id)
+        if record is None:
+            raise KeyError(analysis_id)
+        return record
+    
+    def __setitem__(self, analysis_id: str, record: Any):
+        self.put(analysis_id, record)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,170 @@
+import asyncio
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
+from app.core.config import settings
+from app.models.ioc import IOCAnalysis
+from app.services.ioc_parser import IOCParser
+from app.services.analysis_service import AnalysisService
+
+class BatchExecutor:
+    """Analyzes batches of IOCs concurrently, deduplicating normalized indicators"""
+    
+    def __init__(
+        self,
+        analysis_service: AnalysisService,
+        ioc_parser: Optional[IOCParser] = None,
+        max_concurrency: Optional[int] = None
+    ):
+        self.analysis_service = analysis_service
+        self.ioc_parser = ioc_parser or IOCParser()
+        self.max_concurrency = max_concurrency or settings.batch_max_concurrency
+    
+    def prepare(self, indicators: List[str]) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """
+        Parse and normalize a batch of indicators
+        
+        Returns:
+            Tuple of (one item per input indicator, unique valid items keyed by normalized IOC)
+        """
+        items = []
+        unique = {}
+        
+        for indicator in indicators:
+            ioc_type, is_valid, error_message = self.ioc_parser.parse_ioc(indicator)
+            
+            if not is_valid:
+                items.append({"indicator": indicator, "error": error_message})
+                continue
+            
+            normalized_indicator = self.ioc_parser.normalize_ioc(indicator, ioc_type)
+            key = f"{ioc_type.value}:{normalized_indicator}"
+            item = {
+                "indicator": indicator,
+                "key": key,
+                "ioc_type": ioc_type,
+                "normalized": normalized_indicator
+            }
+            items.append(item)
+            unique.setdefault(key, item)
+        
+        return items, unique
+    
+    async def analyze_unique(self, unique: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Analyze each unique indicator with bounded concurrency
+        
+        Returns:
+            Mapping of key to IOCAnalysis, or to the exception raised for that indicator
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def run(item: Dict[str, Any]):
+            async with semaphore:
+                return await self.analysis_service.analyze(item["normalized"], item["ioc_type"])
+        
+        keys = list(unique.keys())
+        outcomes = await asyncio.gather(
+            *(run(unique[key]) for key in keys), return_exceptions=True
+        )
+        
+        return dict(zip(keys, outcomes))
+    
+    async def run(self, indicators: List[str]) -> Tuple[List[IOCAnalysis], List[str]]:
+        """
+        Analyze a batch of indicators
+        
+        Args:
+            indicators: Raw indicators in submission order
+        
+        Returns:
+            Tuple of (successful analyses, failure messages), both in input order
+        """
+        items, unique = self.prepare(indicators)
+        outcomes = await self.analyze_unique(unique)
+        
+        results = []
+        failed_indicators = []
+        
+        for item in items:
+            if "error" in item:
+                failed_indicators.append(f"{item['indicator']}: {item['error']}")
+                continue
+            
+            outcome = outcomes[item["key"]]
+            if isinstance(outcome, Exception):
+                failed_indicators.append(f"{item['indicator']}: Analysis failed - {str(outcome)}")
+            else:
+                results.append(outcome)
+        
+        return results, failed_indicators
+    
+    async def _analyze_item(self, position: int, indicator: str) -> Dict[str, Any]:
+        """Analyze one streamed indicator and build its result line"""
+        result = {"position": position, "indicator": indicator}
+        
+        ioc_type, is_valid, error_message = self.ioc_parser.parse_ioc(indicator)
+        if not is_valid:
+            result.update({"status": "failed", "error": error_message})
+            return result
+        
+        normalized_indicator = self.ioc_parser.normalize_ioc(indicator, ioc_type)
+        
+        try:
+            analysis = await self.analysis_service.analyze(normalized_indicator, ioc_type)
+            result.update({"status": "completed", "analysis": analysis.model_dump(mode="json")})
+        except Exception as e:
+            result.update({"status": "failed", "error": f"Analysis failed - {str(e)}"})
+        
+        return result
+    
+    async def stream(self, indicators: AsyncIterator[str]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Analyze an indicator stream of any length, yielding results as they complete
+        
+        At most max_concurrency indicators are running or waiting to be consumed at
+        any time, so input is only read as fast as results are taken.
+        
+        Args:
+            indicators: Async iterator of raw indicators
+            
+        Yields:
+            One result dict per indicator, tagged with its input position
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results: asyncio.Queue = asyncio.Queue()
+        tasks = set()
+        finished = object()
+        
+        async def analyze_one(position: int, indicator: str):
+            results.put_nowait(await self._analyze_item(position, indicator))
+        
+        async def produce():
+            try:
+                position = 0
+                async for indicator in indicators:
+                    await semaphore.acquire()
+                    task = asyncio.create_task(analyze_one(position, indicator))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    position += 1
+                
+                await asyncio.gather(*tasks)
+            finally:
+                results.put_nowait(finished)
+        
+        producer = asyncio.create_task(produce())
+        
+        try:
+            while True:
+                result = await results.get()
+                if result is finished:
+                    break
+                
+                yield result
+                semaphore.release()
+            
+            # Surface errors reading the input stream
+            await producer
+        finally:
+            producer.cancel()
+            for task in list(tasks):
+                task.cancel()
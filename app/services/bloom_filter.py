@@ -0,0 +1,280 @@
+import hashlib
+import json
+import math
+import os
+import struct
+import tempfile
+import time
+from typing import Dict, Any, Iterable, Optional, Set, Tuple
+from app.services.ip_ranges import RANGE_TYPE, ip_to_key, matches_type
+
+MAGIC = b'IOCBLOM1'
+
+# Filters are sized with headroom so feeds can grow before a rebuild
+MIN_CAPACITY = 1024
+CAPACITY_HEADROOM = 2
+
+# Bits set in each byte value
+POPCOUNT = bytes(bin(value).count('1') for value in range(256))
+
+# Hash values differ only in case; feeds and lookups may use either
+CASE_INSENSITIVE_TYPES = {'hash_md5', 'hash_sha1', 'hash_sha256'}
+
+def _hash_pair(value: str) -> Tuple[int, int]:
+    """Two independent 64-bit hashes of a value for double hashing"""
+    digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+    # An odd step visits distinct bit positions for every probe
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings using double hashing"""
+    
+    def __init__(self, bits: int, hashes: int, data: Optional[bytearray] = None, count: int = 0):
+        self.bits = bits
+        self.hashes = hashes
+        self.data = data if data is not None else bytearray((bits + 7) // 8)
+        self.count = count
+    
+    @classmethod
+    def for_capacity(cls, capacity: int, fp_rate: float) -> "BloomFilter":
+        """Create a filter that holds capacity values at the given false positive rate"""
+        bits = max(64, math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        hashes = max(1, round(bits / capacity * math.log(2)))
+        return cls(bits, hashes)
+    
+    def add(self, hash_pair: Tuple[int, int]):
+        bits, data = self.bits, self.data
+        position, step = hash_pair[0] % bits, hash_pair[1] % bits
+        for _ in range(self.hashes):
+            data[position >> 3] |= 1 << (position & 7)
+            position += step
+            if position >= bits:
+                position -= bits
+        self.count += 1
+    
+    def __contains__(self, hash_pair: Tuple[int, int]) -> bool:
+        bits, data = self.bits, self.data
+        position, step = hash_pair[0] % bits, hash_pair[1] % bits
+        for _ in range(self.hashes):
+            if not data[position >> 3] & (1 << (position & 7)):
+                return False
+            position += step
+            if position >= bits:
+                position -= bits
+        return True
+    
+    def fill_ratio(self) -> float:
+        """Fraction of bits set"""
+        return sum(self.data.translate(POPCOUNT)) / self.bits
+    
+    def false_positive_rate(self) -> float:
+        """Expected false positive rate at the current fill"""
+        return self.fill_ratio() ** self.hashes
+
+class IndicatorFilters:
+    """
+    A Bloom filter per IOC type that rules out indicators no feed lists
+    
+    Filters only ever gain values between rebuilds, so they stay a superset of the
+    active indicators: a miss is definite, a hit still needs a real lookup. The
+    filters are saved to disk and reloaded when another process saves a newer copy.
+    Workers may save their changes out of commit order, so the generation only
+    advances once the values of every change up to it are in.
+    """
+    
+    def __init__(self, path: str, fp_rate: float = 0.001, check_interval: float = 1.0):
+        self.path = path
+        self.fp_rate = fp_rate
+        self.check_interval = check_interval
+        self.filters: Dict[str, BloomFilter] = {}
+        # Database generation up to which every change's values are in the filters
+        self.generation: Optional[int] = None
+        # Later generations already added while an earlier one is still missing
+        self.later_generations: Set[int] = set()
+        self.loaded = False
+        self._unsized_types = set()
+        self._identity: Optional[Tuple[int, int]] = None
+        self._checked_at = 0.0
+    
+    @staticmethod
+    def _key(ioc_type: str, value: str) -> str:
+        return value.lower() if ioc_type in CASE_INSENSITIVE_TYPES else value
+    
+    def build(self, counts: Dict[str, int], rows: Iterable[Tuple[str, str]], generation: int):
+        """
+        Build fresh filters
+        
+        Args:
+            counts: Number of active indicators per IOC type, used to size the filters
+            rows: (ioc_type, value) of every active indicator
+            generation: Database generation the rows were read at
+        """
+        filters = {
+            ioc_type: BloomFilter.for_capacity(max(MIN_CAPACITY, count * CAPACITY_HEADROOM), self.fp_rate)
+            for ioc_type, count in counts.items()
+        }
+        for ioc_type, value in rows:
+            filters[ioc_type].add(_hash_pair(self._key(ioc_type, value)))
+        
+        self.filters = filters
+        self.generation = generation
+        self.later_generations = set()
+        self._unsized_types = set()
+        self.loaded = True
+    
+    def record_generation(self, generation: int):
+        """Record that the values of the change committed at generation have been added"""
+        if self.generation is None or generation <= self.generation:
+            return
+        
+        self.later_generations.add(generation)
+        while self.generation + 1 in self.later_generations:
+            self.generation += 1
+            self.later_generations.remove(self.generation)
+    
+    def add(self, ioc_type: str, value: str):
+        """Record an indicator that is now listed by a feed"""
+        bloom = self.filters.get(ioc_type)
+        if bloom is None:
+            # No filter was sized for this type; needs_rebuild() reports it
+            self._unsized_types.add(ioc_type)
+            return
+        bloom.add(_hash_pair(self._key(ioc_type, value)))
+    
+    def needs_rebuild(self) -> bool:
+        """Check whether the filters have drifted too far from their sizing to stay accurate"""
+        if self._unsized_types:
+            return True
+        return any(bloom.false_positive_rate() > 2 * self.fp_rate for bloom in self.filters.values())
+    
+    def might_contain(self, value: str, ioc_type: Optional[str] = None) -> bool:
+        """
+        Check whether an indicator may be listed by a feed
+        
+        Returns:
+            False only if no feed lists the indicator; True if it may be listed
+            or the filters are not loaded
+        """
+        self.refresh()
+        if not self.loaded:
+            return True
+        
+        filters = self.filters
+        # Ranges only hold their own values; an address inside one is never added
+        if RANGE_TYPE in filters and matches_type(RANGE_TYPE, ioc_type) and ip_to_key(value) is not None:
+            return True
+        
+        ioc_types = [ioc_type] if ioc_type else list(filters)
+        
+        hash_pairs: Dict[str, Tuple[int, int]] = {}
+        for candidate_type in ioc_types:
+            bloom = filters.get(candidate_type)
+            if bloom is None:
+                continue
+            
+            key = self._key(candidate_type, value)
+            if key not in hash_pairs:
+                hash_pairs[key] = _hash_pair(key)
+            if hash_pairs[key] in bloom:
+                return True
+        
+        return False
+    
+    def save(self):
+        """Write the filters to disk, replacing the previous file atomically"""
+        header = json.dumps({
+            "generation": self.generation,
+            "later_generations": sorted(self.later_generations),
+            "fp_rate": self.fp_rate,
+            "filters": [
+                {"ioc_type": ioc_type, "bits": bloom.bits, "hashes": bloom.hashes, "count": bloom.count}
+                for ioc_type, bloom in self.filters.items()
+            ]
+        }).encode()
+        
+        fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(self.path) + '.', dir=os.path.dirname(self.path) or '.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(MAGIC + struct.pack('<I', len(header)) + header)
+                for bloom in self.filters.values():
+                    f.write(bloom.data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        
+        identity = os.stat(self.path)
+        self._identity = (identity.st_ino, identity.st_mtime_ns)
+    
+    def load(self) -> bool:
+        """
+        Load the filters saved on disk
+        
+        Returns:
+            True if a valid file was loaded
+        """
+        self._checked_at = time.monotonic()
+        try:
+            with open(self.path, 'rb') as f:
+                identity = os.fstat(f.fileno())
+                if f.read(len(MAGIC)) != MAGIC:
+                    return False
+                header_size, = struct.unpack('<I', f.read(4))
+                header = json.loads(f.read(header_size))
+                
+                filters = {}
+                for entry in header["filters"]:
+                    data = bytearray(f.read((entry["bits"] + 7) // 8))
+                    filters[entry["ioc_type"]] = BloomFilter(entry["bits"], entry["hashes"], data, entry["count"])
+        except (OSError, ValueError, KeyError, struct.error):
+            return False
+        
+        if header["fp_rate"] != self.fp_rate:
+            return False
+        
+        self.filters = filters
+        self.generation = header["generation"]
+        self.later_generations = set(header.get("later_generations", []))
+        self._unsized_types = set()
+        self._identity = (identity.st_ino, identity.st_mtime_ns)
+        self.loaded = True
+        return True
+    
+    def refresh(self):
+        """Reload the filters if another process has saved newer ones since the last check"""
+        now = time.monotonic()
+        if not self.loaded or now - self._checked_at < self.check_interval:
+            return
+        
+        self._checked_at = now
+        try:
+            identity = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        
+        if (identity.st_ino, identity.st_mtime_ns) != self._identity:
+            self.load()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get size and fill statistics per IOC type"""
+        filters = {}
+        for ioc_type, bloom in self.filters.items():
+            fill_ratio = bloom.fill_ratio()
+            filters[ioc_type] = {
+                "values_added": bloom.count,
+                "bits": bloom.bits,
+                "hashes": bloom.hashes,
+                "bytes": len(bloom.data),
+                "fill_ratio": round(fill_ratio, 4),
+                "estimated_fp_rate": fill_ratio ** bloom.hashes
+            }
+        
+        return {
+            "loaded": self.loaded,
+            "target_fp_rate": self.fp_rate,
+            "generation": self.generation,
+            "bytes": sum(entry["bytes"] for entry in filters.values()),
+            "filters": filters
+        }
@@ -0,0 +1,294 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from app.core.config import settings
+
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    aioredis = None
+    REDIS_AVAILABLE = False
+
+class CacheBackend:
+    """Interface for threat intel response cache backends"""
+    
+    name = "base"
+    
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached value, or None if missing or expired"""
+        raise NotImplementedError
+    
+    async def set(self, key: str, value: Dict[str, Any], ttl: int):
+        """Store a value for ttl seconds"""
+        raise NotImplementedError
+    
+    async def delete(self, key: str):
+        """Remove a single entry"""
+        raise NotImplementedError
+    
+    async def clear(self):
+        """Remove all entries"""
+        raise NotImplementedError
+    
+    async def size(self) -> int:
+        """Return the number of stored entries, if known"""
+        return 0
+    
+    async def close(self):
+        """Release backend resources"""
+        pass
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process LRU cache with per-entry expiry"""
+    
+    name = "memory"
+    
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+    
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        
+        self._entries.move_to_end(key)
+        return value
+    
+    async def set(self, key: str, value: Dict[str, Any], ttl: int):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+    
+    async def clear(self):
+        self._entries.clear()
+    
+    async def size(self) -> int:
+        return len(self._entries)
+
+class SQLiteCacheBackend(CacheBackend):
+    """SQLite cache shared between processes on the same host"""
+    
+    name = "sqlite"
+    
+    def __init__(self, db_path: str = "threat_intel_cache.db"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS response_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        self._conn.commit()
+    
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, expires_at FROM response_cache WHERE key = ?', (key,)
+            ).fetchone()
+            
+            if row is None:
+                return None
+            
+            if row[1] <= time.time():
+                self._conn.execute('DELETE FROM response_cache WHERE key = ?', (key,))
+                self._conn.commit()
+                return None
+        
+        return json.loads(row[0])
+    
+    def _set(self, key: str, value: Dict[str, Any], ttl: int):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value), time.time() + ttl)
+            )
+            self._conn.commit()
+    
+    def _execute(self, query: str, params: tuple = ()):
+        with self._lock:
+            cursor = self._conn.execute(query, params)
+            self._conn.commit()
+            return cursor.fetchall()
+    
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get, key)
+    
+    async def set(self, key: str, value: Dict[str, Any], ttl: int):
+        await asyncio.to_thread(self._set, key, value, ttl)
+    
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._execute, 'DELETE FROM response_cache WHERE key = ?', (key,))
+    
+    async def clear(self):
+        await asyncio.to_thread(self._execute, 'DELETE FROM response_cache')
+    
+    async def purge_expired(self):
+        """Remove expired entries"""
+        await asyncio.to_thread(
+            self._execute, 'DELETE FROM response_cache WHERE expires_at <= ?', (time.time(),)
+        )
+    
+    async def size(self) -> int:
+        rows = await asyncio.to_thread(self._execute, 'SELECT COUNT(*) FROM response_cache')
+        return rows[0][0]
+    
+    async def close(self):
+        with self._lock:
+            self._conn.close()
+
+class RedisCacheBackend(CacheBackend):
+    """Redis cache shared between hosts; any client with async get/set/delete works"""
+    
+    name = "redis"
+    
+    def __init__(self, redis_url: str = None, client=None, prefix: str = "ti-cache:"):
+        if client is None:
+            if not REDIS_AVAILABLE:
+                raise RuntimeError("redis package is not installed")
+            client = aioredis.from_url(redis_url or settings.redis_url)
+        
+        self.client = client
+        self.prefix = prefix
+    
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = await self.client.get(self.prefix + key)
+        if value is None:
+            return None
+        return json.loads(value)
+    
+    async def set(self, key: str, value: Dict[str, Any], ttl: int):
+        await self.client.set(self.prefix + key, json.dumps(value), ex=int(ttl))
+    
+    async def delete(self, key: str):
+        await self.client.delete(self.prefix + key)
+    
+    async def clear(self):
+        keys = [key async for key in self.client.scan_iter(match=self.prefix + "*")]
+        if keys:
+            await self.client.delete(*keys)
+    
+    async def close(self):
+        close = getattr(self.client, "aclose", None) or getattr(self.client, "close", None)
+        if close:
+            await close()
+
+class ResponseCache:
+    """TTL cache for threat intel provider responses keyed on (provider, ioc_type, indicator)"""
+    
+    def __init__(
+        self,
+        backend: CacheBackend,
+        default_ttl: int = 3600,
+        provider_ttls: Optional[Dict[str, int]] = None,
+        negative_ttl: int = 600
+    ):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self.provider_ttls = provider_ttls or {}
+        self.negative_ttl = negative_ttl
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+    
+    @staticmethod
+    def make_key(provider: str, ioc_type: str, indicator: str) -> str:
+        """Build a cache key from the provider and normalized indicator"""
+        indicator = indicator.strip()
+        # URL paths are case sensitive; every other IOC type is not
+        if ioc_type != "url":
+            indicator = indicator.lower()
+        return f"{provider}:{ioc_type}:{indicator}"
+    
+    async def get(self, provider: str, ioc_type: str, indicator: str) -> Optional[Dict[str, Any]]:
+        """Return a cached provider result, or None on a miss"""
+        try:
+            value = await self.backend.get(self.make_key(provider, ioc_type, indicator))
+        except Exception as e:
+            print(f"Cache lookup failed: {e}")
+            value = None
+        
+        if value is None:
+            self.misses[provider] = self.misses.get(provider, 0) + 1
+        else:
+            self.hits[provider] = self.hits.get(provider, 0) + 1
+        
+        return value
+    
+    async def set(self, provider: str, ioc_type: str, indicator: str, result: Dict[str, Any]):
+        """Store a provider result; failures are never cached"""
+        status = result.get("status")
+        
+        if status == "success":
+            ttl = self.provider_ttls.get(provider, self.default_ttl)
+        elif status == "not_found":
+            ttl = self.negative_ttl
+        else:
+            return
+        
+        try:
+            await self.backend.set(self.make_key(provider, ioc_type, indicator), result, ttl)
+        except Exception as e:
+            print(f"Cache store failed: {e}")
+    
+    async def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters per provider"""
+        total_hits = sum(self.hits.values())
+        total_misses = sum(self.misses.values())
+        lookups = total_hits + total_misses
+        
+        return {
+            "backend": self.backend.name,
+            "entries": await self.backend.size(),
+            "hits": total_hits,
+            "misses": total_misses,
+            "hit_rate": round(total_hits / lookups, 4) if lookups else 0.0,
+            "providers": {
+                provider: {
+                    "hits": self.hits.get(provider, 0),
+                    "misses": self.misses.get(provider, 0)
+                }
+                for provider in set(self.hits) | set(self.misses)
+            }
+        }
+    
+    async def close(self):
+        await self.backend.close()
+
+def create_response_cache() -> Optional[ResponseCache]:
+    """Create the response cache configured in settings, or None when disabled"""
+    backend_name = settings.cache_backend.lower()
+    
+    if backend_name == "none":
+        return None
+    elif backend_name == "sqlite":
+        backend = SQLiteCacheBackend(settings.cache_sqlite_path)
+    elif backend_name == "redis":
+        backend = RedisCacheBackend(settings.redis_url)
+    else:
+        backend = MemoryCacheBackend(settings.cache_max_entries)
+    
+    return ResponseCache(
+        backend,
+        default_ttl=settings.cache_ttl,
+        provider_ttls=settings.cache_provider_ttls,
+        negative_ttl=settings.cache_negative_ttl
+    )
@@ -0,0 +1,206 @@
+import bz2
+import csv
+import gzip
+import io
+import json
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, BinaryIO, Sequence
+
+GZIP_MAGIC = b'\x1f\x8b'
+BZ2_MAGIC = b'BZh'
+ZIP_MAGIC = b'PK\x03\x04'
+
+_WHITESPACE = re.compile(r'\s*')
+_DECODER = json.JSONDecoder()
+
+@contextmanager
+def open_feed_file(path: str) -> Iterator[BinaryIO]:
+    """
+    Open a spooled feed, decompressing gzip, bz2 or zip content as it is read
+    
+    Compression is detected from the leading magic bytes, so it does not matter
+    how the server labelled the file. Zip archives yield their first file.
+    """
+    with open(path, 'rb') as raw:
+        magic = raw.read(len(ZIP_MAGIC))
+        raw.seek(0)
+        
+        if magic.startswith(GZIP_MAGIC):
+            with gzip.GzipFile(fileobj=raw) as stream:
+                yield stream
+        elif magic.startswith(BZ2_MAGIC):
+            with bz2.BZ2File(raw) as stream:
+                yield stream
+        elif magic.startswith(ZIP_MAGIC):
+            with zipfile.ZipFile(raw) as archive:
+                members = [info for info in archive.infolist() if not info.is_dir()]
+                if not members:
+                    raise ValueError("Zip archive contains no files")
+                with archive.open(members[0]) as stream:
+                    yield stream
+        else:
+            yield raw
+
+class _JSONReader:
+    """Pulls JSON values one at a time from a text stream with a bounded buffer"""
+    
+    def __init__(self, stream: io.TextIOBase, chunk_size: int = 64 * 1024):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+    
+    def _fill(self, size: int) -> bool:
+        chunk = self.stream.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        
+        # Drop consumed input so the buffer only holds the value being read
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+    
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it, or '' at the end"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill(self.chunk_size):
+                return ""
+    
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' at offset {self.pos}, found {found!r}")
+        self.pos += 1
+    
+    def value(self) -> Any:
+        """Decode the next complete JSON value"""
+        self.peek()
+        size = self.chunk_size
+        
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buffer, self.pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            
+            # Grow reads geometrically so a large value is not re-decoded many times
+            self._fill(size)
+            size *= 2
+    
+    def array_items(self) -> Iterator[Any]:
+        """Yield the elements of the array starting at the current position"""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        
+        while True:
+            yield self.value()
+            
+            # Most records are followed directly by a comma; skip the whitespace scan then
+            if self.buffer.startswith(',', self.pos):
+                self.pos += 1
+                continue
+            separator = self.peek()
+            self.pos += 1
+            if separator == ']':
+                return
+            if separator != ',':
+                raise ValueError(f"Expected ',' or ']' at offset {self.pos - 1}, found {separator!r}")
+
+def iter_json_records(stream: BinaryIO, list_keys: Sequence[str]) -> Iterator[Any]:
+    """
+    Stream the records of a JSON feed without loading the document
+    
+    Accepts a top-level array, or an object whose first member named in
+    list_keys holds the array. Other members are decoded and discarded.
+    
+    Args:
+        stream: Binary stream of UTF-8 JSON
+        list_keys: Member names that may hold the record array
+    
+    Yields:
+        Each element of the record array
+    """
+    reader = _JSONReader(io.TextIOWrapper(stream, encoding='utf-8-sig'))
+    start = reader.peek()
+    
+    if start == '[':
+        yield from reader.array_items()
+        return
+    
+    if start != '{':
+        raise ValueError("Expected a JSON array or object")
+    
+    reader.pos += 1
+    while reader.peek() != '}':
+        key = reader.value()
+        reader.expect(':')
+        
+        if key in list_keys and reader.peek() == '[':
+            yield from reader.array_items()
+            return
+        
+        reader.value()
+        if reader.peek() == ',':
+            reader.pos += 1
+
+def iter_csv_records(stream: BinaryIO) -> Iterator[Dict[str, str]]:
+    """Stream the rows of a CSV feed with a header line, one line at a time"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+    yield from csv.DictReader(text)
+
+def iter_xml_records(stream: BinaryIO, tags: Sequence[str] = ('indicator', 'ioc', 'threat')) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the record elements of an XML feed
+    
+    Records are the elements with the first of tags that opens in the document,
+    so an <ioc> value inside an <indicator> record stays a field of it. Each one
+    is detached from the tree once read, so memory stays flat however many
+    records the feed holds.
+    
+    Yields:
+        Mapping of child tag to text for each record element
+    """
+    record_tag = None
+    open_elements = []
+    # Record elements currently open; nested ones stay fields of the outer record
+    open_records = 0
+    
+    for event, element in ET.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            open_elements.append(element)
+            if record_tag is None and element.tag in tags:
+                record_tag = element.tag
+            if element.tag == record_tag:
+                open_records += 1
+            continue
+        
+        open_elements.pop()
+        if element.tag != record_tag:
+            continue
+        
+        open_records -= 1
+        if open_records:
+            continue
+        
+        record = {child.tag: child.text for child in element}
+        
+        element.clear()
+        if open_elements:
+            open_elements[-1].remove(element)
+        
+        yield record
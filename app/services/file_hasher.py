@@ -0,0 +1,112 @@
+import asyncio
+import hashlib
+from typing import Dict, Any, AsyncIterator, Optional
+from fastapi import UploadFile
+from app.core.config import settings
+
+# Allowance for the multipart boundaries and part headers around an uploaded file
+MULTIPART_OVERHEAD = 64 * 1024
+
+class FileTooLargeError(Exception):
+    """Raised when an upload exceeds the maximum allowed size"""
+    
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"File too large. Maximum size is {max_size // (1024 * 1024)}MB.")
+
+class MultiHasher:
+    """Computes MD5, SHA-1 and SHA-256 digests in a single pass over the data"""
+    
+    def __init__(self):
+        self.md5 = hashlib.md5()
+        self.sha1 = hashlib.sha1()
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+    
+    def update(self, chunk: bytes):
+        self.md5.update(chunk)
+        self.sha1.update(chunk)
+        self.sha256.update(chunk)
+        self.size += len(chunk)
+    
+    def hexdigests(self) -> Dict[str, str]:
+        return {
+            "md5": self.md5.hexdigest(),
+            "sha1": self.sha1.hexdigest(),
+            "sha256": self.sha256.hexdigest()
+        }
+
+def check_content_length(content_length: Optional[str], max_size: Optional[int] = None):
+    """
+    Reject an upload request from its declared length, before any of the body is read
+    
+    The multipart body is slightly larger than the file it carries, so a small
+    allowance is made for the envelope. Requests without a Content-Length are
+    cut off by limit_upload_stream() instead.
+    
+    Args:
+        content_length: Value of the Content-Length header, if any
+        max_size: Maximum accepted file size in bytes
+    """
+    max_size = max_size or settings.max_upload_size
+    if content_length and content_length.isdigit() and int(content_length) > max_size + MULTIPART_OVERHEAD:
+        raise FileTooLargeError(max_size)
+
+async def limit_upload_stream(
+    stream: AsyncIterator[bytes],
+    max_size: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    """
+    Pass an upload request body through, refusing it as soon as it outgrows the limit
+    
+    Chunked uploads declare no length, so the body is counted as it arrives and
+    nothing past the limit is read or spooled.
+    
+    Args:
+        stream: The request body chunks
+        max_size: Maximum accepted file size in bytes
+    """
+    max_size = max_size or settings.max_upload_size
+    received = 0
+    async for chunk in stream:
+        received += len(chunk)
+        if received > max_size + MULTIPART_OVERHEAD:
+            raise FileTooLargeError(max_size)
+        yield chunk
+
+async def hash_upload(
+    upload: UploadFile,
+    max_size: Optional[int] = None,
+    chunk_size: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Hash an upload in a single pass over the file Starlette has already received
+    
+    Only one chunk is held in memory at a time and hashing runs on a worker
+    thread. The sample is not copied again; Starlette removes its spooled file
+    when the upload is closed.
+    
+    Args:
+        upload: The uploaded file
+        max_size: Maximum accepted size in bytes
+        chunk_size: Bytes read per iteration
+    
+    Returns:
+        Dictionary with size, md5, sha1 and sha256
+    """
+    max_size = max_size or settings.max_upload_size
+    chunk_size = chunk_size or settings.upload_chunk_size
+    
+    hasher = MultiHasher()
+    await upload.seek(0)
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        
+        if hasher.size + len(chunk) > max_size:
+            raise FileTooLargeError(max_size)
+        
+        await asyncio.to_thread(hasher.update, chunk)
+    
+    return {"size": hasher.size, **hasher.hexdigests()}
@@ -0,0 +1,83 @@
+import os
+import threading
+import time
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+class FileLock:
+    """
+    An exclusive lock shared by every process that opens the same lock file
+    
+    The operating system drops the lock when its holder exits, so a crashed
+    worker never leaves it held. Threads of one process sharing an instance
+    also exclude each other.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+        self._thread_lock = threading.Lock()
+    
+    @property
+    def locked(self) -> bool:
+        """Whether this instance holds the lock"""
+        return self._fd is not None
+    
+    def acquire(self, blocking: bool = True) -> bool:
+        """Take the lock, waiting for it unless blocking is False; returns whether it was taken"""
+        if not self._thread_lock.acquire(blocking):
+            return False
+        
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if self._lock_file(fd, blocking):
+                self._fd = fd
+                return True
+        except BaseException:
+            os.close(fd)
+            self._thread_lock.release()
+            raise
+        
+        os.close(fd)
+        self._thread_lock.release()
+        return False
+    
+    def _lock_file(self, fd: int, blocking: bool) -> bool:
+        if fcntl:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            return True
+        
+        # msvcrt gives up after a few seconds even when blocking, so keep retrying
+        while True:
+            try:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+            time.sleep(0.05)
+    
+    def release(self):
+        """Give up the lock if this instance holds it"""
+        if self._fd is None:
+            return
+        
+        # Closing the descriptor releases the lock on every platform
+        fd, self._fd = self._fd, None
+        os.close(fd)
+        self._thread_lock.release()
+    
+    def __enter__(self) -> 'FileLock':
+        self.acquire()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.release()
@@ -0,0 +1,447 @@
+import socket
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Any, List, Optional, Iterable, Iterator, Sequence, Tuple
+from app.services.ip_ranges import IntervalIndex, RANGE_TYPE, LOW_MASK, ip_to_key, parse_ip_range, matches_type
+
+# Feed ordinals are stored in two bytes next to each key
+MAX_FEEDS = 0xFFFF
+
+DIGEST_WIDTHS = {'hash_md5': 16, 'hash_sha1': 20, 'hash_sha256': 32}
+
+def _merge_sorted(kept, added: List, merged):
+    """
+    Merge a short sorted run into a long sorted sequence
+    
+    Each added item is placed with a binary search and the kept items between
+    them are copied as whole slices, so the cost is a linear copy plus
+    O(k log n) comparisons rather than a sort of everything.
+    """
+    start = 0
+    for item in added:
+        position = bisect_right(kept, item, start)
+        merged += kept[start:position]
+        merged.append(item)
+        start = position
+    merged += kept[start:]
+    return merged
+
+def _encode_ipv4(value: str) -> Optional[int]:
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, value), 'big')
+    except (OSError, ValueError):
+        return None
+
+def _encode_digest(value: str, width: int) -> Optional[bytes]:
+    if len(value) != width * 2:
+        return None
+    try:
+        return bytes.fromhex(value)
+    except ValueError:
+        return None
+
+class _IPv4Section:
+    """IPv4 addresses as integers in one sorted array, each shifted to carry its feed ordinal"""
+    
+    def __init__(self, keys: Optional[array] = None):
+        self.keys = keys if keys is not None else array('Q')
+    
+    @staticmethod
+    def encode(value: str) -> Optional[int]:
+        return _encode_ipv4(value)
+    
+    @classmethod
+    def build(cls, records: Iterable[Tuple[int, int]]) -> "_IPv4Section":
+        return cls(array('Q', sorted(address << 16 | ordinal for address, ordinal in records)))
+    
+    def records(self) -> Iterator[Tuple[int, int]]:
+        return ((key >> 16, key & 0xFFFF) for key in self.keys)
+    
+    def replace(self, ordinal: int, records: Iterable[Tuple[int, int]]) -> "_IPv4Section":
+        """Get a copy holding records in place of the ones for a feed ordinal"""
+        kept = array('Q', (key for key in self.keys if key & 0xFFFF != ordinal))
+        added = sorted(address << 16 | record_ordinal for address, record_ordinal in records)
+        return _IPv4Section(_merge_sorted(kept, added, array('Q')))
+    
+    def lookup(self, address: int) -> List[int]:
+        start = bisect_left(self.keys, address << 16)
+        end = bisect_left(self.keys, (address + 1) << 16, start)
+        return [key & 0xFFFF for key in self.keys[start:end]]
+    
+    def __len__(self) -> int:
+        return len(self.keys)
+    
+    @property
+    def nbytes(self) -> int:
+        return self.keys.itemsize * len(self.keys)
+
+class _DigestSection:
+    """
+    Binary digests with their feed ordinal as fixed-width records in one sorted buffer
+    
+    A parallel array of each digest's leading eight bytes as an integer lets the
+    binary search run in C; only records sharing that prefix are compared in full.
+    """
+    
+    def __init__(self, width: int, blob: bytes = b''):
+        self.width = width
+        self.record_width = width + 2
+        self.blob = blob
+        self.prefixes = array('Q', (
+            int.from_bytes(blob[offset:offset + 8], 'big')
+            for offset in range(0, len(blob), self.record_width)
+        ))
+    
+    def encode(self, value: str) -> Optional[bytes]:
+        return _encode_digest(value, self.width)
+    
+    def build(self, records: Iterable[Tuple[bytes, int]]) -> "_DigestSection":
+        return _DigestSection(
+            self.width,
+            b''.join(sorted(digest + ordinal.to_bytes(2, 'big') for digest, ordinal in records))
+        )
+    
+    def records(self) -> Iterator[Tuple[bytes, int]]:
+        for offset in range(0, len(self.blob), self.record_width):
+            record = self.blob[offset:offset + self.record_width]
+            yield record[:self.width], int.from_bytes(record[self.width:], 'big')
+    
+    def replace(self, ordinal: int, records: Iterable[Tuple[bytes, int]]) -> "_DigestSection":
+        """Get a copy holding records in place of the ones for a feed ordinal"""
+        suffix = ordinal.to_bytes(2, 'big')
+        blob, width, record_width = self.blob, self.width, self.record_width
+        kept = [
+            blob[offset:offset + record_width]
+            for offset in range(0, len(blob), record_width)
+            if blob[offset + width:offset + record_width] != suffix
+        ]
+        added = sorted(digest + record_ordinal.to_bytes(2, 'big') for digest, record_ordinal in records)
+        return _DigestSection(width, b''.join(_merge_sorted(kept, added, [])))
+    
+    def __len__(self) -> int:
+        return len(self.prefixes)
+    
+    def lookup(self, digest: bytes) -> List[int]:
+        prefix = int.from_bytes(digest[:8], 'big')
+        low = bisect_left(self.prefixes, prefix)
+        high = bisect_right(self.prefixes, prefix, low)
+        
+        # Rarely more than one record shares a prefix, but search them in full anyway
+        while low < high:
+            middle = (low + high) // 2
+            offset = middle * self.record_width
+            if self.blob[offset:offset + self.width] < digest:
+                low = middle + 1
+            else:
+                high = middle
+        
+        ordinals = []
+        for offset in range(low * self.record_width, len(self.blob), self.record_width):
+            if self.blob[offset:offset + self.width] != digest:
+                break
+            ordinals.append(int.from_bytes(self.blob[offset + self.width:offset + self.record_width], 'big'))
+        return ordinals
+    
+    @property
+    def nbytes(self) -> int:
+        return len(self.blob) + self.prefixes.itemsize * len(self.prefixes)
+
+class _StringSection:
+    """Interned indicator strings mapped to the ordinals of the feeds listing them"""
+    
+    def __init__(self, values: Optional[Dict[str, Tuple[int, ...]]] = None):
+        self.values = values if values is not None else {}
+    
+    @staticmethod
+    def encode(value: str) -> str:
+        return value
+    
+    @classmethod
+    def build(cls, records: Iterable[Tuple[str, int]]) -> "_StringSection":
+        values: Dict[str, Tuple[int, ...]] = {}
+        for value, ordinal in records:
+            # Interning shares one copy of a value listed by several feeds
+            value = sys.intern(value)
+            values[value] = values.get(value, ()) + (ordinal,)
+        return cls(values)
+    
+    def records(self) -> Iterator[Tuple[str, int]]:
+        for value, ordinals in self.values.items():
+            for ordinal in ordinals:
+                yield value, ordinal
+    
+    def replace(self, ordinal: int, records: Iterable[Tuple[str, int]]) -> "_StringSection":
+        """Get a copy holding records in place of the ones for a feed ordinal"""
+        # Copied rather than edited in place so concurrent lookups never see a half-updated value
+        values = dict(self.values)
+        for value, ordinals in self.values.items():
+            if ordinal in ordinals:
+                remaining = tuple(other for other in ordinals if other != ordinal)
+                if remaining:
+                    values[value] = remaining
+                else:
+                    del values[value]
+        
+        for value, record_ordinal in records:
+            value = sys.intern(value)
+            values[value] = values.get(value, ()) + (record_ordinal,)
+        return _StringSection(values)
+    
+    def lookup(self, value: str) -> List[int]:
+        return list(self.values.get(value, ()))
+    
+    def __len__(self) -> int:
+        return sum(len(ordinals) for ordinals in self.values.values())
+    
+    @property
+    def nbytes(self) -> int:
+        return sys.getsizeof(self.values) + sum(sys.getsizeof(value) for value in self.values)
+
+class _RangeSection:
+    """
+    CIDR blocks and address ranges with an interval index over their bounds
+    
+    Ranges are numbered by position, and the interval index maps an address to
+    the numbers of the ranges containing it with one binary search.
+    """
+    
+    def __init__(
+        self,
+        values: Sequence[str] = (),
+        ordinals: Optional[Sequence[int]] = None,
+        bounds: Optional[Sequence[int]] = None,
+        intervals: Optional[IntervalIndex] = None
+    ):
+        self.values = values
+        self.ordinals = ordinals if ordinals is not None else array('H')
+        # First and last key of each range, each as high and low 64 bits
+        self.bounds = bounds if bounds is not None else array('Q')
+        self.intervals = intervals if intervals is not None else IntervalIndex.build(())
+    
+    @staticmethod
+    def encode(value: str) -> Optional[Tuple[Optional[str], int, int]]:
+        """Parse a range, or an address as a range of one without a normalized value"""
+        parsed = parse_ip_range(value)
+        if parsed is not None:
+            return parsed
+        
+        key = ip_to_key(value)
+        return None if key is None else (None, key, key)
+    
+    @classmethod
+    def build(cls, records: Iterable[Tuple[Tuple[str, int, int], int]]) -> "_RangeSection":
+        values, ordinals, bounds = [], array('H'), array('Q')
+        for (value, first, last), ordinal in records:
+            values.append(sys.intern(value))
+            ordinals.append(ordinal)
+            bounds.extend((first >> 64, first & LOW_MASK, last >> 64, last & LOW_MASK))
+        
+        section = cls(values, ordinals, bounds)
+        section.intervals = IntervalIndex.build(
+            (*section._bounds(range_id), range_id) for range_id in range(len(values))
+        )
+        return section
+    
+    def _bounds(self, range_id: int) -> Tuple[int, int]:
+        first_high, first_low, last_high, last_low = self.bounds[4 * range_id:4 * range_id + 4]
+        return first_high << 64 | first_low, last_high << 64 | last_low
+    
+    def records(self) -> Iterator[Tuple[Tuple[str, int, int], int]]:
+        for range_id, (value, ordinal) in enumerate(zip(self.values, self.ordinals)):
+            yield (value, *self._bounds(range_id)), ordinal
+    
+    def replace(self, ordinal: int, records: Iterable[Tuple[Tuple[str, int, int], int]]) -> "_RangeSection":
+        """Get a copy holding records in place of the ones for a feed ordinal"""
+        # The segment table depends on every overlap, so it is swept again; the
+        # sweep is linear once its boundaries are sorted
+        kept = [record for record in self.records() if record[1] != ordinal]
+        kept.extend(records)
+        return self.build(kept)
+    
+    def lookup(self, parsed: Tuple[Optional[str], int, int]) -> List[int]:
+        value, first, _ = parsed
+        range_ids = self.intervals.lookup(first)
+        if value is not None:
+            # A range itself only matches a range listed with the same bounds
+            range_ids = [range_id for range_id in range_ids if self.values[range_id] == value]
+        # A feed may list several ranges containing the same address
+        return list(dict.fromkeys(self.ordinals[range_id] for range_id in range_ids))
+    
+    def __len__(self) -> int:
+        return len(self.ordinals)
+    
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.intervals.nbytes + self.bounds.itemsize * len(self.bounds) + self.ordinals.itemsize * len(self.ordinals)
+            + sys.getsizeof(self.values) + sum(sys.getsizeof(value) for value in self.values)
+        )
+
+def _new_section(ioc_type: str, packed: bool):
+    if not packed:
+        return _StringSection()
+    if ioc_type == RANGE_TYPE:
+        return _RangeSection()
+    if ioc_type == 'ip_address':
+        return _IPv4Section()
+    return _DigestSection(DIGEST_WIDTHS[ioc_type])
+
+class IndicatorIndex:
+    """
+    Compact in-memory index of active feed indicators
+    
+    Each IOC type has its own section: IPv4 addresses as packed integers, hashes
+    as fixed-width binary digests (both sorted and binary searched) and everything
+    else as interned strings. CIDR blocks and address ranges get an interval
+    index, so an address lookup also finds the ranges containing it. Values that
+    do not fit their packed form, such as an IPv6 address, fall back to a string
+    section of the same type.
+    
+    Feeds are replaced whole and sections are rebuilt off to the side and swapped
+    in, so a single writer thread can update the index while lookups run.
+    """
+    
+    def __init__(self):
+        self._feeds: List[Optional[str]] = []
+        self._ordinals: Dict[str, int] = {}
+        self._free: List[int] = []
+        # (ioc_type, packed) -> section
+        self._sections: Dict[Tuple[str, bool], Any] = {}
+        # feed ordinal -> section keys holding its indicators
+        self._feed_sections: Dict[int, set] = {}
+        self.loaded = False
+    
+    def _ordinal(self, feed_id: str) -> int:
+        ordinal = self._ordinals.get(feed_id)
+        if ordinal is not None:
+            return ordinal
+        
+        if self._free:
+            ordinal = self._free.pop()
+            self._feeds[ordinal] = feed_id
+        else:
+            if len(self._feeds) > MAX_FEEDS:
+                raise ValueError(f"Indicator index supports at most {MAX_FEEDS + 1} feeds")
+            ordinal = len(self._feeds)
+            self._feeds.append(feed_id)
+        
+        self._ordinals[feed_id] = ordinal
+        return ordinal
+    
+    def _encode(self, ioc_type: str, value: str) -> Tuple[Tuple[str, bool], Any]:
+        """Get the section key and encoded key for an indicator"""
+        if ioc_type == 'ip_address':
+            key = _encode_ipv4(value)
+        elif ioc_type in DIGEST_WIDTHS:
+            key = _encode_digest(value, DIGEST_WIDTHS[ioc_type])
+        elif ioc_type == RANGE_TYPE:
+            key = parse_ip_range(value)
+        else:
+            key = None
+        
+        if key is not None:
+            return (ioc_type, True), key
+        return (ioc_type, False), value
+    
+    def _group(self, rows: Iterable[Tuple[str, str, str]]) -> Dict[Tuple[str, bool], list]:
+        """Group (feed_id, ioc_type, value) rows into encoded records per section"""
+        grouped: Dict[Tuple[str, bool], list] = {}
+        for feed_id, ioc_type, value in rows:
+            ordinal = self._ordinal(feed_id)
+            section_key, key = self._encode(ioc_type, value)
+            grouped.setdefault(section_key, []).append((key, ordinal))
+            self._feed_sections.setdefault(ordinal, set()).add(section_key)
+        return grouped
+    
+    def load(self, rows: Iterable[Tuple[str, str, str]]):
+        """Build the index from (feed_id, ioc_type, value) rows of every active indicator"""
+        self._feeds, self._ordinals, self._free, self._feed_sections = [], {}, [], {}
+        grouped = self._group(rows)
+        
+        self._sections = {
+            section_key: _new_section(*section_key).build(records)
+            for section_key, records in grouped.items()
+        }
+        self.loaded = True
+    
+    def replace_feed(self, feed_id: str, rows: Iterable[Tuple[str, str]]):
+        """Replace the indicators listed by one feed with its (ioc_type, value) rows"""
+        ordinal = self._ordinal(feed_id)
+        touched = self._feed_sections.pop(ordinal, set())
+        grouped = self._group((feed_id, ioc_type, value) for ioc_type, value in rows)
+        
+        sections = dict(self._sections)
+        for section_key in touched | set(grouped):
+            section = sections.get(section_key) or _new_section(*section_key)
+            # The feed's records are merged into the others rather than everything being re-sorted
+            section = section.replace(ordinal, grouped.get(section_key, ()))
+            
+            if len(section):
+                sections[section_key] = section
+            else:
+                sections.pop(section_key, None)
+        
+        self._sections = sections
+    
+    def remove_feed(self, feed_id: str):
+        """Drop every indicator listed by a feed"""
+        if feed_id not in self._ordinals:
+            return
+        
+        self.replace_feed(feed_id, [])
+        ordinal = self._ordinals.pop(feed_id)
+        self._feed_sections.pop(ordinal, None)
+        self._feeds[ordinal] = None
+        self._free.append(ordinal)
+    
+    @property
+    def feed_ids(self) -> List[Optional[str]]:
+        """Feed IDs by ordinal; ordinals of removed feeds hold None"""
+        return list(self._feeds)
+    
+    def sections(self) -> List[Tuple[str, bool, Any]]:
+        """Get (ioc_type, packed, section) for every section"""
+        return [(ioc_type, packed, section) for (ioc_type, packed), section in self._sections.items()]
+    
+    def lookup(self, value: str, ioc_type: Optional[str] = None) -> List[Dict[str, str]]:
+        """
+        Find the feeds listing an indicator
+        
+        Args:
+            value: The indicator value
+            ioc_type: Only match indicators of this type
+        
+        Returns:
+            A {feed_id, ioc_type} entry per feed listing the indicator
+        """
+        sections = self._sections
+        matches = []
+        for (section_type, packed), section in sections.items():
+            if not matches_type(section_type, ioc_type):
+                continue
+            
+            key = section.encode(value)
+            if key is None:
+                continue
+            
+            for ordinal in section.lookup(key):
+                matches.append({'feed_id': self._feeds[ordinal], 'ioc_type': section_type})
+        
+        return matches
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get indicator counts and approximate memory use per IOC type"""
+        sections: Dict[str, Dict[str, int]] = {}
+        for (ioc_type, packed), section in self._sections.items():
+            entry = sections.setdefault(ioc_type, {"indicators": 0, "bytes": 0})
+            entry["indicators"] += len(section)
+            entry["bytes"] += section.nbytes
+        
+        return {
+            "loaded": self.loaded,
+            "feeds": len(self._ordinals),
+            "indicators": sum(entry["indicators"] for entry in sections.values()),
+            "bytes": sum(entry["bytes"] for entry in sections.values()),
+            "sections": sections
+        }
@@ -0,0 +1,358 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Any, List, Optional, Tuple
+from app.services.indicator_index import IndicatorIndex, DIGEST_WIDTHS, _RangeSection, _encode_ipv4, _encode_digest
+from app.services.ip_ranges import IntervalIndex, RANGE_TYPE, matches_type
+
+MAGIC = b'IOCSNAP2'
+
+# magic, byte order, feed count, section count, created_at (unix seconds), database generation;
+# padded to a multiple of 8 bytes so the arrays after it stay aligned
+HEADER = struct.Struct('<8sB3xIIdQ4x')
+# ioc_type, kind, digest width, record count, data offset
+SECTION = struct.Struct('<32sBB2xIQ')
+
+KIND_IPV4 = 0
+KIND_DIGEST = 1
+KIND_TEXT = 2
+KIND_RANGE = 3
+
+# Interval segment count, overlapping run count and overlapping range id count of a range section
+RANGE_COUNTS = struct.Struct('<QQQ')
+
+def _text_hash(value: bytes) -> int:
+    """Stable 64-bit hash of a string value, the same in every process"""
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), 'little')
+
+def _pad(data: bytes) -> bytes:
+    """Pad a block to 8 bytes so the arrays after it stay aligned"""
+    return data + b'\0' * (-len(data) % 8)
+
+def _section_blocks(kind: int, section) -> List[bytes]:
+    """Serialize an in-memory index section into its snapshot blocks"""
+    if kind == KIND_IPV4:
+        return [section.keys.tobytes()]
+    
+    if kind == KIND_DIGEST:
+        return [section.prefixes.tobytes(), _pad(section.blob)]
+    
+    if kind == KIND_RANGE:
+        # Ranges in id order with their bounds and the interval index over them, then the heap
+        intervals = section.intervals
+        heap = bytearray()
+        offsets, lengths = array('Q'), array('I')
+        for value in section.values:
+            encoded = value.encode()
+            offsets.append(len(heap))
+            lengths.append(len(encoded))
+            heap += encoded
+        
+        counts = RANGE_COUNTS.pack(len(intervals), len(intervals.multi_offsets) - 1, len(intervals.multi_ids))
+        return [
+            counts, section.bounds.tobytes(), _pad(section.ordinals.tobytes()),
+            offsets.tobytes(), _pad(lengths.tobytes()),
+            *(block.tobytes() for block in intervals.arrays()),
+            bytes(heap)
+        ]
+    
+    # Text: hashes, heap offsets, lengths and ordinals sorted by hash, then the heap
+    records = sorted(
+        (_text_hash(encoded), encoded, ordinal)
+        for encoded, ordinal in ((value.encode(), ordinal) for value, ordinal in section.records())
+    )
+    heap = bytearray()
+    hashes, offsets, lengths, ordinals = array('Q'), array('Q'), array('I'), array('H')
+    for value_hash, encoded, ordinal in records:
+        hashes.append(value_hash)
+        offsets.append(len(heap))
+        lengths.append(len(encoded))
+        ordinals.append(ordinal)
+        heap += encoded
+    
+    return [hashes.tobytes(), offsets.tobytes(), _pad(lengths.tobytes()), _pad(ordinals.tobytes()), bytes(heap)]
+
+def write_snapshot(index: IndicatorIndex, path: str, generation: int = 0):
+    """
+    Write an index to an immutable snapshot file, replacing any previous one atomically
+    
+    Readers that still map the old file keep a consistent view until they reopen.
+    
+    Args:
+        index: The index to serialize
+        path: Destination path; a temporary file in the same directory is renamed over it
+        generation: Database generation the index was read at
+    """
+    os.replace(stage_snapshot(index, path, generation), path)
+
+def stage_snapshot(index: IndicatorIndex, path: str, generation: int = 0) -> str:
+    """
+    Write an index to a temporary snapshot file next to path
+    
+    Returns:
+        Path of the finished file, for the caller to rename over path or remove
+    """
+    feeds = [(feed_id or '').encode() for feed_id in index.feed_ids]
+    feed_table = b''.join(struct.pack('<H', len(feed_id)) + feed_id for feed_id in feeds)
+    
+    sections = []
+    for ioc_type, packed, section in index.sections():
+        if not packed:
+            kind, width = KIND_TEXT, 0
+        elif ioc_type == RANGE_TYPE:
+            kind, width = KIND_RANGE, 0
+        elif ioc_type in DIGEST_WIDTHS:
+            kind, width = KIND_DIGEST, section.width
+        else:
+            kind, width = KIND_IPV4, 0
+        sections.append((ioc_type, kind, width, len(section), _section_blocks(kind, section)))
+    
+    offset = HEADER.size + len(_pad(feed_table)) + SECTION.size * len(sections)
+    directory = []
+    for ioc_type, kind, width, count, blocks in sections:
+        directory.append(SECTION.pack(ioc_type.encode(), kind, width, count, offset))
+        offset += sum(len(block) for block in blocks)
+    
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            byte_order = 1 if sys.byteorder == 'little' else 0
+            f.write(HEADER.pack(MAGIC, byte_order, len(feeds), len(sections), time.time(), generation))
+            f.write(_pad(feed_table))
+            for entry in directory:
+                f.write(entry)
+            for _, _, _, _, blocks in sections:
+                for block in blocks:
+                    f.write(block)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path
+
+class _HeapStrings:
+    """Strings stored back to back in a mapped heap, decoded on access"""
+    
+    def __init__(self, offsets: memoryview, lengths: memoryview, heap: memoryview):
+        self.offsets = offsets
+        self.lengths = lengths
+        self.heap = heap
+    
+    def __getitem__(self, position: int) -> str:
+        offset = self.offsets[position]
+        return bytes(self.heap[offset:offset + self.lengths[position]]).decode()
+    
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+class _MappedSnapshot:
+    """Read-only view of one snapshot file"""
+    
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self.identity = os.fstat(f.fileno())
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self.map)
+        
+        magic, byte_order, feed_count, section_count, self.created_at, self.generation = HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not an indicator snapshot: {path}")
+        if byte_order != (1 if sys.byteorder == 'little' else 0):
+            raise ValueError(f"Indicator snapshot was written on a host with a different byte order: {path}")
+        
+        position = HEADER.size
+        self.feeds: List[Optional[str]] = []
+        for _ in range(feed_count):
+            length, = struct.unpack_from('<H', view, position)
+            self.feeds.append(bytes(view[position + 2:position + 2 + length]).decode() or None)
+            position += 2 + length
+        position += -position % 8
+        
+        # (ioc_type, kind) -> (count, width, arrays)
+        self.sections: Dict[Tuple[str, int], Tuple[int, int, tuple]] = {}
+        # Range sections are served by their in-memory class over the mapped arrays
+        self.ranges: Dict[str, _RangeSection] = {}
+        for _ in range(section_count):
+            name, kind, width, count, offset = SECTION.unpack_from(view, position)
+            position += SECTION.size
+            ioc_type = name.rstrip(b'\0').decode()
+            arrays = self._arrays(view, kind, width, count, offset)
+            self.sections[(ioc_type, kind)] = (count, width, arrays)
+            
+            if kind == KIND_RANGE:
+                _, bounds, ordinals, offsets, lengths, *intervals, heap = arrays
+                self.ranges[ioc_type] = _RangeSection(
+                    _HeapStrings(offsets, lengths, heap), ordinals, bounds, IntervalIndex(*intervals)
+                )
+    
+    @staticmethod
+    def _arrays(view: memoryview, kind: int, width: int, count: int, offset: int) -> tuple:
+        def take(size: int, fmt: Optional[str] = None):
+            nonlocal offset
+            block = view[offset:offset + size]
+            offset += size + (-size % 8)
+            return block.cast(fmt) if fmt else block
+        
+        if kind == KIND_IPV4:
+            return (take(8 * count, 'Q'),)
+        if kind == KIND_DIGEST:
+            return (take(8 * count, 'Q'), take((width + 2) * count))
+        if kind == KIND_RANGE:
+            counts = take(RANGE_COUNTS.size)
+            segments, runs, run_ids = RANGE_COUNTS.unpack(counts)
+            bounds, ordinals = take(32 * count, 'Q'), take(2 * count, 'H')
+            offsets, lengths = take(8 * count, 'Q'), take(4 * count, 'I')
+            intervals = (
+                take(8 * segments, 'Q'), take(8 * segments, 'Q'), take(8 * segments, 'q'),
+                take(8 * (runs + 1), 'Q'), take(8 * run_ids, 'q')
+            )
+            heap_size = offsets[-1] + lengths[-1] if count else 0
+            return (counts, bounds, ordinals, offsets, lengths, *intervals, take(heap_size))
+        hashes, offsets, lengths, ordinals = take(8 * count, 'Q'), take(8 * count, 'Q'), take(4 * count, 'I'), take(2 * count, 'H')
+        # Values were appended to the heap in record order, so the last one ends it
+        heap_size = offsets[-1] + lengths[-1] if count else 0
+        return hashes, offsets, lengths, ordinals, take(heap_size)
+    
+    def lookup(self, ioc_type: str, kind: int, value: str) -> List[int]:
+        count, width, arrays = self.sections[(ioc_type, kind)]
+        
+        if kind == KIND_IPV4:
+            address = _encode_ipv4(value)
+            if address is None:
+                return []
+            keys, = arrays
+            start = bisect_left(keys, address << 16)
+            end = bisect_left(keys, (address + 1) << 16, start)
+            return [key & 0xFFFF for key in keys[start:end]]
+        
+        if kind == KIND_RANGE:
+            section = self.ranges[ioc_type]
+            parsed = section.encode(value)
+            return section.lookup(parsed) if parsed is not None else []
+        
+        if kind == KIND_DIGEST:
+            digest = _encode_digest(value, width)
+            if digest is None:
+                return []
+            prefixes, records = arrays
+            prefix = int.from_bytes(digest[:8], 'big')
+            start = bisect_left(prefixes, prefix)
+            end = bisect_right(prefixes, prefix, start)
+            record_width = width + 2
+            return [
+                int.from_bytes(records[position * record_width + width:(position + 1) * record_width], 'big')
+                for position in range(start, end)
+                if records[position * record_width:position * record_width + width] == digest
+            ]
+        
+        hashes, offsets, lengths, ordinals, heap = arrays
+        encoded = value.encode()
+        value_hash = _text_hash(encoded)
+        start = bisect_left(hashes, value_hash)
+        end = bisect_right(hashes, value_hash, start)
+        return [
+            ordinals[position] for position in range(start, end)
+            if heap[offsets[position]:offsets[position] + lengths[position]] == encoded
+        ]
+
+class IndicatorSnapshot:
+    """
+    Indicator lookups served from a memory-mapped snapshot file
+    
+    Every worker process maps the same file read-only, so the operating system
+    keeps one copy in the page cache however many workers there are. A newer
+    snapshot swapped in by the writer is picked up within check_interval seconds.
+    """
+    
+    def __init__(self, path: str, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._snapshot: Optional[_MappedSnapshot] = None
+        self._checked_at = 0.0
+    
+    @property
+    def loaded(self) -> bool:
+        return self._current() is not None
+    
+    @property
+    def generation(self) -> Optional[int]:
+        """Database generation of the mapped snapshot, or None if there is none"""
+        snapshot = self._current()
+        return snapshot.generation if snapshot is not None else None
+    
+    def open(self):
+        """Map the current snapshot file, if there is one"""
+        self._checked_at = time.monotonic()
+        if os.path.exists(self.path):
+            self._snapshot = _MappedSnapshot(self.path)
+    
+    def _current(self) -> Optional[_MappedSnapshot]:
+        """Get the mapped snapshot, remapping it if the file has been replaced"""
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return snapshot
+        
+        self._checked_at = now
+        try:
+            identity = os.stat(self.path)
+        except FileNotFoundError:
+            return snapshot
+        
+        if snapshot is None or (identity.st_ino, identity.st_mtime_ns) != (snapshot.identity.st_ino, snapshot.identity.st_mtime_ns):
+            # The old mapping is released once no lookup still holds it
+            self._snapshot = snapshot = _MappedSnapshot(self.path)
+        return snapshot
+    
+    def lookup(self, value: str, ioc_type: Optional[str] = None) -> List[Dict[str, str]]:
+        """
+        Find the feeds listing an indicator
+        
+        Args:
+            value: The indicator value
+            ioc_type: Only match indicators of this type
+        
+        Returns:
+            A {feed_id, ioc_type} entry per feed listing the indicator
+        """
+        snapshot = self._current()
+        if snapshot is None:
+            return []
+        
+        matches = []
+        for section_type, kind in snapshot.sections:
+            if not matches_type(section_type, ioc_type):
+                continue
+            for ordinal in snapshot.lookup(section_type, kind, value):
+                matches.append({'feed_id': snapshot.feeds[ordinal], 'ioc_type': section_type})
+        
+        return matches
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get indicator counts and size of the mapped snapshot per IOC type"""
+        snapshot = self._current()
+        if snapshot is None:
+            return {"loaded": False, "feeds": 0, "indicators": 0, "bytes": 0, "sections": {}}
+        
+        sections: Dict[str, Dict[str, int]] = {}
+        for (ioc_type, kind), (count, width, arrays) in snapshot.sections.items():
+            entry = sections.setdefault(ioc_type, {"indicators": 0, "bytes": 0})
+            entry["indicators"] += count
+            entry["bytes"] += sum(block.nbytes for block in arrays)
+        
+        return {
+            "loaded": True,
+            "feeds": sum(1 for feed_id in snapshot.feeds if feed_id),
+            "indicators": sum(entry["indicators"] for entry in sections.values()),
+            "bytes": len(snapshot.map),
+            "sections": sections,
+            "created_at": snapshot.created_at,
+            "generation": snapshot.generation
+        }
@@ -0,0 +1,190 @@
+import socket
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Iterable, Optional, Sequence, Tuple
+
+RANGE_TYPE = 'ip_range'
+
+# IPv4 addresses are placed in the IPv4-mapped IPv6 block so both families share one key space
+IPV4_MAPPED = 0xFFFF << 32
+MAX_KEY = (1 << 128) - 1
+LOW_MASK = (1 << 64) - 1
+
+def _parse_address(value: str) -> Optional[Tuple[int, int]]:
+    """Get the key and bit width of an IPv4 or IPv6 address, or None if value is not an address"""
+    value = value.strip()
+    try:
+        return IPV4_MAPPED | int.from_bytes(socket.inet_pton(socket.AF_INET, value), 'big'), 32
+    except (OSError, ValueError):
+        pass
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET6, value), 'big'), 128
+    except (OSError, ValueError):
+        return None
+
+def _format_key(key: int, width: int) -> str:
+    """Format a key as the canonical text of its address"""
+    if width == 32:
+        return socket.inet_ntop(socket.AF_INET, (key & 0xFFFFFFFF).to_bytes(4, 'big'))
+    return socket.inet_ntop(socket.AF_INET6, key.to_bytes(16, 'big'))
+
+def ip_to_key(value: str) -> Optional[int]:
+    """Get the 128-bit key of an IPv4 or IPv6 address, or None if value is not an address"""
+    if ':' not in value and '.' not in value:
+        return None
+    parsed = _parse_address(value)
+    return parsed[0] if parsed else None
+
+def key_to_bytes(key: int) -> bytes:
+    """Encode a key so SQLite compares it correctly as a BLOB"""
+    return key.to_bytes(16, 'big')
+
+def parse_ip_range(value: str) -> Optional[Tuple[str, int, int]]:
+    """
+    Parse a CIDR block ("1.2.3.0/24") or an address range ("1.2.3.4-1.2.3.9")
+    
+    Returns:
+        (normalized value, first key, last key), or None if value is not a range
+    """
+    if '/' in value:
+        address, _, prefix = value.partition('/')
+        parsed = _parse_address(address)
+        prefix = prefix.strip()
+        if parsed is None or not prefix.isdecimal() or int(prefix) > parsed[1]:
+            return None
+        
+        key, width = parsed
+        host_mask = (1 << (width - int(prefix))) - 1
+        first = key & ~host_mask
+        return f"{_format_key(first, width)}/{int(prefix)}", first, first | host_mask
+    
+    if '-' in value:
+        start, _, end = value.partition('-')
+        start, end = _parse_address(start), _parse_address(end)
+        if start is None or end is None or start[1] != end[1] or start[0] > end[0]:
+            return None
+        return f"{_format_key(*start)}-{_format_key(*end)}", start[0], end[0]
+    
+    return None
+
+def classify_ip(value: str) -> Optional[Tuple[str, str]]:
+    """Get the IOC type and normalized form of an IP address, CIDR block or address range"""
+    parsed = parse_ip_range(value)
+    if parsed is not None:
+        return RANGE_TYPE, parsed[0]
+    
+    if ':' not in value and '.' not in value:
+        return None
+    address = _parse_address(value)
+    return ('ip_address', _format_key(*address)) if address else None
+
+def matches_type(indicator_type: str, ioc_type: Optional[str]) -> bool:
+    """Check whether indicators of a type answer a lookup for ioc_type; addresses also match listed ranges"""
+    return not ioc_type or indicator_type == ioc_type or (ioc_type == 'ip_address' and indicator_type == RANGE_TYPE)
+
+class IntervalIndex:
+    """
+    Point lookups over possibly overlapping key ranges in O(log n)
+    
+    The ranges are cut into disjoint segments, each recording which ranges cover
+    it, so finding the ranges around a key is a single binary search. Segment
+    starts are 128-bit keys held as separate high and low 64-bit arrays.
+    """
+    
+    def __init__(
+        self,
+        high: Sequence[int],
+        low: Sequence[int],
+        covers: Sequence[int],
+        multi_offsets: Sequence[int],
+        multi_ids: Sequence[int]
+    ):
+        """
+        Args:
+            high: High 64 bits of each segment start
+            low: Low 64 bits of each segment start
+            covers: What covers each segment: a range id, -1 for a gap, or
+                -2 - i for the i-th run of multi_ids when several ranges overlap
+            multi_offsets: Where each run starts in multi_ids, then where the last one ends
+            multi_ids: Range ids of the overlapping runs
+        """
+        self.high = high
+        self.low = low
+        self.covers = covers
+        self.multi_offsets = multi_offsets
+        self.multi_ids = multi_ids
+    
+    @classmethod
+    def build(cls, ranges: Iterable[Tuple[int, int, int]]) -> "IntervalIndex":
+        """
+        Args:
+            ranges: (first key, last key, range id) with inclusive bounds
+        """
+        events = {}
+        for first, last, range_id in ranges:
+            events.setdefault(first, []).append((1, range_id))
+            # Nothing follows a range that runs to the last key
+            if last < MAX_KEY:
+                events.setdefault(last + 1, []).append((-1, range_id))
+        
+        high, low, covers = array('Q'), array('Q'), array('q')
+        multi_offsets, multi_ids = array('Q', [0]), array('q')
+        
+        active = set()
+        previous = ()
+        for position in sorted(events):
+            for change, range_id in events[position]:
+                if change > 0:
+                    active.add(range_id)
+                else:
+                    active.discard(range_id)
+            
+            # Adjacent segments covered by the same ranges collapse into one
+            members = tuple(sorted(active)) if len(active) > 1 else tuple(active)
+            if members == previous:
+                continue
+            previous = members
+            
+            if not members:
+                cover = -1
+            elif len(members) == 1:
+                cover = members[0]
+            else:
+                cover = -1 - len(multi_offsets)
+                multi_ids.extend(members)
+                multi_offsets.append(len(multi_ids))
+            
+            high.append(position >> 64)
+            low.append(position & LOW_MASK)
+            covers.append(cover)
+        
+        return cls(high, low, covers, multi_offsets, multi_ids)
+    
+    def lookup(self, key: int) -> Tuple[int, ...]:
+        """Get the ids of the ranges containing key"""
+        key_high = key >> 64
+        start = bisect_left(self.high, key_high)
+        end = bisect_right(self.high, key_high, start)
+        # Segments starting in a lower high word all come before the key
+        position = bisect_right(self.low, key & LOW_MASK, start, end) - 1
+        if position < 0:
+            return ()
+        
+        cover = self.covers[position]
+        if cover == -1:
+            return ()
+        if cover >= 0:
+            return (cover,)
+        run = -2 - cover
+        return tuple(self.multi_ids[self.multi_offsets[run]:self.multi_offsets[run + 1]])
+    
+    def arrays(self) -> Tuple[Sequence[int], ...]:
+        """Get the high, low, covers, multi_offsets and multi_ids arrays"""
+        return self.high, self.low, self.covers, self.multi_offsets, self.multi_ids
+    
+    def __len__(self) -> int:
+        return len(self.covers)
+    
+    @property
+    def nbytes(self) -> int:
+        return sum(block.itemsize * len(block) for block in self.arrays())
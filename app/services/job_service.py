@@ -0,0 +1,324 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from app.core.config import settings
+from app.services.analysis_service import AnalysisService
+from app.services.batch_executor import BatchExecutor
+
+class BatchJobService:
+    """Persistent background processing of large IOC batches"""
+    
+    def __init__(
+        self,
+        analysis_service: AnalysisService,
+        db_path: Optional[str] = None,
+        workers: Optional[int] = None,
+        chunk_size: Optional[int] = None
+    ):
+        self.analysis_service = analysis_service
+        self.db_path = db_path or settings.jobs_db_path
+        self.worker_count = workers or settings.job_workers
+        self.chunk_size = chunk_size or settings.job_chunk_size
+        self.claim_timeout = settings.job_claim_timeout
+        self.batch_executor = BatchExecutor(analysis_service)
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        # Identifies the items this process has claimed; other workers share the database
+        self._owner = str(uuid.uuid4())
+        self.initialize_database()
+    
+    def initialize_database(self):
+        """Initialize the batch jobs database"""
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute('PRAGMA journal_mode=WAL')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    description TEXT,
+                    total INTEGER NOT NULL,
+                    done INTEGER DEFAULT 0,
+                    failed INTEGER DEFAULT 0,
+                    created_at TIMESTAMP,
+                    updated_at TIMESTAMP,
+                    completed_at TIMESTAMP
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS job_items (
+                    job_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    indicator TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    analysis_id TEXT,
+                    result TEXT,
+                    error TEXT,
+                    PRIMARY KEY (job_id, position)
+                )
+            ''')
+            
+            # Which worker is processing a running item, and until when its claim holds
+            item_columns = {row[1] for row in cursor.execute('PRAGMA table_info(job_items)')}
+            if 'owner' not in item_columns:
+                cursor.execute('ALTER TABLE job_items ADD COLUMN owner TEXT')
+                cursor.execute('ALTER TABLE job_items ADD COLUMN claimed_until REAL')
+            
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_job_items_status ON job_items(job_id, status)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)')
+            self._conn.commit()
+    
+    def _execute(self, query: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            cursor = self._conn.execute(query, params)
+            rows = cursor.fetchall()
+            self._conn.commit()
+            return rows
+    
+    async def start(self):
+        """
+        Start background workers and resume jobs interrupted by a restart
+        
+        Every worker process resumes every unfinished job; items are claimed chunk
+        by chunk, so each is still analysed once.
+        """
+        self._queue = asyncio.Queue()
+        
+        unfinished = await asyncio.to_thread(
+            self._execute,
+            "SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+        )
+        for (job_id,) in unfinished:
+            self._queue.put_nowait(job_id)
+        
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.worker_count)
+        ]
+    
+    async def stop(self):
+        """Stop background workers; unfinished items stay pending for the next start"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        
+        # Hand back claimed chunks so another worker need not wait for them to expire
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE job_items SET status = 'pending', owner = NULL, claimed_until = NULL WHERE owner = ? AND status = 'running'",
+            (self._owner,)
+        )
+        
+        with self._lock:
+            self._conn.close()
+    
+    async def submit(self, indicators: List[str], description: Optional[str] = None) -> Dict[str, Any]:
+        """Persist a new job and queue it for processing"""
+        job_id = str(uuid.uuid4())
+        now = datetime.utcnow().isoformat()
+        
+        def insert():
+            with self._lock:
+                cursor = self._conn.cursor()
+                cursor.execute('''
+                    INSERT INTO jobs (id, status, description, total, created_at, updated_at)
+                    VALUES (?, 'queued', ?, ?, ?, ?)
+                ''', (job_id, description, len(indicators), now, now))
+                cursor.executemany(
+                    'INSERT INTO job_items (job_id, position, indicator) VALUES (?, ?, ?)',
+                    ((job_id, position, indicator) for position, indicator in enumerate(indicators))
+                )
+                self._conn.commit()
+        
+        await asyncio.to_thread(insert)
+        self._queue.put_nowait(job_id)
+        
+        return {
+            "job_id": job_id,
+            "status": "queued",
+            "total": len(indicators),
+            "created_at": now
+        }
+    
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get job status and progress counts"""
+        rows = await asyncio.to_thread(
+            self._execute,
+            'SELECT id, status, description, total, done, failed, created_at, updated_at, completed_at FROM jobs WHERE id = ?',
+            (job_id,)
+        )
+        if not rows:
+            return None
+        
+        row = rows[0]
+        return {
+            "job_id": row[0],
+            "status": row[1],
+            "description": row[2],
+            "total": row[3],
+            "done": row[4],
+            "failed": row[5],
+            "pending": row[3] - row[4] - row[5],
+            "created_at": row[6],
+            "updated_at": row[7],
+            "completed_at": row[8]
+        }
+    
+    async def get_results(
+        self,
+        job_id: str,
+        offset: int = 0,
+        limit: int = 100,
+        status: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Get a page of job item results in submission order"""
+        if status:
+            query = '''
+                SELECT position, indicator, status, analysis_id, result, error FROM job_items
+                WHERE job_id = ? AND status = ? ORDER BY position LIMIT ? OFFSET ?
+            '''
+            params = (job_id, status, limit, offset)
+        else:
+            query = '''
+                SELECT position, indicator, status, analysis_id, result, error FROM job_items
+                WHERE job_id = ? ORDER BY position LIMIT ? OFFSET ?
+            '''
+            params = (job_id, limit, offset)
+        
+        rows = await asyncio.to_thread(self._execute, query, params)
+        
+        return [
+            {
+                "position": row[0],
+                "indicator": row[1],
+                "status": row[2],
+                "analysis_id": row[3],
+                "result": json.loads(row[4]) if row[4] else None,
+                "error": row[5]
+            }
+            for row in rows
+        ]
+    
+    async def _worker(self):
+        """Process queued jobs one at a time"""
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._process_job(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Batch job {job_id} failed: {e}")
+                await asyncio.to_thread(
+                    self._execute,
+                    "UPDATE jobs SET status = 'failed', updated_at = ? WHERE id = ?",
+                    (datetime.utcnow().isoformat(), job_id)
+                )
+            finally:
+                self._queue.task_done()
+    
+    async def _process_job(self, job_id: str):
+        """Analyze a job's pending items chunk by chunk, persisting each chunk"""
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ? AND status != 'completed'",
+            (datetime.utcnow().isoformat(), job_id)
+        )
+        
+        while True:
+            pending, claimed_until = await asyncio.to_thread(self._claim_chunk, job_id)
+            if not pending:
+                if claimed_until is None:
+                    break
+                # Another worker holds the rest; finish the job if its claims lapse
+                await asyncio.sleep(max(claimed_until - time.time(), 0) + 0.01)
+                continue
+            
+            items, unique = self.batch_executor.prepare([indicator for _, indicator in pending])
+            outcomes = await self.batch_executor.analyze_unique(unique)
+            
+            updates = []
+            for (position, _), item in zip(pending, items):
+                if "error" in item:
+                    updates.append(("failed", None, None, item["error"], job_id, position))
+                    continue
+                
+                outcome = outcomes[item["key"]]
+                if isinstance(outcome, Exception):
+                    updates.append(("failed", None, None, f"Analysis failed - {outcome}", job_id, position))
+                else:
+                    result = json.dumps(outcome.model_dump(mode="json"))
+                    updates.append(("completed", outcome.id, result, None, job_id, position))
+            
+            await asyncio.to_thread(self._record_chunk, job_id, updates)
+        
+        now = datetime.utcnow().isoformat()
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE jobs SET status = 'completed', updated_at = ?, completed_at = ? WHERE id = ? AND status != 'completed'",
+            (now, now, job_id)
+        )
+    
+    def _claim_chunk(self, job_id: str) -> Tuple[List[tuple], Optional[float]]:
+        """
+        Claim the next chunk of a job's items for this worker
+        
+        Pending items and items whose claim expired are taken in one write
+        transaction, so no two workers analyse the same item.
+        
+        Returns:
+            (position, indicator) of each claimed item, and when nothing was
+            claimable, the earliest expiry of other workers' claims or None
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                items = self._conn.execute('''
+                    SELECT position, indicator FROM job_items
+                    WHERE job_id = ? AND (status = 'pending' OR (status = 'running' AND claimed_until < ?))
+                    ORDER BY position LIMIT ?
+                ''', (job_id, now, self.chunk_size)).fetchall()
+                
+                if not items:
+                    claimed_until = self._conn.execute(
+                        "SELECT MIN(claimed_until) FROM job_items WHERE job_id = ? AND status = 'running'", (job_id,)
+                    ).fetchone()[0]
+                    return [], claimed_until
+                
+                self._conn.executemany('''
+                    UPDATE job_items SET status = 'running', owner = ?, claimed_until = ?
+                    WHERE job_id = ? AND position = ?
+                ''', ((self._owner, now + self.claim_timeout, job_id, position) for position, _ in items))
+                return items, None
+            finally:
+                self._conn.commit()
+    
+    def _record_chunk(self, job_id: str, updates: List[tuple]):
+        """Write a chunk of item results and progress counters in one transaction"""
+        with self._lock:
+            cursor = self._conn.cursor()
+            # Results of a chunk whose claim lapsed and passed to another worker are dropped
+            cursor.executemany('''
+                UPDATE job_items SET status = ?, analysis_id = ?, result = ?, error = ?, owner = NULL, claimed_until = NULL
+                WHERE job_id = ? AND position = ? AND owner = ? AND status = 'running'
+            ''', (update + (self._owner,) for update in updates))
+            # Counted from the items, so the totals stay right whoever recorded them
+            cursor.execute('''
+                UPDATE jobs SET
+                    done = (SELECT COUNT(*) FROM job_items WHERE job_id = ? AND status = 'completed'),
+                    failed = (SELECT COUNT(*) FROM job_items WHERE job_id = ? AND status = 'failed'),
+                    updated_at = ?
+                WHERE id = ?
+            ''', (job_id, job_id, datetime.utcnow().isoformat(), job_id))
+            self._conn.commit()
@@ -0,0 +1,197 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional
+
+class QuotaExceededError(Exception):
+    """Raised when a provider's daily request quota has been used up"""
+    pass
+
+class TokenBucket:
+    """Token bucket refilled continuously at a fixed per-minute rate"""
+    
+    def __init__(self, requests_per_minute: int, burst: Optional[int] = None):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst or requests_per_minute)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+    
+    def _refill(self):
+        """Add the tokens accrued since the last refill"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+    
+    def try_consume(self) -> float:
+        """
+        Consume a token if one is available
+        
+        Returns:
+            0 if a token was consumed, otherwise the seconds until one is available
+        """
+        self._refill()
+        
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        
+        return (1 - self.tokens) / self.rate
+    
+    def drain(self):
+        """Drop all accumulated tokens"""
+        self._refill()
+        self.tokens = 0.0
+    
+    def available(self) -> float:
+        """Return the number of tokens currently available"""
+        self._refill()
+        return self.tokens
+
+class ProviderRateLimiter:
+    """Rate limiter and concurrency governor for a single threat intel provider"""
+    
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: int,
+        burst: Optional[int] = None,
+        max_concurrent: int = 5,
+        daily_quota: Optional[int] = None
+    ):
+        self.name = name
+        self.requests_per_minute = requests_per_minute
+        self.max_concurrent = max_concurrent
+        self.daily_quota = daily_quota
+        self.bucket = TokenBucket(requests_per_minute, burst)
+        
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._lock = asyncio.Lock()
+        self._blocked_until = 0.0
+        self._in_flight = 0
+        self._waiting = 0
+        self._quota_day = datetime.utcnow().date()
+        self._quota_used = 0
+        self._throttled_count = 0
+    
+    def _check_quota(self):
+        """Reset the daily counter at UTC midnight and enforce the quota"""
+        today = datetime.utcnow().date()
+        if today != self._quota_day:
+            self._quota_day = today
+            self._quota_used = 0
+        
+        if self.daily_quota is not None and self._quota_used >= self.daily_quota:
+            raise QuotaExceededError(
+                f"Daily quota of {self.daily_quota} requests exhausted for {self.name}"
+            )
+    
+    async def acquire(self):
+        """Wait until a request may be sent to the provider"""
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+            try:
+                # The lock queues waiters in FIFO order while they wait for tokens
+                async with self._lock:
+                    while True:
+                        self._check_quota()
+                        
+                        delay = self._blocked_until - time.monotonic()
+                        if delay <= 0:
+                            delay = self.bucket.try_consume()
+                        if delay <= 0:
+                            break
+                        
+                        await asyncio.sleep(delay)
+                    
+                    self._quota_used += 1
+            except BaseException:
+                self._semaphore.release()
+                raise
+        finally:
+            self._waiting -= 1
+        
+        self._in_flight += 1
+    
+    def release(self):
+        """Mark an in-flight request as finished"""
+        self._in_flight -= 1
+        self._semaphore.release()
+    
+    @asynccontextmanager
+    async def slot(self):
+        """Context manager holding a rate-limited request slot"""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+    
+    def defer(self, seconds: float):
+        """Pause all requests to the provider, e.g. after a 429 with Retry-After"""
+        self._throttled_count += 1
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self.bucket.drain()
+    
+    def get_status(self) -> Dict[str, Any]:
+        """Get current limiter state"""
+        blocked_for = max(0.0, self._blocked_until - time.monotonic())
+        
+        return {
+            "requests_per_minute": self.requests_per_minute,
+            "burst": int(self.bucket.capacity),
+            "tokens_available": round(self.bucket.available(), 2),
+            "max_concurrent": self.max_concurrent,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "daily_quota": self.daily_quota,
+            "daily_used": self._quota_used,
+            "blocked_for_seconds": round(blocked_for, 2),
+            "throttled_count": self._throttled_count
+        }
+
+class RateLimitManager:
+    """Registry of per-provider rate limiters"""
+    
+    def __init__(self, provider_limits: Dict[str, Dict[str, Any]], default_per_minute: int = 60):
+        self.provider_limits = provider_limits
+        self.default_per_minute = default_per_minute
+        self.limiters: Dict[str, ProviderRateLimiter] = {}
+        
+        for provider in provider_limits:
+            self.get(provider)
+    
+    def get(self, provider: str) -> ProviderRateLimiter:
+        """Return the limiter for a provider, creating it on first use"""
+        if provider not in self.limiters:
+            config = self.provider_limits.get(provider, {})
+            self.limiters[provider] = ProviderRateLimiter(
+                provider,
+                requests_per_minute=config.get("requests_per_minute", self.default_per_minute),
+                burst=config.get("burst"),
+                max_concurrent=config.get("max_concurrent", 5),
+                daily_quota=config.get("daily_quota")
+            )
+        return self.limiters[provider]
+    
+    def get_status(self) -> Dict[str, Any]:
+        """Get the state of every provider limiter"""
+        return {name: limiter.get_status() for name, limiter in self.limiters.items()}
+
+def parse_retry_after(value: Optional[str], default: float) -> float:
+    """Parse a Retry-After header given either in seconds or as an HTTP date"""
+    if not value:
+        return default
+    
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(retry_at.tzinfo)).total_seconds())
+    except (TypeError, ValueError):
+        return default
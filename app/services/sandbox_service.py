@@ -17,6 +17,8 @@ class SandboxService:
         self.docker_client = None
         self.active_containers = {}
         self.analysis_queue = {}
+        # Background analyses keep running after the submitting request returns
+        self._tasks = set()
         self.supported_environments = {
             "windows10": {
                 "image": "threatanalysis/windows10-sandbox:latest",
@@ -40,6 +42,12 @@ class SandboxService:
             }
         }
         
+    async def close(self):
+        """Cancel background analyses still in progress"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+    
     async def initialize_docker(self):
         """Initialize Docker client"""
         try:
@@ -128,7 +136,9 @@ class SandboxService:
             self.analysis_queue[analysis_id] = analysis_record
             
             # Start analysis in background
-            asyncio.create_task(self._run_sandbox_analysis(analysis_id, file_path))
+            task = asyncio.create_task(self._run_sandbox_analysis(analysis_id, file_path))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
             
             return {
                 "analysis_id": analysis_id,
@@ -0,0 +1,42 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into a single execution"""
+    
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.executed_count = 0
+        self.coalesced_count = 0
+    
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run func for key, or wait for the call already in flight for key
+        
+        The shared call runs as its own task, so a caller that is cancelled
+        (e.g. a client disconnect) does not cancel it for everyone else.
+        """
+        task = self._in_flight.get(key)
+        
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.executed_count += 1
+        else:
+            self.coalesced_count += 1
+        
+        return await asyncio.shield(task)
+    
+    def _forget(self, key: str, task: asyncio.Task):
+        """Drop a finished call so the next request for key starts fresh"""
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Get coalescing statistics"""
+        return {
+            "in_flight": len(self._in_flight),
+            "executed": self.executed_count,
+            "coalesced": self.coalesced_count
+        }
@@ -1,27 +1,173 @@
 import asyncio
 import aiohttp
-import csv
+import hashlib
 import json
 import xml.etree.ElementTree as ET
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Iterable, Iterator, BinaryIO, Tuple
 from datetime import datetime, timedelta
 import uuid
 import sqlite3
+import tempfile
+import queue
 import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from pathlib import Path
+from app.core.config import settings
+from app.services.indicator_index import IndicatorIndex
+from app.services.indicator_snapshot import IndicatorSnapshot, stage_snapshot
+from app.services.file_lock import FileLock
+from app.services.bloom_filter import IndicatorFilters
+from app.services.ip_ranges import RANGE_TYPE, classify_ip, ip_to_key, key_to_bytes, parse_ip_range
+from app.services.feed_parsers import open_feed_file, iter_json_records, iter_csv_records, iter_xml_records
+
+FEED_FORMATS = {'json', 'csv', 'xml', 'stix'}
+
+# Common field names for IOC values, in order of preference
+VALUE_FIELDS = ('value', 'indicator', 'ioc', 'observable', 'artifact', 'domain', 'ip', 'hash', 'url')
+
+# Hex digests recognized by length
+HASH_LENGTHS = {32: 'hash_md5', 40: 'hash_sha1', 64: 'hash_sha256'}
+HEX_DIGEST = re.compile(r'[0-9a-fA-F]+')
+
+# Secondary indexes on indicators; dropped and rebuilt around very large loads
+INDICATOR_INDEXES = {
+    "idx_indicators_value": "CREATE INDEX IF NOT EXISTS idx_indicators_value ON indicators(value)",
+    "idx_indicators_type": "CREATE INDEX IF NOT EXISTS idx_indicators_type ON indicators(ioc_type)",
+    "idx_indicators_range": (
+        "CREATE INDEX IF NOT EXISTS idx_indicators_range ON indicators(range_start) WHERE range_start IS NOT NULL"
+    )
+}
+
+# Identity of an indicator within a feed; feed updates upsert on it
+INDICATOR_KEY_INDEX = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_indicators_feed_key ON indicators(feed_id, ioc_type, value)"
+)
 
 class ThreatFeedService:
     """Service for managing and ingesting threat intelligence feeds"""
     
-    def __init__(self, db_path: str = "threat_feeds.db"):
-        self.db_path = db_path
+    def __init__(self, db_path: Optional[str] = None, pool_size: Optional[int] = None):
+        self.db_path = db_path or settings.threat_feeds_db_path
+        self.pool_size = pool_size or settings.threat_feeds_db_pool_size
         self.active_feeds = {}
         self.feed_configs = {}
         self.initialize_database()
         
+        # Reads run on dedicated threads, each call borrowing a pooled connection;
+        # WAL lets them proceed while a feed is being written
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="feed-db")
+        self._pool: queue.Queue = queue.Queue()
+        for _ in range(self.pool_size):
+            self._pool.put(self._connect())
+        
+        # SQLite allows one writer at a time, so all writes queue on one thread
+        # with its own connection instead of contending on busy_timeout
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="feed-writer")
+        self._writer_conn = self._connect()
+        
+        # Feed downloads overlap up to this many at once and share one bandwidth budget
+        self._download_slots = asyncio.Semaphore(settings.threat_feeds_max_concurrent_downloads)
+        self.max_bandwidth = settings.threat_feeds_max_bandwidth
+        self._bandwidth_free_at = 0.0
+        
+        # Active indicators for lookups without the database, once load_index() has run:
+        # held in this process, or mapped from a snapshot file shared by all workers
+        self.index_backend = settings.threat_feeds_index_backend
+        self.snapshot_path = os.path.splitext(self.db_path)[0] + '.snapshot'
+        # Orders the renames of shared files across workers without holding the database write lock
+        self._publish_lock = FileLock(os.path.splitext(self.db_path)[0] + '.lock')
+        if self.index_backend == 'snapshot':
+            self.index = IndicatorSnapshot(self.snapshot_path, settings.threat_feeds_snapshot_check_interval)
+        else:
+            self.index = IndicatorIndex()
+        # Database generation and per-feed last_update the in-memory index reflects
+        self._index_generation: Optional[int] = None
+        self._index_versions: Dict[str, Optional[str]] = {}
+        # The writer syncs the in-memory index after its own changes, a background task after other workers'
+        self._index_lock = threading.Lock()
+        self.index_sync_interval = settings.threat_feeds_index_sync_interval
+        self._index_follower: Optional[asyncio.Task] = None
+        
+        # Membership filters that rule out indicators no feed lists before any lookup
+        self.filters = IndicatorFilters(
+            os.path.splitext(self.db_path)[0] + '.bloom',
+            settings.threat_feeds_bloom_fp_rate,
+            settings.threat_feeds_snapshot_check_interval
+        )
+        
+        self.poll_interval = settings.threat_feeds_poll_interval
+        self._scheduler: Optional[asyncio.Task] = None
+        # Held by the worker that schedules updates until it stops; the OS releases it if that
+        # worker dies, so there is nothing to renew while an import holds the database
+        self._scheduler_lock = FileLock(os.path.splitext(self.db_path)[0] + '.scheduler.lock')
+        self._next_update: Dict[str, datetime] = {}
+        self._updates: Dict[str, asyncio.Task] = {}
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # WAL stays durable across application crashes with NORMAL; only an OS
+        # crash can lose the last commits, which the next feed update restores
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA cache_size=-{settings.threat_feeds_cache_kb}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+    
+    def close(self):
+        """Wait for pending database work and close the pooled connections"""
+        self._executor.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+        self._writer_conn.close()
+    
+    async def start(self):
+        """Load the indicator index and start the scheduler that refreshes feeds as their interval elapses"""
+        if self.index_backend != 'none':
+            await self.load_index()
+        if self.index_backend == 'memory':
+            self._index_follower = asyncio.create_task(self._follow_index())
+        if settings.threat_feeds_bloom_enabled:
+            await self.load_filters()
+        
+        if settings.threat_feeds_scheduler_enabled:
+            self._scheduler = asyncio.create_task(self._schedule_loop())
+    
+    async def stop(self):
+        """Stop the scheduler, cancel scheduled updates in progress and close the database"""
+        if self._index_follower:
+            self._index_follower.cancel()
+            await asyncio.gather(self._index_follower, return_exceptions=True)
+            self._index_follower = None
+        
+        if self._scheduler:
+            self._scheduler.cancel()
+            await asyncio.gather(self._scheduler, return_exceptions=True)
+            self._scheduler = None
+        
+        updates = list(self._updates.values())
+        for task in updates:
+            task.cancel()
+        await asyncio.gather(*updates, return_exceptions=True)
+        # Only once its updates are cancelled, so the next scheduler cannot start them again meanwhile
+        self._scheduler_lock.release()
+        
+        self.close()
+        
     def initialize_database(self):
         """Initialize the threat feeds database"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
+        try:
+            self._create_tables(conn)
+        finally:
+            conn.close()
+    
+    def _create_tables(self, conn: sqlite3.Connection):
         cursor = conn.cursor()
         
         # Create feeds table
@@ -37,14 +183,36 @@ class ThreatFeedService:
                 record_count INTEGER DEFAULT 0,
                 error_count INTEGER DEFAULT 0,
                 status TEXT DEFAULT 'inactive',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT
             )
         ''')
         
-        # Create indicators table
+        # Bumped by every change to the indicators so saved filters can tell they are stale
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS feed_state (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        ''')
+        
+        # Download fingerprints used to skip unchanged feeds
+        feed_columns = {row[1] for row in cursor.execute('PRAGMA table_info(feeds)')}
+        for column in ('etag', 'last_modified', 'content_hash'):
+            if column not in feed_columns:
+                cursor.execute(f'ALTER TABLE feeds ADD COLUMN {column} TEXT')
+        
+        # Databases created before integer keys are rebuilt once
+        columns = {row[1]: row[2] for row in cursor.execute('PRAGMA table_info(indicators)')}
+        if columns.get('id') == 'TEXT':
+            cursor.execute('ALTER TABLE indicators RENAME TO indicators_legacy')
+        
+        # Create indicators table; the integer key is the rowid, so no separate key index
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS indicators (
-                id TEXT PRIMARY KEY,
+                id INTEGER PRIMARY KEY,
                 feed_id TEXT NOT NULL,
                 ioc_type TEXT NOT NULL,
                 value TEXT NOT NULL,
@@ -54,39 +222,304 @@ class ThreatFeedService:
                 tags TEXT,
                 first_seen TIMESTAMP,
                 last_seen TIMESTAMP,
+                status TEXT NOT NULL DEFAULT 'active',
+                expired_at TIMESTAMP,
+                range_start BLOB,
+                range_end BLOB,
                 FOREIGN KEY (feed_id) REFERENCES feeds (id)
             )
         ''')
         
+        if columns and columns.get('id') != 'TEXT' and 'status' not in columns:
+            cursor.execute("ALTER TABLE indicators ADD COLUMN status TEXT NOT NULL DEFAULT 'active'")
+            cursor.execute('ALTER TABLE indicators ADD COLUMN expired_at TIMESTAMP')
+        
+        # Bounds of CIDR and IP-range indicators as 16-byte big-endian keys
+        if columns and columns.get('id') != 'TEXT' and 'range_start' not in columns:
+            cursor.execute('ALTER TABLE indicators ADD COLUMN range_start BLOB')
+            cursor.execute('ALTER TABLE indicators ADD COLUMN range_end BLOB')
+        
+        if columns.get('id') == 'TEXT':
+            cursor.execute('''
+                INSERT INTO indicators
+                (feed_id, ioc_type, value, confidence, threat_level, description, tags, first_seen, last_seen)
+                SELECT feed_id, ioc_type, value, confidence, threat_level, description, tags, first_seen, last_seen
+                FROM indicators_legacy
+            ''')
+            cursor.execute('DROP TABLE indicators_legacy')
+        
+        # Full reloads could store an indicator twice; keep the oldest before enforcing identity
+        has_key_index = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_indicators_feed_key'"
+        ).fetchone()
+        if not has_key_index:
+            cursor.execute('''
+                DELETE FROM indicators WHERE id NOT IN (
+                    SELECT MIN(id) FROM indicators GROUP BY feed_id, ioc_type, value
+                )
+            ''')
+            cursor.execute('DROP INDEX IF EXISTS idx_indicators_feed')
+        cursor.execute(INDICATOR_KEY_INDEX)
+        
         # Create index for faster lookups
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_indicators_value ON indicators(value)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_indicators_type ON indicators(ioc_type)')
+        for create_index in INDICATOR_INDEXES.values():
+            cursor.execute(create_index)
+        
+        # Digests stored before they were lower-cased; a lower-case twin from a later update wins
+        if not cursor.execute("SELECT 1 FROM feed_state WHERE name = 'hash_values_lowercase'").fetchone():
+            hash_types = tuple(HASH_LENGTHS.values())
+            cursor.execute(f'''
+                UPDATE OR IGNORE indicators SET value = lower(value)
+                WHERE ioc_type IN {hash_types} AND value != lower(value)
+            ''')
+            cursor.execute(f'DELETE FROM indicators WHERE ioc_type IN {hash_types} AND value != lower(value)')
+            cursor.execute("INSERT INTO feed_state (name, value) VALUES ('hash_values_lowercase', 1)")
+        
+        # Databases holding ranges from before their widest span was tracked
+        if not cursor.execute("SELECT 1 FROM feed_state WHERE name = 'range_span_bits'").fetchone():
+            self._widen_range_span(conn, cursor.execute(
+                'SELECT range_start, range_end FROM indicators WHERE range_start IS NOT NULL'
+            ).fetchall())
         
         conn.commit()
-        conn.close()
+    
+    async def load_index(self):
+        """Build the indicator index from the active indicators in the database"""
+        if self.index_backend == 'snapshot':
+            # Workers share the snapshot another process compiled; only the first compiles it
+            await self._write(self._load_snapshot)
+            return
+        
+        # On the writer thread, so no feed update can land between the read and the swap
+        await self._write(self._load_memory_index)
+    
+    def _load_memory_index(self, conn: sqlite3.Connection):
+        """Build the in-memory index from one consistent read of the active indicators"""
+        with self._index_lock:
+            conn.execute('BEGIN')
+            try:
+                self._index_generation = self._generation(conn)
+                self._index_versions = dict(conn.execute('SELECT id, last_update FROM feeds'))
+                self.index.load(conn.execute("SELECT feed_id, ioc_type, value FROM indicators WHERE status = 'active'"))
+            finally:
+                conn.commit()
+    
+    def _sync_index(self, conn: sqlite3.Connection):
+        """
+        Bring the in-memory index up to date with the database
+        
+        Other workers write to the same database, so the feeds to reload are found
+        from their last_update rather than from this process's own writes.
+        """
+        with self._index_lock:
+            conn.execute('BEGIN')
+            try:
+                generation = self._generation(conn)
+                if generation == self._index_generation:
+                    return
+                
+                versions = dict(conn.execute('SELECT id, last_update FROM feeds'))
+                for feed_id in set(self._index_versions) - set(versions):
+                    self.index.remove_feed(feed_id)
+                for feed_id, version in versions.items():
+                    if self._index_versions.get(feed_id) != version:
+                        self.index.replace_feed(feed_id, conn.execute(
+                            "SELECT ioc_type, value FROM indicators WHERE feed_id = ? AND status = 'active'", (feed_id,)
+                        ))
+                
+                self._index_versions = versions
+                self._index_generation = generation
+            finally:
+                conn.commit()
+    
+    async def sync_index(self):
+        """Bring the in-memory index up to date with the changes any worker has committed"""
+        if self.index_backend == 'memory' and self.index.loaded:
+            # On a reader thread, so a long import queued on the writer does not hold it up
+            await self._read(self._sync_index)
+    
+    async def _follow_index(self):
+        """Pick up other workers' indicator changes every index_sync_interval, off the lookup path"""
+        while True:
+            await asyncio.sleep(self.index_sync_interval)
+            try:
+                await self.sync_index()
+            except Exception as e:
+                print(f"Indicator index sync failed: {e}")
+    
+    async def load_filters(self):
+        """Load the saved membership filters, rebuilding them if they are missing or stale"""
+        def load(conn):
+            with self._publish_lock:
+                if self.filters.load() and self.filters.generation == self._generation(conn):
+                    return
+            self._rebuild_filters(conn)
+        
+        await self._write(load)
+    
+    def _generation(self, conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT value FROM feed_state WHERE name = 'indicators_generation'").fetchone()
+        return row[0] if row else 0
+    
+    def _bump_generation(self, conn: sqlite3.Connection):
+        conn.execute('''
+            INSERT INTO feed_state (name, value) VALUES ('indicators_generation', 1)
+            ON CONFLICT (name) DO UPDATE SET value = value + 1
+        ''')
+    
+    def _rebuild_filters(self, conn: sqlite3.Connection):
+        """
+        Size and fill new membership filters from the committed active indicators and save them
+        
+        The indicators come from one read transaction. The filters are saved only
+        if no change has committed since, as its values may be missing from them;
+        otherwise this worker goes back to the copy on disk.
+        """
+        conn.execute('BEGIN')
+        try:
+            generation = self._generation(conn)
+            counts = dict(conn.execute(
+                "SELECT ioc_type, COUNT(*) FROM indicators WHERE status = 'active' GROUP BY ioc_type"
+            ).fetchall())
+            rows = conn.execute("SELECT ioc_type, value FROM indicators WHERE status = 'active'")
+            self.filters.build(counts, rows, generation)
+        finally:
+            conn.commit()
+        
+        with self._publish_lock:
+            if self._generation(conn) == generation:
+                self.filters.save()
+            elif not self.filters.load():
+                self.filters.loaded = False
+    
+    def _save_filters(self, conn: sqlite3.Connection, generation: int, feed_id: Optional[str], updated_at: Optional[str]):
+        """
+        Add a committed change to the saved membership filters, rebuilding them once they lose accuracy
+        
+        Runs under the lock file rather than the database write lock. The copy on
+        disk is reloaded first, so values other workers saved are kept, then the
+        indicators the feed update listed are added and its generation recorded.
+        """
+        with self._publish_lock:
+            if self.filters.load():
+                if feed_id is not None:
+                    for ioc_type, value in conn.execute(
+                        'SELECT ioc_type, value FROM indicators WHERE feed_id = ? AND last_seen = ?', (feed_id, updated_at)
+                    ):
+                        self.filters.add(ioc_type, value)
+                self.filters.record_generation(generation)
+                if not self.filters.needs_rebuild():
+                    self.filters.save()
+                    return
+        
+        self._rebuild_filters(conn)
+    
+    def _load_snapshot(self, conn: sqlite3.Connection):
+        """Map the shared snapshot, compiling it first if it is missing or behind the database"""
+        self.index.open()
+        # A change committing meanwhile publishes its own snapshot, which the next pass maps
+        while self.index.generation != self._generation(conn):
+            if not self._compile_snapshot(conn):
+                self.index.open()
+    
+    def _compile_snapshot(self, conn: sqlite3.Connection) -> bool:
+        """
+        Compile a snapshot of the committed active indicators and switch to it
+        
+        The indicators come from one read transaction, so other workers keep
+        writing while it compiles. The file is renamed into place only if the
+        database is still at the generation it was read at; otherwise the newer
+        change publishes its own, so an older snapshot never replaces a newer one.
+        
+        Returns:
+            Whether the snapshot was published
+        """
+        conn.execute('BEGIN')
+        try:
+            generation = self._generation(conn)
+            index = IndicatorIndex()
+            index.load(conn.execute("SELECT feed_id, ioc_type, value FROM indicators WHERE status = 'active'"))
+        finally:
+            conn.commit()
+        
+        temp_path = stage_snapshot(index, self.snapshot_path, generation)
+        published = False
+        try:
+            with self._publish_lock:
+                if self._generation(conn) == generation:
+                    os.replace(temp_path, self.snapshot_path)
+                    published = True
+        finally:
+            if not published:
+                os.remove(temp_path)
+        
+        if published:
+            self.index.open()
+        return published
+    
+    def _publish_changes(
+        self,
+        conn: sqlite3.Connection,
+        generation: int,
+        feed_id: Optional[str] = None,
+        updated_at: Optional[str] = None
+    ):
+        """Update the files other workers read once the indicator change at generation has committed on conn"""
+        # The change is already committed, so a failure only leaves readers on the previous files
+        try:
+            if self.filters.loaded:
+                self._save_filters(conn, generation, feed_id, updated_at)
+            if self.index_backend == 'snapshot':
+                self._compile_snapshot(conn)
+        except Exception as e:
+            print(f"Failed to publish indicator changes: {e}")
+    
+    def _refresh_index(self, conn: sqlite3.Connection):
+        """Bring this process's in-memory index up to date after feed indicators changed"""
+        if self.index_backend == 'memory' and self.index.loaded:
+            self._sync_index(conn)
+    
+    def _call(self, func, write: bool):
+        conn = self._writer_conn if write else self._pool.get()
+        try:
+            return func(conn)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            if not write:
+                self._pool.put(conn)
+    
+    async def _read(self, func):
+        """Run func(conn) on a pooled connection off the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, func, False)
+    
+    async def _write(self, func):
+        """Run func(conn) on the single writer thread, rolling back if it fails"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, self._call, func, True)
     
     async def add_feed(self, feed_config: Dict[str, Any]) -> Dict[str, Any]:
         """Add a new threat intelligence feed"""
         try:
             feed_id = str(uuid.uuid4())
             
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO feeds (id, name, url, format, update_interval, auth_token)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                feed_id,
-                feed_config['name'],
-                feed_config['url'],
-                feed_config['format'],
-                int(float(feed_config['interval']) * 3600),  # Convert hours to seconds
-                feed_config.get('auth', '')
-            ))
+            def insert(conn):
+                conn.execute('''
+                    INSERT INTO feeds (id, name, url, format, update_interval, auth_token)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (
+                    feed_id,
+                    feed_config['name'],
+                    feed_config['url'],
+                    feed_config['format'],
+                    int(float(feed_config['interval']) * 3600),  # Convert hours to seconds
+                    feed_config.get('auth', '')
+                ))
+                conn.commit()
             
-            conn.commit()
-            conn.close()
+            await self._write(insert)
             
             # Store in memory for quick access
             self.feed_configs[feed_id] = feed_config
@@ -104,74 +537,103 @@ class ThreatFeedService:
             }
     
     async def update_feed(self, feed_id: str) -> Dict[str, Any]:
-        """Update a specific threat intelligence feed"""
+        """Update a specific threat intelligence feed, unless any worker is already updating it"""
+        update_lock = self._update_lock(feed_id)
+        if not update_lock.acquire(blocking=False):
+            return {"error": "Feed update already in progress", "status": "in_progress", "feed_id": feed_id}
+        
+        try:
+            result = await self._update_feed(feed_id)
+        finally:
+            update_lock.release()
+        
+        if result.get("status") == "not_found":
+            self._remove_update_lock(feed_id)
+        return result
+    
+    def _update_lock(self, feed_id: str) -> FileLock:
+        """
+        Lock held by the worker updating a feed
+        
+        A lock file rather than a row, since marking a row would wait on the
+        database write lock that another feed's import may hold for minutes.
+        """
+        name = hashlib.sha256(feed_id.encode()).hexdigest()[:16]
+        return FileLock(f"{os.path.splitext(self.db_path)[0]}.update-{name}.lock")
+    
+    def _remove_update_lock(self, feed_id: str):
+        """Remove the update lock file of a feed that does not exist"""
+        try:
+            os.remove(self._update_lock(feed_id).path)
+        except FileNotFoundError:
+            pass
+    
+    async def _update_feed(self, feed_id: str) -> Dict[str, Any]:
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Get feed configuration
-            cursor.execute('SELECT * FROM feeds WHERE id = ?', (feed_id,))
-            feed_row = cursor.fetchone()
+            feed_row = await self._read(
+                lambda conn: conn.execute('''
+                    SELECT url, format, auth_token, etag, last_modified, content_hash
+                    FROM feeds WHERE id = ?
+                ''', (feed_id,)).fetchone()
+            )
             
             if not feed_row:
                 return {"error": "Feed not found", "status": "not_found"}
             
             # Extract feed info
-            _, name, url, format_type, interval, auth_token, _, _, _, status, _ = feed_row
+            url, format_type, auth_token, etag, last_modified, content_hash = feed_row
             
-            # Download and process feed
-            indicators = await self._download_and_parse_feed(url, format_type, auth_token)
+            if format_type.lower() not in FEED_FORMATS:
+                raise Exception(f"Unsupported feed format: {format_type}")
             
-            # Clear existing indicators for this feed
-            cursor.execute('DELETE FROM indicators WHERE feed_id = ?', (feed_id,))
+            # Download the feed unless the server reports it unchanged
+            async with self._download_slots:
+                download = await self._download_feed(url, auth_token, etag, last_modified)
             
-            # Insert new indicators
-            for indicator in indicators:
-                cursor.execute('''
-                    INSERT OR REPLACE INTO indicators 
-                    (id, feed_id, ioc_type, value, confidence, threat_level, description, tags, first_seen, last_seen)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    str(uuid.uuid4()),
-                    feed_id,
-                    indicator.get('type', 'unknown'),
-                    indicator['value'],
-                    indicator.get('confidence', 50),
-                    indicator.get('threat_level', 'medium'),
-                    indicator.get('description', ''),
-                    json.dumps(indicator.get('tags', [])),
-                    indicator.get('first_seen', datetime.utcnow().isoformat()),
-                    datetime.utcnow().isoformat()
-                ))
-            
-            # Update feed metadata
-            cursor.execute('''
-                UPDATE feeds 
-                SET last_update = ?, record_count = ?, status = 'active'
-                WHERE id = ?
-            ''', (datetime.utcnow().isoformat(), len(indicators), feed_id))
+            if download is None:
+                return await self._mark_unchanged(feed_id, "not_modified", etag, last_modified, content_hash)
             
-            conn.commit()
-            conn.close()
+            try:
+                if download["content_hash"] == content_hash:
+                    return await self._mark_unchanged(
+                        feed_id, "content_unchanged", download["etag"], download["last_modified"], content_hash
+                    )
+                
+                # Parse on the writer thread so records go from the spool file
+                # straight into upsert batches without materializing the feed
+                def apply(conn):
+                    delta = self._apply_delta(
+                        conn, feed_id, self._iter_feed_file(download["path"], format_type), download
+                    )
+                    self._refresh_index(conn)
+                    return delta
+                
+                delta = await self._write(apply)
+            finally:
+                os.remove(download["path"])
             
             return {
                 "feed_id": feed_id,
                 "status": "updated",
-                "records_imported": len(indicators),
-                "last_update": datetime.utcnow().isoformat()
+                "records_imported": delta["seen"],
+                "added": delta["added"],
+                "removed": delta["removed"],
+                "unchanged": delta["unchanged"],
+                "last_update": delta["updated_at"]
             }
             
         except Exception as e:
             # Update error count
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                UPDATE feeds 
-                SET error_count = error_count + 1, status = 'error'
-                WHERE id = ?
-            ''', (feed_id,))
-            conn.commit()
-            conn.close()
+            def mark_error(conn):
+                conn.execute('''
+                    UPDATE feeds 
+                    SET error_count = error_count + 1, status = 'error'
+                    WHERE id = ?
+                ''', (feed_id,))
+                conn.commit()
+            
+            await self._write(mark_error)
             
             return {
                 "error": str(e),
@@ -179,134 +641,339 @@ class ThreatFeedService:
                 "feed_id": feed_id
             }
     
-    async def _download_and_parse_feed(self, url: str, format_type: str, auth_token: str = None) -> List[Dict[str, Any]]:
-        """Download and parse a threat intelligence feed"""
+    async def _mark_unchanged(
+        self,
+        feed_id: str,
+        reason: str,
+        etag: Optional[str],
+        last_modified: Optional[str],
+        content_hash: Optional[str]
+    ) -> Dict[str, Any]:
+        """Record a successful check of a feed whose contents have not changed"""
+        now = datetime.utcnow().isoformat()
+        
+        def touch(conn):
+            conn.execute('''
+                UPDATE feeds
+                SET last_update = ?, status = 'active', etag = ?, last_modified = ?, content_hash = ?
+                WHERE id = ?
+            ''', (now, etag, last_modified, content_hash, feed_id))
+            conn.commit()
+        
+        await self._write(touch)
+        
+        return {
+            "feed_id": feed_id,
+            "status": "not_modified",
+            "reason": reason,
+            "records_imported": 0,
+            "added": 0,
+            "removed": 0,
+            "last_update": now
+        }
+    
+    def _apply_delta(
+        self,
+        conn: sqlite3.Connection,
+        feed_id: str,
+        indicators: Iterable[Dict[str, Any]],
+        fingerprint: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Merge a feed's current indicators into the stored ones in one transaction
+        
+        Indicators are upserted on (feed_id, ioc_type, value): new ones are inserted,
+        known ones keep first_seen and get last_seen bumped, and active indicators
+        the feed no longer lists are marked expired. Searches keep seeing the
+        previous contents until the transaction commits.
+        
+        Returns:
+            Counts of seen, added, removed and unchanged indicators
+        """
+        now = datetime.utcnow().isoformat()
+        conn.execute('BEGIN IMMEDIATE')
+        active_before = conn.execute(
+            "SELECT COUNT(*) FROM indicators WHERE feed_id = ? AND status = 'active'", (feed_id,)
+        ).fetchone()[0]
+        
+        self._bulk_upsert_indicators(conn, feed_id, indicators, now)
+        self._widen_range_span(conn, conn.execute(
+            'SELECT range_start, range_end FROM indicators WHERE feed_id = ? AND ioc_type = ? AND last_seen = ?',
+            (feed_id, RANGE_TYPE, now)
+        ))
+        
+        # Every indicator in this update now carries last_seen = now
+        seen = conn.execute(
+            'SELECT COUNT(*) FROM indicators WHERE feed_id = ? AND last_seen = ?', (feed_id, now)
+        ).fetchone()[0]
+        
+        # An update keeping too little of the feed is more likely broken than a real cleanup
+        if seen < active_before * settings.threat_feeds_min_update_ratio:
+            raise Exception(
+                f"Feed update kept {seen} of {active_before} active indicators, below the minimum ratio; "
+                "keeping the previous indicators"
+            )
+        
+        removed = conn.execute('''
+            UPDATE indicators SET status = 'expired', expired_at = ?
+            WHERE feed_id = ? AND status = 'active' AND last_seen < ?
+        ''', (now, feed_id, now)).rowcount
+        # Indicators that were active before and still are
+        unchanged = active_before - removed
+        added = seen - unchanged
+        
+        fingerprint = fingerprint or {}
+        conn.execute('''
+            UPDATE feeds 
+            SET last_update = ?, record_count = ?, status = 'active',
+                etag = ?, last_modified = ?, content_hash = ?
+            WHERE id = ?
+        ''', (
+            now, seen, fingerprint.get('etag'), fingerprint.get('last_modified'),
+            fingerprint.get('content_hash'), feed_id
+        ))
+        
+        self._bump_generation(conn)
+        generation = self._generation(conn)
+        conn.commit()
+        self._publish_changes(conn, generation, feed_id, now)
+        
+        return {
+            "seen": seen,
+            "added": added,
+            "removed": removed,
+            "unchanged": unchanged,
+            "updated_at": now
+        }
+    
+    def _bulk_upsert_indicators(
+        self,
+        conn: sqlite3.Connection,
+        feed_id: str,
+        indicators: Iterable[Dict[str, Any]],
+        now: str
+    ):
+        """
+        Upsert a feed's indicators with batched executemany calls
+        
+        Once a load grows very large the secondary lookup indexes are dropped and
+        rebuilt once at the end, which is much cheaper than maintaining them row by row.
+        """
+        rows = (
+            (
+                feed_id,
+                indicator.get('type', 'unknown'),
+                indicator['value'],
+                indicator.get('confidence', 50),
+                indicator.get('threat_level', 'medium'),
+                indicator.get('description', ''),
+                json.dumps(indicator['tags']) if indicator.get('tags') else '[]',
+                indicator.get('first_seen', now),
+                now,
+                *self._range_bounds(indicator)
+            )
+            for indicator in indicators
+        )
+        
+        batch_size = settings.threat_feeds_insert_batch_size
+        loaded = 0
+        defer_indexes = False
+        
+        while True:
+            # The batch streams straight from the feed; every row inserts or updates one indicator
+            batch_rows = conn.executemany('''
+                INSERT INTO indicators
+                (feed_id, ioc_type, value, confidence, threat_level, description, tags, first_seen, last_seen,
+                 range_start, range_end)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (feed_id, ioc_type, value) DO UPDATE SET
+                    confidence = excluded.confidence,
+                    threat_level = excluded.threat_level,
+                    description = excluded.description,
+                    tags = excluded.tags,
+                    last_seen = excluded.last_seen,
+                    status = 'active',
+                    expired_at = NULL
+            ''', islice(rows, batch_size)).rowcount
+            if batch_rows < batch_size:
+                break
+            
+            loaded += batch_rows
+            if not defer_indexes and loaded >= settings.threat_feeds_bulk_index_threshold:
+                defer_indexes = True
+                for index_name in INDICATOR_INDEXES:
+                    conn.execute(f'DROP INDEX IF EXISTS {index_name}')
+        
+        if defer_indexes:
+            for create_index in INDICATOR_INDEXES.values():
+                conn.execute(create_index)
+    
+    def _range_bounds(self, indicator: Dict[str, Any]) -> Tuple[Optional[bytes], Optional[bytes]]:
+        """Get the stored bounds of a CIDR or IP-range indicator, or (None, None) for any other"""
+        if indicator.get('type') != RANGE_TYPE:
+            return None, None
+        
+        parsed = parse_ip_range(indicator['value'])
+        if parsed is None:
+            return None, None
+        return key_to_bytes(parsed[1]), key_to_bytes(parsed[2])
+    
+    def _widen_range_span(self, conn: sqlite3.Connection, bounds: Iterable[Tuple[bytes, bytes]]):
+        """
+        Record the bit length of the widest range stored, which bounds how far
+        below an address the start of a range containing it can be
+        
+        The recorded width only grows, so it stays an upper bound as ranges expire.
+        """
+        span_bits = max(
+            ((int.from_bytes(end, 'big') - int.from_bytes(start, 'big')).bit_length() for start, end in bounds),
+            default=0
+        )
+        conn.execute('''
+            INSERT INTO feed_state (name, value) VALUES ('range_span_bits', ?)
+            ON CONFLICT (name) DO UPDATE SET value = MAX(value, excluded.value)
+        ''', (span_bits,))
+    
+    async def _download_feed(
+        self,
+        url: str,
+        auth_token: str = None,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Stream a threat intelligence feed to a spool file with a conditional request
+        
+        The body is hashed as it arrives, so only one chunk is held in memory.
+        Compressed feeds are spooled as published and decompressed while parsing.
+        
+        Returns:
+            Dictionary with path, content_hash, etag and last_modified, or None if
+            the server answered 304 Not Modified; the caller removes the file
+        """
         headers = {}
         if auth_token:
             headers['Authorization'] = f'Bearer {auth_token}'
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
         
         async with aiohttp.ClientSession() as session:
             async with session.get(url, headers=headers) as response:
+                if response.status == 304:
+                    return None
                 if response.status != 200:
                     raise Exception(f"Failed to download feed: HTTP {response.status}")
                 
-                content = await response.text()
+                content_hash = hashlib.sha256()
+                fd, path = tempfile.mkstemp(prefix="feed-", dir=settings.threat_feeds_spool_dir)
                 
-                if format_type.lower() == 'json':
-                    return self._parse_json_feed(content)
-                elif format_type.lower() == 'csv':
-                    return self._parse_csv_feed(content)
-                elif format_type.lower() == 'xml':
-                    return self._parse_xml_feed(content)
-                elif format_type.lower() == 'stix':
-                    return self._parse_stix_feed(content)
-                else:
-                    raise Exception(f"Unsupported feed format: {format_type}")
+                def consume(spool, chunk: bytes):
+                    content_hash.update(chunk)
+                    spool.write(chunk)
+                
+                try:
+                    with os.fdopen(fd, 'wb') as spool:
+                        async for chunk in response.content.iter_chunked(settings.threat_feeds_chunk_size):
+                            await self._throttle(len(chunk))
+                            await asyncio.to_thread(consume, spool, chunk)
+                except BaseException:
+                    os.remove(path)
+                    raise
+                
+                return {
+                    "path": path,
+                    "content_hash": content_hash.hexdigest(),
+                    "etag": response.headers.get('ETag'),
+                    "last_modified": response.headers.get('Last-Modified')
+                }
     
-    def _parse_json_feed(self, content: str) -> List[Dict[str, Any]]:
+    async def _throttle(self, size: int):
+        """Pace downloads so all feeds together stay under the bandwidth cap"""
+        if not self.max_bandwidth:
+            return
+        
+        # Reserve the time this chunk takes at the capped rate, allowing one second of burst
+        now = time.monotonic()
+        self._bandwidth_free_at = max(self._bandwidth_free_at, now) + size / self.max_bandwidth
+        delay = self._bandwidth_free_at - now - 1.0
+        if delay > 0:
+            await asyncio.sleep(delay)
+    
+    def _iter_feed_file(self, path: str, format_type: str) -> Iterator[Dict[str, Any]]:
+        """Stream normalized indicators from a spooled feed file, decompressing it if needed"""
+        with open_feed_file(path) as stream:
+            yield from self._iter_feed(stream, format_type)
+    
+    def _iter_feed(self, stream: BinaryIO, format_type: str) -> Iterator[Dict[str, Any]]:
+        """Stream normalized indicators from feed content according to its format"""
+        if format_type.lower() == 'json':
+            return self._iter_json_feed(stream)
+        elif format_type.lower() == 'csv':
+            return self._iter_csv_feed(stream)
+        elif format_type.lower() == 'xml':
+            return self._iter_xml_feed(stream)
+        elif format_type.lower() == 'stix':
+            return self._iter_stix_feed(stream)
+        else:
+            raise Exception(f"Unsupported feed format: {format_type}")
+    
+    def _iter_json_feed(self, stream: BinaryIO) -> Iterator[Dict[str, Any]]:
         """Parse JSON format threat feed"""
         try:
-            data = json.loads(content)
-            indicators = []
-            
-            # Handle different JSON structures
-            if isinstance(data, list):
-                # Direct list of indicators
-                for item in data:
-                    indicator = self._normalize_indicator(item)
-                    if indicator:
-                        indicators.append(indicator)
-            elif isinstance(data, dict):
-                # Check for common field names
-                for key in ['indicators', 'iocs', 'threats', 'data']:
-                    if key in data and isinstance(data[key], list):
-                        for item in data[key]:
-                            indicator = self._normalize_indicator(item)
-                            if indicator:
-                                indicators.append(indicator)
-                        break
-            
-            return indicators
-            
-        except json.JSONDecodeError as e:
+            # Either a list of indicators or an object holding one under a common field name
+            for item in iter_json_records(stream, ['indicators', 'iocs', 'threats', 'data']):
+                indicator = self._normalize_indicator(item)
+                if indicator:
+                    yield indicator
+        except ValueError as e:
             raise Exception(f"Invalid JSON format: {e}")
     
-    def _parse_csv_feed(self, content: str) -> List[Dict[str, Any]]:
+    def _iter_csv_feed(self, stream: BinaryIO) -> Iterator[Dict[str, Any]]:
         """Parse CSV format threat feed"""
-        indicators = []
-        lines = content.strip().split('\n')
-        
-        if not lines:
-            return indicators
-        
-        # Try to detect CSV format
-        reader = csv.DictReader(lines)
-        
-        for row in reader:
+        for row in iter_csv_records(stream):
             indicator = self._normalize_indicator(row)
             if indicator:
-                indicators.append(indicator)
-        
-        return indicators
+                yield indicator
     
-    def _parse_xml_feed(self, content: str) -> List[Dict[str, Any]]:
+    def _iter_xml_feed(self, stream: BinaryIO) -> Iterator[Dict[str, Any]]:
         """Parse XML format threat feed"""
-        indicators = []
-        
         try:
-            root = ET.fromstring(content)
-            
-            # Handle common XML structures
-            for item in root.findall('.//indicator') or root.findall('.//ioc') or root.findall('.//threat'):
-                indicator_data = {}
-                for child in item:
-                    indicator_data[child.tag] = child.text
-                
+            for indicator_data in iter_xml_records(stream):
                 indicator = self._normalize_indicator(indicator_data)
                 if indicator:
-                    indicators.append(indicator)
-            
-            return indicators
-            
+                    yield indicator
         except ET.ParseError as e:
             raise Exception(f"Invalid XML format: {e}")
     
-    def _parse_stix_feed(self, content: str) -> List[Dict[str, Any]]:
+    def _iter_stix_feed(self, stream: BinaryIO) -> Iterator[Dict[str, Any]]:
         """Parse STIX format threat feed"""
         # Basic STIX parsing - in production you'd use a proper STIX library
         try:
-            data = json.loads(content)
-            indicators = []
-            
-            if 'objects' in data:
-                for obj in data['objects']:
-                    if obj.get('type') == 'indicator':
-                        pattern = obj.get('pattern', '')
-                        # Extract IOC from STIX pattern
-                        if 'file:hashes.MD5' in pattern:
-                            value = pattern.split("'")[1]
-                            indicators.append({
-                                'value': value,
-                                'type': 'hash_md5',
-                                'confidence': 75,
-                                'threat_level': 'medium',
-                                'description': obj.get('name', ''),
-                                'tags': obj.get('labels', [])
-                            })
-                        elif 'domain-name:value' in pattern:
-                            value = pattern.split("'")[1]
-                            indicators.append({
-                                'value': value,
-                                'type': 'domain',
-                                'confidence': 75,
-                                'threat_level': 'medium',
-                                'description': obj.get('name', ''),
-                                'tags': obj.get('labels', [])
-                            })
-            
-            return indicators
-            
-        except json.JSONDecodeError as e:
+            for obj in iter_json_records(stream, ['objects']):
+                if obj.get('type') != 'indicator':
+                    continue
+                
+                pattern = obj.get('pattern', '')
+                # Extract IOC from STIX pattern
+                if 'file:hashes.MD5' in pattern:
+                    ioc_type = 'hash_md5'
+                elif 'domain-name:value' in pattern:
+                    ioc_type = 'domain'
+                else:
+                    continue
+                
+                value = pattern.split("'")[1]
+                yield {
+                    'value': value.lower() if ioc_type == 'hash_md5' else value,
+                    'type': ioc_type,
+                    'confidence': 75,
+                    'threat_level': 'medium',
+                    'description': obj.get('name', ''),
+                    'tags': obj.get('labels', [])
+                }
+        except ValueError as e:
             raise Exception(f"Invalid STIX format: {e}")
     
     def _normalize_indicator(self, raw_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -318,33 +985,35 @@ class ThreatFeedService:
         value = None
         ioc_type = None
         
-        # Common field names for IOC values
-        value_fields = ['value', 'indicator', 'ioc', 'observable', 'artifact', 'domain', 'ip', 'hash', 'url']
-        for field in value_fields:
-            if field in raw_data and raw_data[field]:
-                value = str(raw_data[field]).strip()
+        for field in VALUE_FIELDS:
+            field_value = raw_data.get(field)
+            if field_value:
+                value = str(field_value).strip()
                 break
         
         if not value:
             return None
         
-        # Determine IOC type based on value format
+        # Determine IOC type based on value format; URLs, emails and digests never
+        # parse as addresses, so the costlier IP parsing only runs once they are ruled out
         if value.count('.') == 3 and all(part.isdigit() and 0 <= int(part) <= 255 for part in value.split('.')):
             ioc_type = 'ip_address'
         elif value.startswith('http://') or value.startswith('https://'):
             ioc_type = 'url'
         elif '@' in value and '.' in value:
             ioc_type = 'email'
-        elif len(value) == 32 and all(c in '0123456789abcdef' for c in value.lower()):
-            ioc_type = 'hash_md5'
-        elif len(value) == 40 and all(c in '0123456789abcdef' for c in value.lower()):
-            ioc_type = 'hash_sha1'
-        elif len(value) == 64 and all(c in '0123456789abcdef' for c in value.lower()):
-            ioc_type = 'hash_sha256'
-        elif '.' in value and not value.startswith('http'):
-            ioc_type = 'domain'
+        elif len(value) in HASH_LENGTHS and HEX_DIGEST.fullmatch(value):
+            # Stored in lower case so database matches agree with the case-blind index
+            ioc_type, value = HASH_LENGTHS[len(value)], value.lower()
         else:
-            ioc_type = 'unknown'
+            ip = classify_ip(value)
+            if ip:
+                # CIDR blocks, address ranges and IPv6 addresses, stored in normalized form
+                ioc_type, value = ip
+            elif '.' in value and not value.startswith('http'):
+                ioc_type = 'domain'
+            else:
+                ioc_type = 'unknown'
         
         # Extract other fields
         confidence = raw_data.get('confidence', raw_data.get('score', 50))
@@ -372,35 +1041,81 @@ class ThreatFeedService:
             'tags': tags
         }
     
-    async def search_indicators(self, ioc_value: str, ioc_type: str = None) -> List[Dict[str, Any]]:
-        """Search for indicators in the local threat feed database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def _canonical_value(self, ioc_value: str) -> str:
+        """Bring IP-based and digest lookup values into the normalized form indicators are stored in"""
+        if len(ioc_value) in HASH_LENGTHS and HEX_DIGEST.fullmatch(ioc_value):
+            return ioc_value.lower()
+        ip = classify_ip(ioc_value)
+        return ip[1] if ip else ioc_value
+    
+    def _match_clause(self, conn: sqlite3.Connection, ioc_value: str, ioc_type: Optional[str]) -> Tuple[str, List[Any]]:
+        """
+        Build the WHERE condition matching an indicator value on the indicators table aliased i
         
-        if ioc_type:
-            cursor.execute('''
-                SELECT i.*, f.name as feed_name 
-                FROM indicators i
-                JOIN feeds f ON i.feed_id = f.id
-                WHERE i.value = ? AND i.ioc_type = ?
-            ''', (ioc_value, ioc_type))
+        An address also matches the CIDR and IP-range indicators containing it.
+        Their starts are searched no further below the address than the widest
+        range stored, so the range index is not scanned from the lowest key.
+        
+        Returns:
+            (condition, parameters)
+        """
+        key = ip_to_key(ioc_value)
+        if key is None:
+            clause, params = 'i.value = ?', [ioc_value]
         else:
-            cursor.execute('''
-                SELECT i.*, f.name as feed_name 
+            row = conn.execute("SELECT value FROM feed_state WHERE name = 'range_span_bits'").fetchone()
+            lowest = max(key - (1 << (row[0] if row else 128)) + 1, 0)
+            bound = key_to_bytes(key)
+            clause = '(i.value = ? OR (i.range_start BETWEEN ? AND ? AND i.range_end >= ?))'
+            params = [ioc_value, key_to_bytes(lowest), bound, bound]
+        
+        if ioc_type == 'ip_address' and key is not None:
+            clause += f" AND i.ioc_type IN ('ip_address', '{RANGE_TYPE}')"
+        elif ioc_type:
+            clause += ' AND i.ioc_type = ?'
+            params.append(ioc_type)
+        
+        return clause, params
+    
+    async def search_indicators(
+        self,
+        ioc_value: str,
+        ioc_type: str = None,
+        include_expired: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Search for indicators in the local threat feed database"""
+        ioc_value = self._canonical_value(ioc_value)
+        
+        # Indicators the filters or the index rule out cannot be active in any feed
+        if not include_expired:
+            if not self.filters.might_contain(ioc_value, ioc_type):
+                return []
+            if self.index.loaded and not self.index.lookup(ioc_value, ioc_type):
+                return []
+        
+        def search(conn):
+            match, params = self._match_clause(conn, ioc_value, ioc_type)
+            query = f'''
+                SELECT i.id, i.feed_id, i.ioc_type, i.value, i.confidence, i.threat_level, i.description,
+                       i.tags, i.first_seen, i.last_seen, i.status, i.expired_at, f.name as feed_name
                 FROM indicators i
                 JOIN feeds f ON i.feed_id = f.id
-                WHERE i.value = ?
-            ''', (ioc_value,))
+                WHERE {match}
+            '''
+            
+            if not include_expired:
+                query += " AND i.status = 'active'"
+            
+            return conn.execute(query, params).fetchall()
         
-        results = cursor.fetchall()
-        conn.close()
+        results = await self._read(search)
         
         indicators = []
         for row in results:
             indicators.append({
                 'id': row[0],
                 'feed_id': row[1],
-                'feed_name': row[11],
+                'feed_name': row[12],
                 'ioc_type': row[2],
                 'value': row[3],
                 'confidence': row[4],
@@ -408,56 +1123,82 @@ class ThreatFeedService:
                 'description': row[6],
                 'tags': json.loads(row[7]) if row[7] else [],
                 'first_seen': row[8],
-                'last_seen': row[9]
+                'last_seen': row[9],
+                'status': row[10],
+                'expired_at': row[11]
             })
         
         return indicators
     
-    async def get_feed_stats(self) -> Dict[str, Any]:
-        """Get threat feed statistics"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Get feed counts
-        cursor.execute('SELECT COUNT(*) FROM feeds')
-        total_feeds = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM feeds WHERE status = "active"')
-        active_feeds = cursor.fetchone()[0]
+    async def lookup_indicator(self, ioc_value: str, ioc_type: str = None) -> List[Dict[str, str]]:
+        """Find the feeds actively listing an indicator, from memory once the index is loaded"""
+        ioc_value = self._canonical_value(ioc_value)
+        if not self.filters.might_contain(ioc_value, ioc_type):
+            return []
         
-        cursor.execute('SELECT COUNT(*) FROM indicators')
-        total_indicators = cursor.fetchone()[0]
+        if self.index.loaded:
+            return self.index.lookup(ioc_value, ioc_type)
         
-        # Get indicators by type
-        cursor.execute('''
-            SELECT ioc_type, COUNT(*) 
-            FROM indicators 
-            GROUP BY ioc_type
-        ''')
-        indicators_by_type = dict(cursor.fetchall())
+        def lookup(conn):
+            match, params = self._match_clause(conn, ioc_value, ioc_type)
+            query = f"SELECT DISTINCT i.feed_id, i.ioc_type FROM indicators i WHERE {match} AND i.status = 'active'"
+            return conn.execute(query, params).fetchall()
         
-        # Get most recent update
-        cursor.execute('SELECT MAX(last_update) FROM feeds')
-        last_update = cursor.fetchone()[0]
+        rows = await self._read(lookup)
+        return [{'feed_id': feed_id, 'ioc_type': row_type} for feed_id, row_type in rows]
+    
+    async def get_feed_stats(self) -> Dict[str, Any]:
+        """Get threat feed statistics"""
+        def query(conn):
+            cursor = conn.cursor()
+            
+            # Get feed counts
+            cursor.execute('SELECT COUNT(*) FROM feeds')
+            total_feeds = cursor.fetchone()[0]
+            
+            cursor.execute('SELECT COUNT(*) FROM feeds WHERE status = "active"')
+            active_feeds = cursor.fetchone()[0]
+            
+            cursor.execute("SELECT COUNT(*) FROM indicators WHERE status = 'active'")
+            total_indicators = cursor.fetchone()[0]
+            
+            cursor.execute("SELECT COUNT(*) FROM indicators WHERE status = 'expired'")
+            expired_indicators = cursor.fetchone()[0]
+            
+            # Get indicators by type
+            cursor.execute('''
+                SELECT ioc_type, COUNT(*) 
+                FROM indicators 
+                WHERE status = 'active'
+                GROUP BY ioc_type
+            ''')
+            indicators_by_type = dict(cursor.fetchall())
+            
+            # Get most recent update
+            cursor.execute('SELECT MAX(last_update) FROM feeds')
+            last_update = cursor.fetchone()[0]
+            
+            return total_feeds, active_feeds, total_indicators, expired_indicators, indicators_by_type, last_update
         
-        conn.close()
+        (total_feeds, active_feeds, total_indicators, expired_indicators,
+         indicators_by_type, last_update) = await self._read(query)
         
         return {
             'total_feeds': total_feeds,
             'active_feeds': active_feeds,
             'total_indicators': total_indicators,
+            'expired_indicators': expired_indicators,
             'indicators_by_type': indicators_by_type,
-            'last_update': last_update
+            'last_update': last_update,
+            'index': self.index.get_stats(),
+            'filters': self.filters.get_stats()
         }
     
     async def list_feeds(self) -> List[Dict[str, Any]]:
         """List all configured threat feeds"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM feeds ORDER BY created_at DESC')
-        results = cursor.fetchall()
-        conn.close()
+        results = await self._read(
+            lambda conn: conn.execute('SELECT * FROM feeds ORDER BY created_at DESC').fetchall()
+        )
         
         feeds = []
         for row in results:
@@ -479,20 +1220,31 @@ class ThreatFeedService:
     async def delete_feed(self, feed_id: str) -> Dict[str, Any]:
         """Delete a threat intelligence feed"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Delete indicators first
-            cursor.execute('DELETE FROM indicators WHERE feed_id = ?', (feed_id,))
-            
-            # Delete feed
-            cursor.execute('DELETE FROM feeds WHERE id = ?', (feed_id,))
+            def delete(conn):
+                cursor = conn.cursor()
+                conn.execute('BEGIN IMMEDIATE')
+                
+                # Delete indicators first
+                cursor.execute('DELETE FROM indicators WHERE feed_id = ?', (feed_id,))
+                
+                # Delete feed
+                cursor.execute('DELETE FROM feeds WHERE id = ?', (feed_id,))
+                
+                if cursor.rowcount == 0:
+                    conn.rollback()
+                    return False
+                
+                self._bump_generation(conn)
+                generation = self._generation(conn)
+                conn.commit()
+                self._publish_changes(conn, generation)
+                self._refresh_index(conn)
+                return True
             
-            if cursor.rowcount == 0:
+            if not await self._write(delete):
                 return {"error": "Feed not found", "status": "not_found"}
             
-            conn.commit()
-            conn.close()
+            self._remove_update_lock(feed_id)
             
             return {
                 "feed_id": feed_id,
@@ -508,19 +1260,76 @@ class ThreatFeedService:
     
     async def update_all_feeds(self) -> Dict[str, Any]:
         """Update all active threat intelligence feeds"""
-        feeds = await self.list_feeds()
-        results = []
-        
-        for feed in feeds:
-            if feed['status'] == 'active':
-                result = await self.update_feed(feed['id'])
-                results.append({
-                    'feed_id': feed['id'],
-                    'name': feed['name'],
-                    'result': result
-                })
+        feeds = [feed for feed in await self.list_feeds() if feed['status'] == 'active']
+        
+        # Downloads overlap under the download cap; their writes queue on the writer thread
+        updates = await asyncio.gather(*(self.update_feed(feed['id']) for feed in feeds))
+        results = [
+            {
+                'feed_id': feed['id'],
+                'name': feed['name'],
+                'result': result
+            }
+            for feed, result in zip(feeds, updates)
+        ]
         
         return {
             'updated_feeds': len(results),
             'results': results
         }
+    
+    async def _schedule_loop(self):
+        """Start updates for due feeds every poll_interval while this worker holds the scheduler lock"""
+        while True:
+            try:
+                if self._scheduler_lock.locked or self._scheduler_lock.acquire(blocking=False):
+                    await self._start_due_updates()
+                else:
+                    # Another worker schedules updates; only pick up what it commits
+                    self._next_update.clear()
+                    self.filters.refresh()
+            except Exception as e:
+                print(f"Feed scheduler failed: {e}")
+            
+            await asyncio.sleep(self.poll_interval)
+    
+    async def _start_due_updates(self):
+        """Start a background update for every feed whose update interval has elapsed"""
+        rows = await self._read(
+            lambda conn: conn.execute('SELECT id, update_interval, last_update FROM feeds').fetchall()
+        )
+        now = datetime.utcnow()
+        
+        for feed_id in set(self._next_update) - {row[0] for row in rows}:
+            del self._next_update[feed_id]
+        
+        for feed_id, interval, last_update in rows:
+            if feed_id in self._updates:
+                continue
+            
+            if feed_id not in self._next_update:
+                # Feeds never fetched are due now; others resume from their last update
+                if last_update:
+                    self._next_update[feed_id] = self._schedule_after(datetime.fromisoformat(last_update), interval)
+                else:
+                    self._next_update[feed_id] = now
+            
+            if self._next_update[feed_id] <= now:
+                task = asyncio.create_task(self._scheduled_update(feed_id, interval))
+                self._updates[feed_id] = task
+                task.add_done_callback(lambda _, feed_id=feed_id: self._updates.pop(feed_id, None))
+    
+    async def _scheduled_update(self, feed_id: str, interval: int):
+        """Update a feed and schedule its next refresh"""
+        result = await self.update_feed(feed_id)
+        
+        # A failed fetch is retried sooner than a full interval
+        if result.get('status') == 'failed':
+            interval = min(interval, settings.threat_feeds_retry_delay)
+        
+        self._next_update[feed_id] = self._schedule_after(datetime.utcnow(), interval)
+    
+    def _schedule_after(self, start: datetime, interval: int) -> datetime:
+        """Get the next update time, jittered so feeds with equal intervals drift apart"""
+        jitter = random.uniform(0, interval * settings.threat_feeds_update_jitter)
+        return start + timedelta(seconds=interval + jitter)
@@ -2,15 +2,49 @@ import httpx
 import asyncio
 from typing import Dict, Any, Optional, List
 from app.core.config import settings
+from app.services.rate_limiter import RateLimitManager, parse_retry_after
+from app.services.cache import ResponseCache, create_response_cache
 import os
 from datetime import datetime
 
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+def create_http_client() -> httpx.AsyncClient:
+    """Create a pooled HTTP client with keep-alive connections to the threat intel APIs"""
+    limits = httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry
+    )
+    
+    return httpx.AsyncClient(
+        timeout=settings.http_timeout,
+        limits=limits,
+        http2=settings.http2_enabled and HTTP2_AVAILABLE
+    )
+
 class ThreatIntelService:
     """Service for querying various threat intelligence APIs"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        client: Optional[httpx.AsyncClient] = None,
+        rate_limiter: Optional[RateLimitManager] = None,
+        cache: Optional[ResponseCache] = None
+    ):
         self.api_keys = self._load_api_keys()
-        self.client = httpx.AsyncClient(timeout=30.0)
+        # A single service (and its connection pool) is meant to be shared
+        # across requests, so lookups reuse warm TCP/TLS connections
+        self.client = client or create_http_client()
+        self.rate_limiter = rate_limiter or RateLimitManager(
+            settings.provider_rate_limits, settings.rate_limit_per_minute
+        )
+        self.max_retries = settings.rate_limit_max_retries
+        self.cache = cache if cache is not None else create_response_cache()
     
     def _load_api_keys(self) -> Dict[str, str]:
         """Load API keys from environment variables"""
@@ -38,6 +72,27 @@ class ThreatIntelService:
         
         return keys
     
+    async def _get(self, provider: str, endpoint: str, **kwargs) -> httpx.Response:
+        """
+        Send a GET request through the provider's rate limiter
+        
+        Requests wait for a token instead of failing; a 429 response pauses the
+        provider for the Retry-After period and the request is retried.
+        """
+        limiter = self.rate_limiter.get(provider)
+        
+        for attempt in range(self.max_retries + 1):
+            async with limiter.slot():
+                response = await self.client.get(endpoint, **kwargs)
+            
+            if response.status_code != 429 or attempt == self.max_retries:
+                return response
+            
+            default_delay = 60.0 / limiter.requests_per_minute
+            limiter.defer(parse_retry_after(response.headers.get("Retry-After"), default_delay))
+        
+        return response
+    
     async def analyze_ioc(self, indicator: str, ioc_type: str) -> Dict[str, Any]:
         """
         Analyze an IOC using available threat intelligence services
@@ -61,16 +116,16 @@ class ThreatIntelService:
         tasks = []
         
         if "virustotal" in self.api_keys:
-            tasks.append(self._query_virustotal(indicator, ioc_type))
+            tasks.append(self._cached_query("virustotal", self._query_virustotal, indicator, ioc_type))
         
         if "abuseipdb" in self.api_keys and ioc_type in ["ip_address", "domain"]:
-            tasks.append(self._query_abuseipdb(indicator, ioc_type))
+            tasks.append(self._cached_query("abuseipdb", self._query_abuseipdb, indicator, ioc_type))
         
         if "urlscan" in self.api_keys and ioc_type in ["url", "domain"]:
-            tasks.append(self._query_urlscan(indicator, ioc_type))
+            tasks.append(self._cached_query("urlscan", self._query_urlscan, indicator, ioc_type))
         
         if "otx" in self.api_keys:
-            tasks.append(self._query_otx(indicator, ioc_type))
+            tasks.append(self._cached_query("otx", self._query_otx, indicator, ioc_type))
         
         # Execute all queries concurrently
         if tasks:
@@ -88,6 +143,21 @@ class ThreatIntelService:
         results["services_queried"] = list(results["results"].keys())
         return results
     
+    async def _cached_query(self, provider: str, query, indicator: str, ioc_type: str) -> Dict[str, Any]:
+        """Serve a provider result from the response cache, querying the provider on a miss"""
+        if self.cache is None:
+            return await query(indicator, ioc_type)
+        
+        cached = await self.cache.get(provider, ioc_type, indicator)
+        if cached is not None:
+            return {provider: {**cached, "cached": True}}
+        
+        result = await query(indicator, ioc_type)
+        if provider in result:
+            await self.cache.set(provider, ioc_type, indicator, result[provider])
+        
+        return result
+    
     async def _query_virustotal(self, indicator: str, ioc_type: str) -> Dict[str, Any]:
         """Query VirusTotal API"""
         try:
@@ -109,7 +179,7 @@ class ThreatIntelService:
             else:
                 return {"virustotal": {"error": f"Unsupported IOC type: {ioc_type}"}}
             
-            response = await self.client.get(endpoint, params=params)
+            response = await self._get("virustotal", endpoint, params=params)
             response.raise_for_status()
             
             data = response.json()
@@ -147,7 +217,7 @@ class ThreatIntelService:
                 params = {"ipAddress": indicator, "maxAgeInDays": "90"}
                 headers = {"Key": api_key, "Accept": "application/json"}
                 
-                response = await self.client.get(endpoint, params=params, headers=headers)
+                response = await self._get("abuseipdb", endpoint, params=params, headers=headers)
                 response.raise_for_status()
                 
                 data = response.json()
@@ -175,7 +245,7 @@ class ThreatIntelService:
                 params = {"network": indicator, "maxAgeInDays": "90"}
                 headers = {"Key": api_key, "Accept": "application/json"}
                 
-                response = await self.client.get(endpoint, params=params, headers=headers)
+                response = await self._get("abuseipdb", endpoint, params=params, headers=headers)
                 response.raise_for_status()
                 
                 data = response.json()
@@ -212,7 +282,7 @@ class ThreatIntelService:
                 else:
                     headers = {}
                 
-                response = await self.client.get(endpoint, params=params, headers=headers)
+                response = await self._get("urlscan", endpoint, params=params, headers=headers)
                 response.raise_for_status()
                 
                 data = response.json()
@@ -240,7 +310,7 @@ class ThreatIntelService:
                 else:
                     headers = {}
                 
-                response = await self.client.get(endpoint, params=params, headers=headers)
+                response = await self._get("urlscan", endpoint, params=params, headers=headers)
                 response.raise_for_status()
                 
                 data = response.json()
@@ -282,7 +352,7 @@ class ThreatIntelService:
                 return {"otx": {"error": f"Unsupported IOC type: {ioc_type}"}}
             
             headers = {"X-OTX-API-KEY": api_key}
-            response = await self.client.get(endpoint, headers=headers)
+            response = await self._get("otx", endpoint, headers=headers)
             response.raise_for_status()
             
             data = response.json()
@@ -306,5 +376,7 @@ class ThreatIntelService:
             return {"otx": {"error": str(e), "status": "failed"}}
     
     async def close(self):
-        """Close the HTTP client"""
+        """Close the HTTP client and response cache"""
         await self.client.aclose()
+        if self.cache is not None:
+            await self.cache.close()
@@ -16,6 +16,19 @@ class IOCAnalyzerCLI:
     def __init__(self):
         self.ioc_parser = IOCParser()
         self.analysis_engine = AnalysisEngine()
+        self.threat_intel_service = None
+    
+    def _get_threat_intel_service(self) -> ThreatIntelService:
+        """Return the shared threat intelligence service, creating it on first use"""
+        if self.threat_intel_service is None:
+            self.threat_intel_service = ThreatIntelService()
+        return self.threat_intel_service
+    
+    async def close(self):
+        """Close the shared threat intelligence service"""
+        if self.threat_intel_service is not None:
+            await self.threat_intel_service.close()
+            self.threat_intel_service = None
     
     async def analyze_ioc(self, indicator: str, description: str = None) -> dict:
         """Analyze a single IOC"""
@@ -39,7 +52,7 @@ class IOCAnalyzerCLI:
         
         # Perform threat intelligence analysis
         print("🌐 Querying threat intelligence services...")
-        threat_intel_service = ThreatIntelService()
+        threat_intel_service = self._get_threat_intel_service()
         
         try:
             # Check available API keys
@@ -72,9 +85,6 @@ class IOCAnalyzerCLI:
         except Exception as e:
             print(f"❌ Analysis failed: {str(e)}")
             return None
-        
-        finally:
-            await threat_intel_service.close()
     
     def _display_results(self, analysis_results: dict, threat_intel_results: dict):
         """Display analysis results in a formatted way"""
@@ -184,6 +194,13 @@ class IOCAnalyzerCLI:
         
         return results, failed
 
+async def run_cli(cli: IOCAnalyzerCLI, coro):
+    """Run a CLI coroutine and release the shared HTTP connection pool afterwards"""
+    try:
+        return await coro
+    finally:
+        await cli.close()
+
 def main():
     """Main CLI function"""
     if len(sys.argv) < 2:
@@ -204,12 +221,12 @@ def main():
             sys.exit(1)
         
         indicators = sys.argv[2:]
-        asyncio.run(cli.analyze_batch(indicators))
+        asyncio.run(run_cli(cli, cli.analyze_batch(indicators)))
     else:
         indicator = sys.argv[1]
         description = sys.argv[2] if len(sys.argv) > 2 else None
         
-        asyncio.run(cli.analyze_ioc(indicator, description))
+        asyncio.run(run_cli(cli, cli.analyze_ioc(indicator, description)))
 
 if __name__ == "__main__":
     main()
@@ -1,17 +1,52 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
 import uvicorn
-from app.api.routes import ioc_router
+from app.api.routes import ioc_router, analysis_cache, analysis_engine
 from app.api.auth_routes import auth_router
 from app.core.config import settings
+from app.services.threat_intel import ThreatIntelService
+from app.services.analysis_service import AnalysisService
+from app.services.job_service import BatchJobService
+from app.services.analysis_repository import AnalysisRepository
+from app.services.threat_feed_service import ThreatFeedService
+from app.services.sandbox_service import SandboxService
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create application-scoped services on startup and release them on shutdown"""
+    app.state.threat_intel_service = ThreatIntelService()
+    app.state.analysis_repository = AnalysisRepository()
+    await app.state.analysis_repository.start()
+    app.state.analysis_service = AnalysisService(
+        app.state.threat_intel_service,
+        analysis_engine,
+        analysis_cache,
+        app.state.analysis_repository
+    )
+    await app.state.analysis_service.load_stats()
+    app.state.job_service = BatchJobService(app.state.analysis_service)
+    await app.state.job_service.start()
+    app.state.feed_service = ThreatFeedService()
+    await app.state.feed_service.start()
+    app.state.sandbox_service = SandboxService()
+    
+    yield
+    
+    await app.state.sandbox_service.close()
+    await app.state.feed_service.stop()
+    await app.state.job_service.stop()
+    await app.state.analysis_repository.stop()
+    await app.state.threat_intel_service.close()
 
 app = FastAPI(
     title="Threat IOC Analysis Tool",
     description="A unified threat intelligence platform for IOC analysis",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # CORS middleware
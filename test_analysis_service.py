@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Tests for the IOC analysis service (request coalescing, batch execution)
+"""
+
+import asyncio
+import time
+from app.models.ioc import IOCType, IOCStatus
+from app.services.analysis_service import AnalysisService
+from app.services.batch_executor import BatchExecutor
+
+class FakeThreatIntelService:
+    """Threat intel stand-in that counts provider fan-outs"""
+    
+    def __init__(self, delay: float = 0.05, results=None):
+        self.delay = delay
+        self.results = results or {"otx": {"status": "success", "pulse_count": 0, "reputation": 0}}
+        self.calls = 0
+        self.queried = []
+    
+    async def analyze_ioc(self, indicator, ioc_type):
+        self.calls += 1
+        self.queried.append(ioc_type)
+        await asyncio.sleep(self.delay)
+        return {
+            "indicator": indicator,
+            "ioc_type": ioc_type,
+            "results": self.results
+        }
+
+KNOWN_SAMPLE = {"virustotal": {"status": "success", "malicious_count": 40, "total_count": 60}}
+
+def test_concurrent_requests_are_coalesced():
+    """Concurrent lookups of one indicator share a single fan-out and analysis"""
+    async def run():
+        threat_intel = FakeThreatIntelService()
+        service = AnalysisService(threat_intel)
+        analyses = await asyncio.gather(
+            *(service.analyze("example.com", IOCType.DOMAIN) for _ in range(20))
+        )
+        return threat_intel, service, analyses
+    
+    threat_intel, service, analyses = asyncio.run(run())
+    assert threat_intel.calls == 1
+    assert len({analysis.id for analysis in analyses}) == 1
+    assert analyses[0].status == IOCStatus.COMPLETED
+    assert service.flights.get_stats()["coalesced"] == 19
+
+def test_sequential_requests_run_again():
+    """Once a lookup finishes, the next request starts a new one"""
+    async def run():
+        threat_intel = FakeThreatIntelService(delay=0)
+        service = AnalysisService(threat_intel)
+        await service.analyze("example.com", IOCType.DOMAIN)
+        await service.analyze("example.com", IOCType.DOMAIN)
+        return threat_intel
+    
+    assert asyncio.run(run()).calls == 2
+
+def test_batch_dedupes_and_preserves_order():
+    """Batches run concurrently, dedupe indicators and keep input order"""
+    async def run():
+        threat_intel = FakeThreatIntelService(delay=0.05)
+        executor = BatchExecutor(AnalysisService(threat_intel), max_concurrency=10)
+        start = time.monotonic()
+        results, failed = await executor.run(
+            ["8.8.8.8", "EXAMPLE.com", "not an ioc", "example.com", "1.1.1.1"]
+        )
+        return threat_intel, results, failed, time.monotonic() - start
+    
+    threat_intel, results, failed, elapsed = asyncio.run(run())
+    assert threat_intel.calls == 3
+    assert [analysis.indicator for analysis in results] == [
+        "8.8.8.8", "example.com", "example.com", "1.1.1.1"
+    ]
+    assert results[1] is results[2]
+    assert failed == ["not an ioc: Unable to determine IOC type"]
+    assert elapsed < 0.15
+
+def test_stream_yields_every_indicator():
+    """Streaming emits one result per input line, tagged with its position"""
+    async def indicators():
+        for indicator in ["8.8.8.8", "bad input", "example.com", "1.1.1.1"]:
+            yield indicator
+    
+    async def run():
+        executor = BatchExecutor(AnalysisService(FakeThreatIntelService(delay=0.01)), max_concurrency=2)
+        return [result async for result in executor.stream(indicators())]
+    
+    results = asyncio.run(run())
+    by_position = {result["position"]: result for result in results}
+    assert sorted(by_position) == [0, 1, 2, 3]
+    assert by_position[1]["status"] == "failed"
+    assert by_position[2]["analysis"]["indicator"] == "example.com"
+
+def test_stats_follow_status_transitions():
+    """Counters track each analysis through its transitions without rescanning"""
+    async def run():
+        service = AnalysisService(FakeThreatIntelService(delay=0))
+        await service.analyze("example.com", IOCType.DOMAIN)
+        await service.analyze("example.org", IOCType.DOMAIN)
+        service.record("file-1", {"status": "analyzing"})
+        return service.stats.snapshot()
+    
+    stats = asyncio.run(run())
+    assert stats["total_analyses"] == 3
+    assert stats["completed"] == 2
+    assert stats["pending"] == 1
+    assert sum(stats["verdict_distribution"].values()) == 2
+
+def test_file_hash_fallback_stops_at_known_hash():
+    """Weaker hashes are only queried while providers have no record of the sample"""
+    hashes = {IOCType.HASH_SHA256: "ab" * 32, IOCType.HASH_SHA1: "cd" * 20, IOCType.HASH_MD5: "ef" * 16}
+    
+    known = FakeThreatIntelService(delay=0, results=KNOWN_SAMPLE)
+    results = asyncio.run(AnalysisService(known).analyze_file_hashes(hashes, "fallback"))
+    assert known.queried == ["hash_sha256"]
+    assert results[IOCType.HASH_MD5] is None
+    
+    unknown = FakeThreatIntelService(delay=0)
+    asyncio.run(AnalysisService(unknown).analyze_file_hashes(hashes, "fallback"))
+    assert unknown.queried == ["hash_sha256", "hash_sha1", "hash_md5"]
+
+def test_file_hash_concurrent_queries_all_hashes():
+    """The concurrent strategy looks up every hash at once"""
+    hashes = {IOCType.HASH_SHA256: "ab" * 32, IOCType.HASH_SHA1: "cd" * 20, IOCType.HASH_MD5: "ef" * 16}
+    threat_intel = FakeThreatIntelService(delay=0.05, results=KNOWN_SAMPLE)
+    
+    started = time.perf_counter()
+    results = asyncio.run(AnalysisService(threat_intel).analyze_file_hashes(hashes, "concurrent"))
+    elapsed = time.perf_counter() - started
+    
+    assert threat_intel.calls == 3
+    assert all(result.status == IOCStatus.COMPLETED for result in results.values())
+    assert elapsed < 0.15
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Tests for analysis record storage
+"""
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+from app.models.ioc import IOCType
+from app.services.analysis_store import AnalysisStore
+from app.services.analysis_repository import AnalysisRepository
+from app.services.analysis_service import AnalysisService
+from test_analysis_service import FakeThreatIntelService, KNOWN_SAMPLE
+
+def test_lru_eviction():
+    """The least recently used record is evicted when max_entries is exceeded"""
+    store = AnalysisStore(max_entries=2)
+    store.put("a", {"id": "a"})
+    store.put("b", {"id": "b"})
+    store.get("a")
+    store.put("c", {"id": "c"})
+    
+    assert store.get("b") is None
+    assert store.get("a") == {"id": "a"}
+    assert store.get_stats()["evictions"]["lru"] == 1
+
+def test_ttl_eviction():
+    """Expired records are not returned"""
+    store = AnalysisStore(ttl=0.01)
+    store.put("a", {"id": "a"})
+    time.sleep(0.02)
+    
+    assert store.get("a") is None
+    assert store.get_stats()["evictions"]["ttl"] == 1
+
+def test_memory_budget():
+    """Records are evicted to keep the serialized size within max_bytes"""
+    store = AnalysisStore(max_bytes=250)
+    for i in range(10):
+        store.put(str(i), {"payload": "x" * 50})
+    
+    stats = store.get_stats()
+    assert stats["bytes"] <= 250
+    assert stats["evictions"]["memory"] > 0
+    assert store.get("9") is not None
+
+def test_repository_persists_across_restarts():
+    """Analyses written behind are readable by ID and indicator after reopening"""
+    async def run(db_path):
+        repository = AnalysisRepository(db_path, flush_interval=0.01)
+        await repository.start()
+        service = AnalysisService(FakeThreatIntelService(delay=0), repository=repository)
+        analysis = await service.analyze("example.com", IOCType.DOMAIN)
+        service.record("file-1", {"id": "file-1", "status": "completed", "sha256_hash": "ab" * 32})
+        pending = await repository.get(analysis.id)
+        await repository.stop()
+        
+        reopened = AnalysisRepository(db_path)
+        await reopened.start()
+        by_id = await reopened.get(analysis.id)
+        by_indicator = await reopened.find_by_indicator("example.com", "domain", max_age=60)
+        file_record = await reopened.get("file-1")
+        await reopened.stop()
+        return analysis, pending, by_id, by_indicator, file_record
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        analysis, pending, by_id, by_indicator, file_record = asyncio.run(
+            run(os.path.join(tmp, "analyses.db"))
+        )
+    
+    assert pending.id == analysis.id
+    assert by_id.verdict == analysis.verdict
+    assert by_indicator.id == analysis.id
+    assert file_record["sha256_hash"] == "ab" * 32
+
+def test_failed_flush_keeps_records_pending():
+    """Records whose write fails stay readable and are written by the next flush"""
+    async def run(db_path):
+        repository = AnalysisRepository(db_path)
+        await repository.start()
+        repository.save("file-1", {"id": "file-1", "status": "completed", "sha256_hash": "ab" * 32, "md5_hash": "ef" * 16})
+        
+        write_rows = repository._write_rows
+        def busy(rows, aliases):
+            raise sqlite3.OperationalError("database is locked")
+        repository._write_rows = busy
+        try:
+            await repository.flush()
+            assert False, "expected the write to fail"
+        except sqlite3.OperationalError:
+            pass
+        pending = [await repository.get("file-1"), await repository.resolve_sample_hash("ef" * 16)]
+        
+        repository._write_rows = write_rows
+        await repository.flush()
+        stats = repository.get_stats()
+        await repository.stop()
+        
+        reopened = AnalysisRepository(db_path)
+        stored = [await reopened.get("file-1"), await reopened.resolve_sample_hash("ef" * 16)]
+        await reopened.stop()
+        return pending, stats, stored
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        pending, stats, stored = asyncio.run(run(os.path.join(tmp, "analyses.db")))
+    
+    assert pending[0]["id"] == "file-1" and pending[1] == "ab" * 32
+    assert stats["pending_writes"] == 0 and stats["rows_written"] == 1
+    assert stored[0]["id"] == "file-1" and stored[1] == "ab" * 32
+
+def test_repeated_analysis_served_from_storage():
+    """A recent stored analysis of the same indicator is reused instead of re-querying"""
+    async def run(db_path):
+        repository = AnalysisRepository(db_path)
+        await repository.start()
+        threat_intel = FakeThreatIntelService(delay=0)
+        service = AnalysisService(threat_intel, repository=repository)
+        first = await service.analyze("8.8.8.8", IOCType.IP_ADDRESS)
+        await repository.flush()
+        second = await service.analyze("8.8.8.8", IOCType.IP_ADDRESS)
+        await repository.stop()
+        return threat_intel, first, second
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        threat_intel, first, second = asyncio.run(run(os.path.join(tmp, "analyses.db")))
+    
+    assert threat_intel.calls == 1
+    assert first.id == second.id
+
+def test_file_hashes_resolve_to_sample_analysis():
+    """Any hash of an uploaded sample reuses the sample's SHA-256 analysis"""
+    sha256, sha1, md5 = "ab" * 32, "cd" * 20, "ef" * 16
+    
+    async def run(db_path):
+        repository = AnalysisRepository(db_path)
+        await repository.start()
+        threat_intel = FakeThreatIntelService(delay=0, results=KNOWN_SAMPLE)
+        service = AnalysisService(threat_intel, repository=repository)
+        by_sha256 = await service.analyze(sha256, IOCType.HASH_SHA256)
+        service.record("file-1", {
+            "id": "file-1",
+            "status": "completed",
+            "md5_hash": md5,
+            "sha1_hash": sha1,
+            "sha256_hash": sha256,
+            "created_at": by_sha256.created_at
+        })
+        by_md5 = await service.analyze(md5, IOCType.HASH_MD5)
+        await repository.flush()
+        by_sha1 = await service.analyze(sha1, IOCType.HASH_SHA1)
+        sample = await service.find_file_analysis(sha256)
+        await repository.stop()
+        return threat_intel, by_sha256, by_md5, by_sha1, sample
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        threat_intel, by_sha256, by_md5, by_sha1, sample = asyncio.run(run(os.path.join(tmp, "analyses.db")))
+    
+    assert threat_intel.calls == 1
+    assert by_md5.id == by_sha256.id
+    assert by_sha1.id == by_sha256.id
+    assert sample["id"] == "file-1"
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tests for the threat intelligence response cache and its backends
+"""
+
+import asyncio
+import os
+import tempfile
+import httpx
+from app.services.cache import (
+    ResponseCache, MemoryCacheBackend, SQLiteCacheBackend, RedisCacheBackend
+)
+from app.services.rate_limiter import RateLimitManager
+from app.services.threat_intel import ThreatIntelService
+
+class FakeRedis:
+    """Minimal in-memory stand-in for redis.asyncio.Redis"""
+    
+    def __init__(self):
+        self.data = {}
+    
+    async def get(self, key):
+        return self.data.get(key)
+    
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+    
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+def _exercise_backend(backend):
+    async def run():
+        cache = ResponseCache(backend, default_ttl=60)
+        assert await cache.get("otx", "domain", "Example.com") is None
+        await cache.set("otx", "domain", "example.com", {"status": "success", "pulse_count": 3})
+        await cache.set("otx", "domain", "broken.com", {"status": "failed", "error": "timeout"})
+        hit = await cache.get("otx", "domain", "EXAMPLE.com")
+        miss = await cache.get("otx", "domain", "broken.com")
+        return hit, miss, await cache.get_stats()
+    
+    hit, miss, stats = asyncio.run(run())
+    assert hit["pulse_count"] == 3
+    assert miss is None
+    assert stats["hits"] == 1 and stats["misses"] == 2
+
+def test_memory_backend():
+    """Memory backend caches successes and skips failures"""
+    _exercise_backend(MemoryCacheBackend())
+
+def test_sqlite_backend():
+    """SQLite backend caches successes and skips failures"""
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = SQLiteCacheBackend(os.path.join(tmp, "cache.db"))
+        _exercise_backend(backend)
+        asyncio.run(backend.close())
+
+def test_redis_backend():
+    """Redis backend works against any async get/set client"""
+    _exercise_backend(RedisCacheBackend(client=FakeRedis()))
+
+def test_memory_lru_eviction():
+    """The least recently used entry is evicted first"""
+    async def run():
+        backend = MemoryCacheBackend(max_entries=2)
+        await backend.set("a", {"v": 1}, 60)
+        await backend.set("b", {"v": 2}, 60)
+        await backend.get("a")
+        await backend.set("c", {"v": 3}, 60)
+        return await backend.get("a"), await backend.get("b")
+    
+    a, b = asyncio.run(run())
+    assert a == {"v": 1}
+    assert b is None
+
+def test_service_uses_cache():
+    """Repeated lookups are answered from the cache, including not_found results"""
+    calls = []
+    
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={"response_code": 0})
+    
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        service = ThreatIntelService(
+            client=client,
+            rate_limiter=RateLimitManager({}, 6000),
+            cache=ResponseCache(MemoryCacheBackend())
+        )
+        service.api_keys = {"virustotal": "key"}
+        await service.analyze_ioc("example.com", "domain")
+        second = await service.analyze_ioc("example.com", "domain")
+        await service.close()
+        return second
+    
+    second = asyncio.run(run())
+    assert len(calls) == 1
+    assert second["results"]["virustotal"]["cached"] is True
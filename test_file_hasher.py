@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Tests for single-pass upload hashing
+"""
+
+import asyncio
+import hashlib
+import io
+import os
+from fastapi import UploadFile
+from app.services.file_hasher import check_content_length, limit_upload_stream, hash_upload, FileTooLargeError, MULTIPART_OVERHEAD
+
+def test_hash_upload_matches_hashlib():
+    """All three digests are computed in one pass over the upload"""
+    data = os.urandom(256 * 1024 + 5)
+    upload = UploadFile(io.BytesIO(data), filename="sample.bin")
+    
+    sample = asyncio.run(hash_upload(upload, chunk_size=64 * 1024))
+    
+    assert sample["size"] == len(data)
+    assert sample["md5"] == hashlib.md5(data).hexdigest()
+    assert sample["sha1"] == hashlib.sha1(data).hexdigest()
+    assert sample["sha256"] == hashlib.sha256(data).hexdigest()
+
+def test_oversized_upload_is_rejected():
+    """Uploads over the limit are refused, from the declared length when there is one"""
+    upload = UploadFile(io.BytesIO(b"x" * 4096), filename="sample.bin")
+    
+    try:
+        asyncio.run(hash_upload(upload, max_size=1024, chunk_size=512))
+        assert False, "expected FileTooLargeError"
+    except FileTooLargeError:
+        pass
+    
+    check_content_length(None, max_size=1024)
+    check_content_length(str(1024 + MULTIPART_OVERHEAD), max_size=1024)
+    try:
+        check_content_length(str(1025 + MULTIPART_OVERHEAD), max_size=1024)
+        assert False, "expected FileTooLargeError"
+    except FileTooLargeError:
+        pass
+
+def test_streamed_body_is_cut_off_at_the_limit():
+    """A body without a declared length is refused once it streams past the limit, without reading the rest"""
+    sent = []
+    
+    async def body():
+        for _ in range(100):
+            sent.append(1)
+            yield b"x" * 1024
+    
+    async def run(max_size):
+        return [chunk async for chunk in limit_upload_stream(body(), max_size=max_size)]
+    
+    assert len(asyncio.run(run(100 * 1024))) == 100
+    
+    sent.clear()
+    try:
+        asyncio.run(run(1024))
+        assert False, "expected FileTooLargeError"
+    except FileTooLargeError:
+        pass
+    assert len(sent) == MULTIPART_OVERHEAD // 1024 + 2
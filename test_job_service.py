@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Tests for background batch jobs
+"""
+
+import asyncio
+import os
+import tempfile
+from app.services.analysis_service import AnalysisService
+from app.services.job_service import BatchJobService
+from test_analysis_service import FakeThreatIntelService
+
+async def _wait_for_job(job_service, job_id, timeout=5.0):
+    for _ in range(int(timeout / 0.02)):
+        job = await job_service.get_job(job_id)
+        if job["status"] == "completed":
+            return job
+        await asyncio.sleep(0.02)
+    return job
+
+def test_job_runs_in_background():
+    """Submitting returns immediately; results are paginated in input order"""
+    indicators = [f"10.0.0.{i}" for i in range(25)] + ["not an ioc"]
+    
+    async def run(db_path):
+        job_service = BatchJobService(
+            AnalysisService(FakeThreatIntelService(delay=0)), db_path=db_path, chunk_size=10
+        )
+        await job_service.start()
+        submitted = await job_service.submit(indicators)
+        job = await _wait_for_job(job_service, submitted["job_id"])
+        page = await job_service.get_results(submitted["job_id"], offset=20, limit=10)
+        await job_service.stop()
+        return submitted, job, page
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        submitted, job, page = asyncio.run(run(os.path.join(tmp, "jobs.db")))
+    
+    assert submitted["status"] == "queued"
+    assert job["done"] == 25 and job["failed"] == 1 and job["pending"] == 0
+    assert [item["indicator"] for item in page] == indicators[20:]
+    assert page[0]["result"]["indicator"] == "10.0.0.20"
+    assert page[-1]["status"] == "failed"
+
+def test_job_resumes_after_restart():
+    """Pending items of an interrupted job are processed on the next start"""
+    indicators = [f"10.0.1.{i}" for i in range(10)]
+    
+    async def run(db_path):
+        first = BatchJobService(
+            AnalysisService(FakeThreatIntelService(delay=0.05)), db_path=db_path, chunk_size=2
+        )
+        await first.start()
+        submitted = await first.submit(indicators)
+        await asyncio.sleep(0.08)
+        await first.stop()
+        
+        second = BatchJobService(
+            AnalysisService(FakeThreatIntelService(delay=0)), db_path=db_path, chunk_size=2
+        )
+        await second.start()
+        job = await _wait_for_job(second, submitted["job_id"])
+        await second.stop()
+        return job
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        job = asyncio.run(run(os.path.join(tmp, "jobs.db")))
+    
+    assert job["status"] == "completed"
+    assert job["done"] == 10 and job["pending"] == 0
+
+def test_workers_sharing_a_database_analyse_each_item_once():
+    """Worker processes resuming the same job claim disjoint chunks, so no item is analysed twice"""
+    indicators = [f"10.0.2.{i}" for i in range(12)]
+    
+    async def run(db_path):
+        intel = [FakeThreatIntelService(delay=0.02), FakeThreatIntelService(delay=0.02)]
+        workers = [
+            BatchJobService(AnalysisService(threat_intel), db_path=db_path, chunk_size=2)
+            for threat_intel in intel
+        ]
+        await workers[0].start()
+        submitted = await workers[0].submit(indicators)
+        await workers[1].start()
+        job = await _wait_for_job(workers[0], submitted["job_id"])
+        for worker in workers:
+            await worker.stop()
+        return intel, job
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        intel, job = asyncio.run(run(os.path.join(tmp, "jobs.db")))
+    
+    assert job["status"] == "completed"
+    assert job["done"] == 12 and job["failed"] == 0 and job["pending"] == 0
+    assert intel[0].calls + intel[1].calls == 12
+    assert intel[0].calls and intel[1].calls
+
+def test_lapsed_claim_is_taken_over():
+    """Items claimed by a worker that died are processed by another once the claim expires"""
+    
+    async def run(db_path):
+        crashed = BatchJobService(
+            AnalysisService(FakeThreatIntelService(delay=10)), db_path=db_path, chunk_size=2
+        )
+        crashed.claim_timeout = 0.2
+        await crashed.start()
+        submitted = await crashed.submit(["10.0.3.1", "10.0.3.2"])
+        await asyncio.sleep(0.05)
+        # Dies without handing back its claim
+        for worker in crashed._workers:
+            worker.cancel()
+        
+        threat_intel = FakeThreatIntelService(delay=0)
+        survivor = BatchJobService(AnalysisService(threat_intel), db_path=db_path, chunk_size=2)
+        await survivor.start()
+        job = await _wait_for_job(survivor, submitted["job_id"])
+        await survivor.stop()
+        crashed._conn.close()
+        return threat_intel, job
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        threat_intel, job = asyncio.run(run(os.path.join(tmp, "jobs.db")))
+    
+    assert job["status"] == "completed" and job["done"] == 2
+    assert threat_intel.calls == 2
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-provider rate limiter used by ThreatIntelService
+"""
+
+import asyncio
+import time
+import httpx
+from app.services.rate_limiter import (
+    ProviderRateLimiter, RateLimitManager, QuotaExceededError, parse_retry_after
+)
+from app.services.threat_intel import ThreatIntelService
+
+def test_burst_then_throttle():
+    """Requests beyond the burst wait for tokens instead of failing"""
+    async def run():
+        limiter = ProviderRateLimiter("test", requests_per_minute=600, burst=2)
+        start = time.monotonic()
+        for _ in range(3):
+            async with limiter.slot():
+                pass
+        return time.monotonic() - start
+    
+    elapsed = asyncio.run(run())
+    assert elapsed >= 0.08
+
+def test_max_concurrent():
+    """No more than max_concurrent requests are in flight at once"""
+    async def run():
+        limiter = ProviderRateLimiter("test", requests_per_minute=6000, burst=100, max_concurrent=2)
+        peak = 0
+        
+        async def call():
+            nonlocal peak
+            async with limiter.slot():
+                peak = max(peak, limiter.get_status()["in_flight"])
+                await asyncio.sleep(0.01)
+        
+        await asyncio.gather(*(call() for _ in range(10)))
+        return peak
+    
+    assert asyncio.run(run()) == 2
+
+def test_daily_quota():
+    """Requests beyond the daily quota raise QuotaExceededError"""
+    async def run():
+        limiter = ProviderRateLimiter("test", requests_per_minute=6000, daily_quota=1)
+        await limiter.acquire()
+        limiter.release()
+        try:
+            await limiter.acquire()
+        except QuotaExceededError:
+            return True
+        return False
+    
+    assert asyncio.run(run())
+
+def test_parse_retry_after():
+    """Retry-After is parsed from seconds and falls back to the default"""
+    assert parse_retry_after("7", 1.0) == 7.0
+    assert parse_retry_after(None, 1.5) == 1.5
+    assert parse_retry_after("garbage", 2.0) == 2.0
+
+def test_retry_on_429():
+    """A 429 response defers the provider and the request is retried"""
+    calls = []
+    
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        return httpx.Response(200, json={"response_code": 0})
+    
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        service = ThreatIntelService(client=client, rate_limiter=RateLimitManager({}, 6000))
+        service.api_keys = {"virustotal": "key"}
+        result = await service.analyze_ioc("example.com", "domain")
+        await service.close()
+        return result, service.rate_limiter.get("virustotal").get_status()
+    
+    result, status = asyncio.run(run())
+    assert len(calls) == 2
+    assert result["results"]["virustotal"]["status"] == "not_found"
+    assert status["throttled_count"] == 1
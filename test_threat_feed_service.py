@@ -0,0 +1,842 @@
+#!/usr/bin/env python3
+"""
+Tests for threat feed storage and ingestion
+"""
+
+import asyncio
+import bz2
+import gzip
+import hashlib
+import io
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import zipfile
+import pytest
+from app.core.config import settings
+from app.services.threat_feed_service import ThreatFeedService, INDICATOR_INDEXES
+from app.services.bloom_filter import BloomFilter, _hash_pair
+from app.services.feed_parsers import iter_json_records, iter_csv_records, iter_xml_records
+from app.services.ip_ranges import IntervalIndex, MAX_KEY
+
+class StaticFeedService(ThreatFeedService):
+    """Feed service that serves fixed indicators as a JSON feed instead of downloading"""
+    
+    def __init__(self, db_path, indicators):
+        self.indicators = indicators
+        super().__init__(db_path)
+    
+    async def _download_feed(self, url, auth_token=None, etag=None, last_modified=None):
+        content = json.dumps(self.indicators).encode()
+        fd, path = tempfile.mkstemp(prefix="feed-")
+        with os.fdopen(fd, "wb") as spool:
+            spool.write(content)
+        return {"path": path, "content_hash": hashlib.sha256(content).hexdigest(), "etag": None, "last_modified": None}
+
+def test_feed_update_and_search():
+    """Indicators imported by an update are found by search through one shared connection"""
+    async def run(db_path):
+        service = StaticFeedService(db_path, [
+            {"value": "1.2.3.4", "type": "ip_address", "tags": ["c2"]},
+            {"value": "evil.example", "type": "domain"}
+        ])
+        feed = await service.add_feed({"name": "test", "url": "https://feed.example", "format": "json", "interval": 1})
+        update = await service.update_feed(feed["feed_id"])
+        matches = await service.search_indicators("1.2.3.4")
+        stats = await service.get_feed_stats()
+        service.close()
+        return update, matches, stats
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        update, matches, stats = asyncio.run(run(os.path.join(tmp, "threat_feeds.db")))
+    
+    assert update["records_imported"] == 2
+    assert len(matches) == 1
+    assert matches[0]["feed_name"] == "test"
+    assert matches[0]["tags"] == ["c2"]
+    assert stats["total_indicators"] == 2
+
+def test_feed_update_does_not_block_event_loop():
+    """A large import runs on database threads while the event loop keeps serving"""
+    indicators = [{"value": f"10.{i // 65536}.{i // 256 % 256}.{i % 256}", "type": "ip_address"} for i in range(50000)]
+    
+    async def run(db_path):
+        service = StaticFeedService(db_path, indicators)
+        feed = await service.add_feed({"name": "big", "url": "https://feed.example", "format": "json", "interval": 1})
+        
+        max_lag = 0.0
+        done = asyncio.Event()
+        
+        async def ticker():
+            nonlocal max_lag
+            loop = asyncio.get_running_loop()
+            while not done.is_set():
+                started = loop.time()
+                await asyncio.sleep(0.005)
+                max_lag = max(max_lag, loop.time() - started - 0.005)
+        
+        ticking = asyncio.create_task(ticker())
+        await asyncio.sleep(0.02)
+        update = await service.update_feed(feed["feed_id"])
+        done.set()
+        await ticking
+        service.close()
+        return update, max_lag
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        update, max_lag = asyncio.run(run(os.path.join(tmp, "threat_feeds.db")))
+    
+    assert update["records_imported"] == 50000
+    assert max_lag < 0.25
+
+def test_large_load_rebuilds_deferred_indexes():
+    """Loads above the bulk threshold insert in batches and leave every index in place"""
+    indicators = [{"value": f"{i:032x}", "type": "hash_md5"} for i in range(2500)]
+    threshold, batch_size = settings.threat_feeds_bulk_index_threshold, settings.threat_feeds_insert_batch_size
+    settings.threat_feeds_bulk_index_threshold, settings.threat_feeds_insert_batch_size = 1000, 1000
+    
+    async def run(db_path):
+        service = StaticFeedService(db_path, indicators)
+        feed = await service.add_feed({"name": "bulk", "url": "https://feed.example", "format": "json", "interval": 1})
+        await service.update_feed(feed["feed_id"])
+        service.indicators = indicators + [{"value": f"{2500:032x}", "type": "hash_md5"}]
+        update = await service.update_feed(feed["feed_id"])
+        matches = await service.search_indicators(f"{2499:032x}")
+        service.close()
+        return update, matches
+    
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "threat_feeds.db")
+            update, matches = asyncio.run(run(db_path))
+            conn = sqlite3.connect(db_path)
+            indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+            count = conn.execute("SELECT COUNT(*) FROM indicators").fetchone()[0]
+            conn.close()
+    finally:
+        settings.threat_feeds_bulk_index_threshold, settings.threat_feeds_insert_batch_size = threshold, batch_size
+    
+    assert update["records_imported"] == 2501
+    assert update["added"] == 1
+    assert count == 2501
+    assert len(matches) == 1
+    assert set(INDICATOR_INDEXES) <= indexes
+
+def test_feed_update_applies_delta():
+    """Updates keep first_seen, expire vanished indicators and report the delta"""
+    async def run(db_path):
+        service = StaticFeedService(db_path, [
+            {"value": "1.2.3.4", "type": "ip_address"},
+            {"value": "5.6.7.8", "type": "ip_address"}
+        ])
+        feed = await service.add_feed({"name": "delta", "url": "https://feed.example", "format": "json", "interval": 1})
+        first = await service.update_feed(feed["feed_id"])
+        original = (await service.search_indicators("1.2.3.4"))[0]
+        
+        service.indicators = [
+            {"value": "1.2.3.4", "type": "ip_address"},
+            {"value": "9.9.9.9", "type": "ip_address"}
+        ]
+        second = await service.update_feed(feed["feed_id"])
+        kept = (await service.search_indicators("1.2.3.4"))[0]
+        vanished = await service.search_indicators("5.6.7.8")
+        expired = await service.search_indicators("5.6.7.8", include_expired=True)
+        service.close()
+        return first, second, original, kept, vanished, expired
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        first, second, original, kept, vanished, expired = asyncio.run(run(os.path.join(tmp, "threat_feeds.db")))
+    
+    assert (first["added"], first["removed"], first["unchanged"]) == (2, 0, 0)
+    assert (second["added"], second["removed"], second["unchanged"]) == (1, 1, 1)
+    assert kept["id"] == original["id"]
+    assert kept["first_seen"] == original["first_seen"]
+    assert kept["last_seen"] > original["last_seen"]
+    assert vanished == []
+    assert expired[0]["status"] == "expired"
+
+def test_feed_update_below_minimum_ratio_keeps_indicators():
+    """An update keeping too little of a feed fails when a minimum ratio is set; an emptied feed applies otherwise"""
+    async def run(db_path):
+        service = StaticFeedService(db_path, [{"value": "1.2.3.4", "type": "ip_address"}])
+        feed_id = (await service.add_feed({"name": "broken", "url": "unused", "format": "json", "interval": 1}))["feed_id"]
+        await service.update_feed(feed_id)
+        
+        service.indicators = [{"unrecognized": "1.2.3.4"}]
+        settings.threat_feeds_min_update_ratio = 0.5
+        rejected = await service.update_feed(feed_id)
+        kept = await service.search_indicators("1.2.3.4")
+        
+        service.indicators = []
+        settings.threat_feeds_min_update_ratio = 0.0
+        emptied = await service.update_feed(feed_id)
+        remaining = await service.search_indicators("1.2.3.4")
+        service.close()
+        return rejected, kept, emptied, remaining
+    
+    min_ratio = settings.threat_feeds_min_update_ratio
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            rejected, kept, emptied, remaining = asyncio.run(run(os.path.join(tmp, "threat_feeds.db")))
+    finally:
+        settings.threat_feeds_min_update_ratio = min_ratio
+    
+    assert rejected["status"] == "failed"
+    assert len(kept) == 1 and kept[0]["status"] == "active"
+    assert emptied["status"] == "updated" and emptied["removed"] == 1
+    assert remaining == []
+
+def test_unchanged_feed_is_not_reparsed():
+    """Conditional requests and content hashes skip parsing feeds that have not changed"""
+    from aiohttp import web
+    
+    body = "value,severity\n1.2.3.4,high\n5.6.7.8,low\n"
+    requests = []
+    
+    async def feed(request):
+        requests.append(dict(request.headers))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.Response(text=body, headers={"ETag": '"v1"'})
+    
+    async def run(db_path):
+        app = web.Application()
+        app.router.add_get("/feed.csv", feed)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        
+        service = ThreatFeedService(db_path)
+        parsed = []
+        iter_feed = service._iter_feed
+        service._iter_feed = lambda stream, format_type: parsed.append(format_type) or iter_feed(stream, format_type)
+        
+        added = await service.add_feed({"name": "csv", "url": f"http://127.0.0.1:{port}/feed.csv", "format": "csv", "interval": 1})
+        first = await service.update_feed(added["feed_id"])
+        second = await service.update_feed(added["feed_id"])
+        
+        # A server that ignores validators still avoids a reparse of identical content
+        await service._write(lambda conn: conn.execute("UPDATE feeds SET etag = NULL") and conn.commit())
+        third = await service.update_feed(added["feed_id"])
+        
+        service.close()
+        await runner.cleanup()
+        return first, second, third, parsed
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        first, second, third, parsed = asyncio.run(run(os.path.join(tmp, "threat_feeds.db")))
+    
+    assert first["added"] == 2
+    assert second["status"] == "not_modified" and second["reason"] == "not_modified"
+    assert third["status"] == "not_modified" and third["reason"] == "content_unchanged"
+    assert requests[1]["If-None-Match"] == '"v1"'
+    assert parsed == ["csv"]
+
+def test_streaming_parsers():
+    """Feed parsers read records incrementally from nested JSON, XML and CSV"""
+    records = [{"value": f"10.0.{i // 256}.{i % 256}", "type": "ip"} for i in range(5000)]
+    document = json.dumps({"meta": {"items": [1, 2.5, "x"]}, "indicators": records, "tail": True})
+    
+    # The document spans several reads, so records straddle buffer refills
+    parsed = list(iter_json_records(io.BytesIO(document.encode()), ["indicators"]))
+    assert parsed == records
+    assert list(iter_json_records(io.BytesIO(b" [1, 20, 300] "), [])) == [1, 20, 300]
+    
+    xml = b"<feed><threat><value>evil.com</value><type>domain</type></threat><threat><value>bad.org</value></threat></feed>"
+    assert list(iter_xml_records(io.BytesIO(xml))) == [
+        {"value": "evil.com", "type": "domain"},
+        {"value": "bad.org"}
+    ]
+    
+    # A value-bearing <ioc> child belongs to its <indicator> record rather than becoming one
+    nested = b"<feed><indicator><ioc>1.2.3.4</ioc><severity>high</severity></indicator><indicator><ioc>5.6.7.8</ioc></indicator></feed>"
+    assert list(iter_xml_records(io.BytesIO(nested))) == [{"ioc": "1.2.3.4", "severity": "high"}, {"ioc": "5.6.7.8"}]
+    
+    csv_content = "\ufeffvalue,severity\r\n1.2.3.4,high\r\n".encode()
+    assert list(iter_csv_records(io.BytesIO(csv_content))) == [{"value": "1.2.3.4", "severity": "high"}]
+
+def test_compressed_feeds_are_decompressed():
+    """Gzip, bz2 and zip feeds are detected by their magic bytes and parsed as plain feeds"""
+    body = b"value,severity\n1.2.3.4,high\nevil.com,low\n"
+    
+    def zipped(content):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("feed.csv", content)
+        return buffer.getvalue()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        service = ThreatFeedService(os.path.join(tmp, "threat_feeds.db"))
+        
+        for name, content in [("plain", body), ("gz", gzip.compress(body)), ("bz2", bz2.compress(body)), ("zip", zipped(body))]:
+            path = os.path.join(tmp, f"feed.{name}")
+            with open(path, "wb") as f:
+                f.write(content)
+            
+            indicators = list(service._iter_feed_file(path, "csv"))
+            assert [(i["value"], i["type"]) for i in indicators] == [("1.2.3.4", "ip_address"), ("evil.com", "domain")], name
+        
+        service.close()
+
+def test_scheduler_refreshes_feeds_concurrently():
+    """Due feeds are downloaded concurrently under the download cap and refreshed again after their interval"""
+    
+    class SlowFeedService(StaticFeedService):
+        """Feed service whose downloads take a while and record their overlap"""
+        
+        def __init__(self, db_path, indicators):
+            super().__init__(db_path, indicators)
+            self.active = 0
+            self.peak = 0
+            self.downloads = 0
+        
+        async def _download_feed(self, url, auth_token=None, etag=None, last_modified=None):
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            await asyncio.sleep(0.2)
+            self.active -= 1
+            self.downloads += 1
+            self.indicators = self.indicators + [{"value": f"{self.downloads:032x}", "type": "hash_md5"}]
+            return await super()._download_feed(url)
+    
+    async def run(db_path):
+        service = SlowFeedService(db_path, [{"value": "evil.com", "type": "domain"}])
+        service.poll_interval = 0.02
+        
+        for i in range(6):
+            # 0.0002 hours is well under a second
+            await service.add_feed({"name": f"feed{i}", "url": "unused", "format": "json", "interval": 0.0002})
+        
+        started = time.perf_counter()
+        await service.start()
+        while service.downloads < 6:
+            await asyncio.sleep(0.01)
+        first_round = time.perf_counter() - started
+        
+        while service.downloads < 12:
+            await asyncio.sleep(0.01)
+        
+        feeds = await service.list_feeds()
+        await service.stop()
+        return service.peak, first_round, feeds
+    
+    max_downloads = settings.threat_feeds_max_concurrent_downloads
+    settings.threat_feeds_max_concurrent_downloads = 3
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            peak, first_round, feeds = asyncio.run(run(os.path.join(tmp, "threat_feeds.db")))
+    finally:
+        settings.threat_feeds_max_concurrent_downloads = max_downloads
+    
+    assert peak == 3
+    # Six 0.2s downloads three at a time take two rounds, not six
+    assert first_round < 0.8
+    assert all(feed["last_update"] for feed in feeds)
+
+def test_one_worker_schedules_feed_updates():
+    """Workers sharing a database elect one scheduler, and another takes over when it stops"""
+    
+    async def run(db_path):
+        workers = [StaticFeedService(db_path, [{"value": "evil.com", "type": "domain"}]) for _ in range(2)]
+        updates = [[], []]
+        for worker, updated in zip(workers, updates):
+            worker.poll_interval = 0.02
+            update_feed = worker.update_feed
+            worker.update_feed = lambda feed_id, update_feed=update_feed, updated=updated: updated.append(feed_id) or update_feed(feed_id)
+        
+        first_feed = (await workers[0].add_feed({"name": "first", "url": "unused", "format": "json", "interval": 0.0002}))["feed_id"]
+        for worker in workers:
+            await worker.start()
+        await asyncio.sleep(0.5)
+        elected = [len(updated) for updated in updates]
+        
+        # The stopping scheduler releases its lock; a new feed is due at once
+        leader = 0 if elected[0] else 1
+        follower = workers[1 - leader]
+        await workers[leader].stop()
+        second_feed = (await follower.add_feed({"name": "second", "url": "unused", "format": "json", "interval": 1}))["feed_id"]
+        await asyncio.sleep(0.2)
+        await follower.stop()
+        return first_feed, second_feed, elected, updates[1 - leader]
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        first_feed, second_feed, elected, taken_over = asyncio.run(run(os.path.join(tmp, "threat_feeds.db")))
+    
+    assert sorted(elected)[0] == 0 and sorted(elected)[1] >= 1
+    assert second_feed in taken_over
+
+def test_feed_is_updated_by_one_worker_at_a_time():
+    """A worker asked to update a feed another worker is importing skips it instead of importing it twice"""
+    
+    class SlowFeedService(StaticFeedService):
+        """Feed service whose downloads take a while"""
+        
+        async def _download_feed(self, url, auth_token=None, etag=None, last_modified=None):
+            await asyncio.sleep(0.2)
+            return await super()._download_feed(url)
+    
+    async def run(db_path):
+        workers = [SlowFeedService(db_path, [{"value": "evil.com", "type": "domain"}]) for _ in range(2)]
+        feed_id = (await workers[0].add_feed({"name": "feed", "url": "unused", "format": "json", "interval": 1}))["feed_id"]
+        
+        concurrent = await asyncio.gather(*(worker.update_feed(feed_id) for worker in workers))
+        # The lock is given up when the update ends
+        later = await workers[1].update_feed(feed_id)
+        missing = await workers[1].update_feed("no-such-feed")
+        for worker in workers:
+            worker.close()
+        return [result["status"] for result in concurrent], later["status"], missing["status"]
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        concurrent, later, missing = asyncio.run(run(os.path.join(tmp, "threat_feeds.db")))
+        leftover = [name for name in os.listdir(tmp) if ".update-" in name]
+    
+    assert sorted(concurrent) == ["in_progress", "updated"]
+    assert later == "not_modified" and missing == "not_found"
+    assert len(leftover) == 1
+
+def test_indicator_index_tracks_feed_updates():
+    """The in-memory index answers lookups like the database as feeds change and are deleted"""
+    md5 = "d41d8cd98f00b204e9800998ecf8427e"
+    
+    async def run(db_path):
+        service = StaticFeedService(db_path, [
+            {"value": "1.2.3.4", "type": "ip"},
+            {"value": md5.upper(), "type": "hash"},
+            {"value": "evil.com", "type": "domain"}
+        ])
+        first = (await service.add_feed({"name": "first", "url": "unused", "format": "json", "interval": 1}))["feed_id"]
+        second = (await service.add_feed({"name": "second", "url": "unused", "format": "json", "interval": 1}))["feed_id"]
+        await service.update_feed(first)
+        
+        # Loaded from what is already stored, then kept current by updates
+        await service.load_index()
+        service.indicators = [{"value": "1.2.3.4", "type": "ip"}, {"value": "bad.org", "type": "domain"}]
+        await service.update_feed(second)
+        
+        listed = {value: await service.lookup_indicator(value) for value in ["1.2.3.4", md5, "evil.com", "bad.org", "5.6.7.8"]}
+        missing = await service.search_indicators("5.6.7.8")
+        
+        await service.update_feed(first)
+        await service.delete_feed(second)
+        after = {value: await service.lookup_indicator(value) for value in ["1.2.3.4", "evil.com", "bad.org"]}
+        stats = await service.get_feed_stats()
+        
+        service.close()
+        return first, second, listed, missing, after, stats
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        first, second, listed, missing, after, stats = asyncio.run(run(os.path.join(tmp, "threat_feeds.db")))
+    
+    assert sorted(match["feed_id"] for match in listed["1.2.3.4"]) == sorted([first, second])
+    assert listed[md5] == [{"feed_id": first, "ioc_type": "hash_md5"}]
+    assert listed["evil.com"] == [{"feed_id": first, "ioc_type": "domain"}]
+    assert listed["bad.org"] == [{"feed_id": second, "ioc_type": "domain"}]
+    assert listed["5.6.7.8"] == [] and missing == []
+    
+    # The first feed now lists what the second did, and the second is gone
+    assert after["1.2.3.4"] == [{"feed_id": first, "ioc_type": "ip_address"}]
+    assert after["evil.com"] == []
+    assert after["bad.org"] == [{"feed_id": first, "ioc_type": "domain"}]
+    assert stats["index"]["feeds"] == 1 and stats["index"]["indicators"] == 2
+
+def test_memory_index_sees_other_workers_updates():
+    """A worker's in-memory index catches up on feeds another worker updated or deleted, without reads on lookup"""
+    
+    async def run(db_path):
+        writer = StaticFeedService(db_path, [{"value": "1.2.3.4", "type": "ip"}])
+        reader = ThreatFeedService(db_path)
+        feed_id = (await writer.add_feed({"name": "feed", "url": "unused", "format": "json", "interval": 1}))["feed_id"]
+        await writer.update_feed(feed_id)
+        await reader.load_index()
+        
+        reads = []
+        read = reader._read
+        reader._read = lambda func: reads.append(func) or read(func)
+        
+        writer.indicators = [{"value": "1.2.3.4", "type": "ip"}, {"value": "evil.com", "type": "domain"}]
+        await writer.update_feed(feed_id)
+        stale = await reader.lookup_indicator("evil.com")
+        lookup_reads = len(reads)
+        await reader.sync_index()
+        added = [await reader.search_indicators("evil.com"), await reader.lookup_indicator("evil.com")]
+        
+        await writer.delete_feed(feed_id)
+        await reader.sync_index()
+        deleted = await reader.lookup_indicator("1.2.3.4")
+        stats = (await reader.get_feed_stats())["index"]
+        
+        writer.close()
+        reader.close()
+        return feed_id, stale, lookup_reads, added, deleted, stats
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        feed_id, stale, lookup_reads, added, deleted, stats = asyncio.run(run(os.path.join(tmp, "threat_feeds.db")))
+    
+    # Until the next sync the reader answers from what it last loaded
+    assert stale == [] and lookup_reads == 0
+    assert len(added[0]) == 1 and added[1] == [{"feed_id": feed_id, "ioc_type": "domain"}]
+    assert deleted == [] and stats["indicators"] == 0
+
+def test_memory_index_follows_other_workers_in_the_background():
+    """A started worker picks up another worker's changes on its own every index_sync_interval"""
+    
+    async def run(db_path):
+        writer = StaticFeedService(db_path, [{"value": "evil.com", "type": "domain"}])
+        reader = ThreatFeedService(db_path)
+        reader.index_sync_interval = 0.01
+        await writer.start()
+        await reader.start()
+        
+        feed_id = (await writer.add_feed({"name": "feed", "url": "unused", "format": "json", "interval": 1}))["feed_id"]
+        await writer.update_feed(feed_id)
+        for _ in range(200):
+            found = await reader.lookup_indicator("evil.com")
+            if found:
+                break
+            await asyncio.sleep(0.01)
+        
+        await reader.stop()
+        await writer.stop()
+        return feed_id, found
+    
+    enabled = settings.threat_feeds_scheduler_enabled
+    settings.threat_feeds_scheduler_enabled = False
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            feed_id, found = asyncio.run(run(os.path.join(tmp, "threat_feeds.db")))
+    finally:
+        settings.threat_feeds_scheduler_enabled = enabled
+    
+    assert found == [{"feed_id": feed_id, "ioc_type": "domain"}]
+
+def test_hash_lookups_ignore_case_on_every_backend():
+    """Digests are stored in lower case, so the database and the index agree whatever case a feed or lookup uses"""
+    upper = "D41D8CD98F00B204E9800998ECF8427E"
+    
+    async def run(db_path):
+        service = StaticFeedService(db_path, [{"value": upper, "type": "hash"}])
+        feed_id = (await service.add_feed({"name": "feed", "url": "unused", "format": "json", "interval": 1}))["feed_id"]
+        await service.update_feed(feed_id)
+        
+        stored = [row["value"] for row in await service.search_indicators(upper.lower())]
+        from_database = [len(await service.lookup_indicator(value)) for value in (upper, upper.lower())]
+        await service.load_index()
+        from_index = [len(await service.lookup_indicator(value)) for value in (upper, upper.lower())]
+        service.close()
+        
+        # Rows stored before digests were lower-cased are converted once
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("UPDATE indicators SET value = ?", (upper,))
+            conn.execute("DELETE FROM feed_state WHERE name = 'hash_values_lowercase'")
+        reopened = ThreatFeedService(db_path)
+        migrated = [row["value"] for row in await reopened.search_indicators(upper)]
+        reopened.close()
+        return stored, from_database, from_index, migrated
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        stored, from_database, from_index, migrated = asyncio.run(run(os.path.join(tmp, "threat_feeds.db")))
+    
+    assert stored == [upper.lower()] and migrated == [upper.lower()]
+    assert from_database == [1, 1] and from_index == [1, 1]
+
+def test_snapshot_index_is_shared_between_workers():
+    """Workers read indicators from one mapped snapshot that the updating worker swaps atomically"""
+    
+    async def run(db_path):
+        writer = StaticFeedService(db_path, [{"value": "1.2.3.4", "type": "ip"}, {"value": "evil.com", "type": "domain"}])
+        reader = ThreatFeedService(db_path)
+        reader.index.check_interval = 0
+        
+        feed_id = (await writer.add_feed({"name": "feed", "url": "unused", "format": "json", "interval": 1}))["feed_id"]
+        await writer.update_feed(feed_id)
+        await writer.load_index()
+        await reader.load_index()
+        before = [await reader.lookup_indicator(value) for value in ["1.2.3.4", "evil.com", "bad.org"]]
+        
+        writer.indicators = [{"value": "bad.org", "type": "domain"}]
+        await writer.update_feed(feed_id)
+        after = [await reader.lookup_indicator(value) for value in ["1.2.3.4", "evil.com", "bad.org"]]
+        stats = (await reader.get_feed_stats())["index"]
+        writer.close()
+        reader.close()
+        
+        # A snapshot behind the database is compiled again rather than trusted
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("UPDATE feed_state SET value = value + 1 WHERE name = 'indicators_generation'")
+        restarted = ThreatFeedService(db_path)
+        await restarted.load_index()
+        stats["recompiled_generation"] = restarted.index.generation
+        restarted.close()
+        
+        return feed_id, before, after, stats
+    
+    backend = settings.threat_feeds_index_backend
+    settings.threat_feeds_index_backend = "snapshot"
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            feed_id, before, after, stats = asyncio.run(run(os.path.join(tmp, "threat_feeds.db")))
+            # Replaced in place, with no temporary files left behind
+            assert [name for name in os.listdir(tmp) if "snapshot" in name] == ["threat_feeds.snapshot"]
+    finally:
+        settings.threat_feeds_index_backend = backend
+    
+    assert before == [[{"feed_id": feed_id, "ioc_type": "ip_address"}], [{"feed_id": feed_id, "ioc_type": "domain"}], []]
+    assert after == [[], [], [{"feed_id": feed_id, "ioc_type": "domain"}]]
+    assert stats["loaded"] and stats["feeds"] == 1 and stats["indicators"] == 1
+    assert stats["generation"] == 2 and stats["recompiled_generation"] == 3
+
+def test_snapshot_compiles_while_another_worker_writes():
+    """Snapshots compile from committed data without the write lock, so another worker's import does not hold them up"""
+    
+    async def run(db_path):
+        service = StaticFeedService(db_path, [{"value": "evil.com", "type": "domain"}])
+        feed_id = (await service.add_feed({"name": "feed", "url": "unused", "format": "json", "interval": 1}))["feed_id"]
+        await service.update_feed(feed_id)
+        
+        # Another worker is midway through an import
+        other = sqlite3.connect(db_path, timeout=0)
+        other.execute("BEGIN IMMEDIATE")
+        other.execute("UPDATE feed_state SET value = value + 1 WHERE name = 'indicators_generation'")
+        await asyncio.wait_for(service.load_index(), timeout=5)
+        during = service.index.generation
+        found = await service.lookup_indicator("evil.com")
+        other.commit()
+        other.close()
+        
+        await service.load_index()
+        after = service.index.generation
+        service.close()
+        return feed_id, during, found, after
+    
+    backend = settings.threat_feeds_index_backend
+    settings.threat_feeds_index_backend = "snapshot"
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            feed_id, during, found, after = asyncio.run(run(os.path.join(tmp, "threat_feeds.db")))
+    finally:
+        settings.threat_feeds_index_backend = backend
+    
+    assert during == 1 and found == [{"feed_id": feed_id, "ioc_type": "domain"}]
+    assert after == 2
+
+def test_bloom_filter_false_positive_rate():
+    """A filter sized for its values has no false negatives and stays near the target false positive rate"""
+    bloom = BloomFilter.for_capacity(10000, 0.01)
+    for i in range(10000):
+        bloom.add(_hash_pair(f"member-{i}"))
+    
+    assert all(_hash_pair(f"member-{i}") in bloom for i in range(10000))
+    false_positives = sum(_hash_pair(f"other-{i}") in bloom for i in range(20000))
+    assert false_positives / 20000 < 0.02
+    assert abs(bloom.false_positive_rate() - 0.01) < 0.005
+
+def test_filters_reject_misses_and_persist():
+    """Misses are answered from the filters without a database read, and saved filters are reused until stale"""
+    
+    async def run(db_path):
+        service = StaticFeedService(db_path, [{"value": "1.2.3.4", "type": "ip"}, {"value": "D41D8CD98F00B204E9800998ECF8427E", "type": "hash"}])
+        feed_id = (await service.add_feed({"name": "feed", "url": "unused", "format": "json", "interval": 1}))["feed_id"]
+        await service.update_feed(feed_id)
+        await service.load_filters()
+        
+        reads = []
+        read = service._read
+        service._read = lambda func: reads.append(func) or read(func)
+        
+        misses = [await service.search_indicators("9.9.9.9"), await service.lookup_indicator("nothing.example")]
+        miss_reads = len(reads)
+        hits = [await service.search_indicators("1.2.3.4"), await service.lookup_indicator("D41D8CD98F00B204E9800998ECF8427E")]
+        
+        # Indicators added by later updates pass the filters without a rebuild
+        service.indicators = service.indicators + [{"value": "5.6.7.8", "type": "ip"}]
+        await service.update_feed(feed_id)
+        added = await service.lookup_indicator("5.6.7.8")
+        stats = (await service.get_feed_stats())["filters"]
+        service.close()
+        
+        # Another process reuses the saved filters while they match the database
+        reopened = ThreatFeedService(db_path)
+        reopened._rebuild_filters = lambda conn: pytest.fail("filters rebuilt although current")
+        await reopened.load_filters()
+        reloaded = reopened.filters.might_contain("5.6.7.8", "ip_address")
+        reopened.close()
+        
+        return misses, miss_reads, hits, added, stats, reloaded
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        misses, miss_reads, hits, added, stats, reloaded = asyncio.run(run(os.path.join(tmp, "threat_feeds.db")))
+    
+    assert misses == [[], []] and miss_reads == 0
+    assert len(hits[0]) == 1 and hits[1][0]["ioc_type"] == "hash_md5"
+    assert added[0]["ioc_type"] == "ip_address"
+    assert reloaded
+    assert stats["loaded"] and stats["filters"]["ip_address"]["values_added"] == 3
+    assert 0 < stats["filters"]["ip_address"]["fill_ratio"] < 0.1
+
+def test_filters_keep_values_saved_by_other_workers():
+    """Workers saving the shared filters start from the latest saved copy, so no worker's values are lost"""
+    
+    async def run(db_path):
+        first = StaticFeedService(db_path, [{"value": "1.2.3.4", "type": "ip"}])
+        second = StaticFeedService(db_path, [{"value": "evil.com", "type": "domain"}])
+        first_feed = (await first.add_feed({"name": "first", "url": "unused", "format": "json", "interval": 1}))["feed_id"]
+        second_feed = (await second.add_feed({"name": "second", "url": "unused", "format": "json", "interval": 1}))["feed_id"]
+        await first.update_feed(first_feed)
+        await second.update_feed(second_feed)
+        
+        # Neither worker polls the file, so only reloading it before each save keeps them in step
+        for service in (first, second):
+            await service.load_filters()
+            service.filters.check_interval = 3600
+        
+        first.indicators = first.indicators + [{"value": "5.6.7.8", "type": "ip"}]
+        second.indicators = second.indicators + [{"value": "bad.org", "type": "domain"}]
+        await first.update_feed(first_feed)
+        await second.update_feed(second_feed)
+        await first.delete_feed(second_feed)
+        first.close()
+        second.close()
+        
+        reopened = ThreatFeedService(db_path)
+        reopened._rebuild_filters = lambda conn: pytest.fail("filters rebuilt although current")
+        await reopened.load_filters()
+        kept = [reopened.filters.might_contain(value, ioc_type) for value, ioc_type in [("5.6.7.8", "ip_address"), ("bad.org", "domain")]]
+        reopened.close()
+        return kept
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        kept = asyncio.run(run(os.path.join(tmp, "threat_feeds.db")))
+    
+    assert kept == [True, True]
+
+def test_filters_only_count_generations_whose_values_were_saved():
+    """A change committed without its filter save leaves the saved filters stale however many saves follow"""
+    
+    async def run(db_path):
+        service = StaticFeedService(db_path, [{"value": "1.2.3.4", "type": "ip"}])
+        feed_id = (await service.add_feed({"name": "feed", "url": "unused", "format": "json", "interval": 1}))["feed_id"]
+        await service.load_filters()
+        await service.update_feed(feed_id)
+        saved = service.filters.generation
+        
+        # A worker that committed a change but exited before saving its values
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("UPDATE feed_state SET value = value + 1 WHERE name = 'indicators_generation'")
+        service.indicators = [{"value": "5.6.7.8", "type": "ip"}]
+        await service.update_feed(feed_id)
+        behind = (service.filters.generation, sorted(service.filters.later_generations))
+        service.close()
+        
+        reopened = ThreatFeedService(db_path)
+        rebuilds = []
+        rebuild = reopened._rebuild_filters
+        reopened._rebuild_filters = lambda conn: rebuilds.append(conn) or rebuild(conn)
+        await reopened.load_filters()
+        rebuilt = (len(rebuilds), reopened.filters.generation, reopened.filters.later_generations)
+        reopened.close()
+        return saved, behind, rebuilt
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        saved, behind, rebuilt = asyncio.run(run(os.path.join(tmp, "threat_feeds.db")))
+    
+    assert saved == 1
+    assert behind == (1, [3])
+    assert rebuilt == (1, 3, set())
+
+def test_interval_index_matches_brute_force():
+    """Overlapping, nested and adjacent ranges report exactly the ranges containing each key"""
+    rng = random.Random(7)
+    ranges = []
+    for range_id in range(300):
+        first = rng.randrange(1 << 20)
+        ranges.append((first, first + rng.randrange(1 << 12), range_id))
+    # Keys beyond 64 bits, up to a range that runs to the very last key
+    ranges += [(1 << 100, (1 << 101) - 1, 300), ((1 << 127), MAX_KEY, 301)]
+    
+    intervals = IntervalIndex.build(ranges)
+    keys = [rng.randrange(1 << 21) for _ in range(2000)] + [0, 1 << 100, (1 << 101) - 1, 1 << 101, MAX_KEY]
+    for key in keys:
+        expected = tuple(sorted(range_id for first, last, range_id in ranges if first <= key <= last))
+        assert intervals.lookup(key) == expected
+
+def test_ip_range_indicators_match_contained_addresses():
+    """Addresses match the CIDR blocks and IP ranges containing them in the database, the index and the snapshot"""
+    indicators = [
+        {"value": "10.1.2.0/24", "type": "cidr"},
+        {"value": "192.168.0.10 - 192.168.0.20", "type": "range"},
+        {"value": "2001:DB8::/32", "type": "cidr"},
+        {"value": "10.1.2.0/23", "type": "cidr"}
+    ]
+    queries = ["10.1.2.77", "10.1.3.1", "192.168.0.15", "192.168.0.21", "2001:db8::1", "2001:db9::1", "10.1.2.5/24"]
+    
+    async def run(db_path):
+        service = StaticFeedService(db_path, indicators)
+        feed_id = (await service.add_feed({"name": "ranges", "url": "unused", "format": "json", "interval": 1}))["feed_id"]
+        await service.update_feed(feed_id)
+        
+        stored = sorted((row["value"], row["ioc_type"]) for row in await service.search_indicators("10.1.2.77"))
+        typed = [
+            len(await service.search_indicators("10.1.2.77", "ip_address")),
+            len(await service.search_indicators("10.1.2.77", "domain"))
+        ]
+        from_database = [len(await service.lookup_indicator(value)) for value in queries]
+        await service.load_index()
+        from_index = [len(await service.lookup_indicator(value)) for value in queries]
+        
+        service.close()
+        return stored, typed, from_database, from_index
+    
+    results = {}
+    backend = settings.threat_feeds_index_backend
+    try:
+        for settings.threat_feeds_index_backend in ("memory", "snapshot"):
+            with tempfile.TemporaryDirectory() as tmp:
+                results[settings.threat_feeds_index_backend] = asyncio.run(run(os.path.join(tmp, "threat_feeds.db")))
+    finally:
+        settings.threat_feeds_index_backend = backend
+    
+    stored, typed, from_database, from_index = results["memory"]
+    assert stored == [("10.1.2.0/23", "ip_range"), ("10.1.2.0/24", "ip_range")]
+    assert typed == [2, 0]
+    # The same feed lists both blocks around 10.1.2.77, and the last query is the /24 itself
+    assert from_database == [1, 1, 1, 0, 1, 0, 1]
+    assert from_index == from_database
+    assert results["snapshot"][3] == from_database
+
+def test_range_search_is_bounded_by_widest_range():
+    """Database range matches only look back as far as the widest stored range, which existing databases recompute"""
+    
+    async def run(db_path):
+        service = StaticFeedService(db_path, [{"value": "10.1.2.0/24", "type": "cidr"}])
+        feed_id = (await service.add_feed({"name": "narrow", "url": "unused", "format": "json", "interval": 1}))["feed_id"]
+        await service.update_feed(feed_id)
+        narrow = await service.lookup_indicator("10.1.2.77")
+        
+        service.indicators = service.indicators + [{"value": "10.0.0.0/8", "type": "cidr"}]
+        await service.update_feed(feed_id)
+        wide = [len(await service.lookup_indicator(value)) for value in ["10.1.2.77", "10.200.0.1", "11.0.0.1"]]
+        service.close()
+        
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("DELETE FROM feed_state WHERE name = 'range_span_bits'")
+        reopened = ThreatFeedService(db_path)
+        span_bits = await reopened._read(
+            lambda conn: conn.execute("SELECT value FROM feed_state WHERE name = 'range_span_bits'").fetchone()[0]
+        )
+        migrated = len(await reopened.lookup_indicator("10.200.0.1"))
+        reopened.close()
+        return narrow, wide, span_bits, migrated
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        narrow, wide, span_bits, migrated = asyncio.run(run(os.path.join(tmp, "threat_feeds.db")))
+    
+    assert len(narrow) == 1
+    assert wide == [1, 1, 0]
+    assert span_bits == 24 and migrated == 1
+